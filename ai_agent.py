@@ -12,13 +12,31 @@ import json
 import time
 import tempfile
 import base64
+import uuid
+import contextvars
 from datetime import datetime
 from typing import TypedDict, Annotated
 from pathlib import Path
 from dotenv import load_dotenv
 
+from runtime_metrics import RuntimeMetricsSampler, metrics_delta
+import metrics
+import tracing
+import validation_engine
+import screenshot_capture
+from artifact_store import EXTENSIONS, screenshot_store
+from filmstrip import Filmstrip
+from visual_regression import visual_baselines, parse_masks
+import trace_capture
+from history import history_store
+from regression import regression_detector
+
+from llm_backends import get_backend
+from instruction_compiler import compile_instruction
+from plan_cache import plan_cache
+from site_profiles import site_profiles, blocking_handler
+
 # LangGraph and LangChain imports
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 
@@ -33,9 +51,28 @@ except ImportError:
     Browser = None
     BrowserContext = None
 
+# Trace Playwright actions (goto, fill, click, wait, screenshot, evaluate) as child spans
+if PLAYWRIGHT_AVAILABLE:
+    tracing.instrument_playwright()
+
 # Load environment variables
 load_dotenv()
 
+# Persist every run to the SQLite history store (HISTORY_ENABLED=false to opt out)
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+# Compare each run's performance metrics with its rolling baseline (REGRESSION_DETECTION=false to opt out)
+REGRESSION_ENABLED = os.getenv("REGRESSION_DETECTION", "true").lower() not in ("0", "false", "no", "off")
+
+# Instructions the rule compiler parses with at least this confidence skip the LLM (above 1 disables it)
+INSTRUCTION_CONFIDENCE_THRESHOLD = float(os.getenv("INSTRUCTION_CONFIDENCE_THRESHOLD", "0.8"))
+
+# Reuse successful LLM plans for instructions of the same shape on the same site (PLAN_CACHE=false to opt out)
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE", "true").lower() not in ("0", "false", "no", "off")
+
+# Telemetry record of the workflow node currently running (LLM calls add token usage to it)
+_current_node_timing = contextvars.ContextVar("current_node_timing", default=None)
+
 class AgentState(TypedDict):
     """State structure for LangGraph agent"""
     instruction: str
@@ -47,6 +84,80 @@ class AgentState(TypedDict):
     error: str
     screenshots: list
     validations: list
+    step_records: list
+    timings: list
+    options: dict
+    using_fallback: bool
+    compiled: bool
+    cached_code: str
+    plan_cacheable: bool
+
+
+def _extract_token_usage(response) -> dict:
+    """Read prompt/completion/cached token counts from a LangChain chat response"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    metadata = getattr(response, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage") or {}
+    if token_usage:
+        usage["prompt_tokens"] = token_usage.get("prompt_tokens") or 0
+        usage["completion_tokens"] = token_usage.get("completion_tokens") or 0
+        usage["total_tokens"] = token_usage.get("total_tokens") or 0
+        details = token_usage.get("prompt_tokens_details") or {}
+        usage["cached_tokens"] = details.get("cached_tokens") or 0
+    else:
+        usage_metadata = getattr(response, "usage_metadata", None) or {}
+        usage["prompt_tokens"] = usage_metadata.get("input_tokens") or 0
+        usage["completion_tokens"] = usage_metadata.get("output_tokens") or 0
+        usage["total_tokens"] = usage_metadata.get("total_tokens") or 0
+        details = usage_metadata.get("input_token_details") or {}
+        usage["cached_tokens"] = details.get("cache_read") or 0
+    if not usage["total_tokens"]:
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return usage
+
+
+def _mark_replayed():
+    """Record the current node as served from a replayed plan (a cache hit without an LLM call)"""
+    record = _current_node_timing.get()
+    if record is not None:
+        record["cache"] = "hit"
+        record["replayed"] = True
+
+
+def _mark_plan_cached():
+    """Record the current node as served from the template plan cache (a cache hit without an LLM call)"""
+    record = _current_node_timing.get()
+    if record is not None:
+        record["cache"] = "hit"
+        record["plan_cache"] = "hit"
+
+
+def _mark_compiled(confidence: float = None):
+    """Record the current node as served by the rule-based compiler (no LLM call needed)"""
+    record = _current_node_timing.get()
+    if record is not None:
+        record["compiled"] = True
+        if confidence is not None:
+            record["compiler_confidence"] = confidence
+
+
+def _record_fallback_reason(error: Exception):
+    """Note on the current node why the fallback was used (e.g. CircuitOpen, RateLimited, RateLimitError)"""
+    record = _current_node_timing.get()
+    if record is not None:
+        record["fallback_reason"] = type(error).__name__
+
+
+def _summarize_token_usage(timings: list) -> dict:
+    """Totals of LLM calls, tokens and node time across a run's timing records"""
+    summary = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+               "cached_tokens": 0, "total_ms": 0.0}
+    for record in timings:
+        for key in ("llm_calls", "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"):
+            summary[key] += record.get(key, 0)
+        summary["total_ms"] += record.get("duration_ms", 0.0)
+    summary["total_ms"] = round(summary["total_ms"], 1)
+    return summary
 
 
 class AIWebsiteTester:
@@ -55,28 +166,38 @@ class AIWebsiteTester:
     Follows the architecture: Instruction → Parse → Generate Code → Execute → Report
     """
     
-    def __init__(self, model_name="gpt-3.5-turbo"):
-        """Initialize the AI agent with OpenAI model"""
-        # Initialize OpenAI LLM
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-        
-        self.llm = ChatOpenAI(
-            model=model_name,
-            temperature=0,
-            api_key=api_key
-        )
+    def __init__(self, model_name=None, screenshot_options=None, keep_browser=False, llm_backend=None):
+        """
+        Initialize the AI agent. The LLM backend (OpenAI, a local OpenAI-compatible
+        endpoint or rules-only) comes from LLM_BACKEND unless llm_backend is given;
+        without any key the agent runs on its rule-based parser. With keep_browser the
+        browser stays running between runs (only the context is recreated);
+        call close_browser() when done. The agent must then be used from a
+        single thread, as Playwright's sync API is thread-bound.
+        """
+        # LLM backend (shared per backend/model, so its concurrency limit spans agents)
+        self.llm = llm_backend or get_backend(model=model_name)
         
         # Initialize Playwright browser
         self.page = None
         self.browser = None
         self.context = None
         self.playwright_instance = None
+        self.keep_browser = keep_browser
+        
+        # Per-step bookkeeping for the run currently executing
+        self._metrics_sampler = None
+        self._run_steps = []
+        self._step_records = []
+        self._open_step = None
+        self._step_span = None
+        self._run_screenshots = []
+        self._initial_captured = False
+        self._filmstrip = None
+        self._page_performance = None
         
-        # Create screenshots directory
-        self.screenshots_dir = Path("screenshots")
-        self.screenshots_dir.mkdir(exist_ok=True)
+        # Screenshot encoding (in memory; disk copies only when persist is enabled)
+        self.screenshot_options = screenshot_options or screenshot_capture.ScreenshotOptions.from_env()
         
         # Build LangGraph workflow
         self.workflow = self._build_workflow()
@@ -85,11 +206,11 @@ class AIWebsiteTester:
         """Build the LangGraph workflow: Parse → Generate → Execute → Report"""
         workflow = StateGraph(AgentState)
         
-        # Add nodes
-        workflow.add_node("parse_instruction", self._parse_instruction)
-        workflow.add_node("generate_code", self._generate_playwright_code)
-        workflow.add_node("execute_test", self._execute_playwright_code)
-        workflow.add_node("generate_report", self._generate_report)
+        # Add nodes (each wrapped with timing / token telemetry)
+        workflow.add_node("parse_instruction", self._instrument_node("parse_instruction", self._parse_instruction))
+        workflow.add_node("generate_code", self._instrument_node("generate_code", self._generate_playwright_code))
+        workflow.add_node("execute_test", self._instrument_node("execute_test", self._execute_playwright_code))
+        workflow.add_node("generate_report", self._instrument_node("generate_report", self._generate_report))
         
         # Define edges
         workflow.set_entry_point("parse_instruction")
@@ -100,53 +221,149 @@ class AIWebsiteTester:
         
         return workflow.compile()
     
-    def _parse_instruction_fallback(self, instruction: str, website_url: str) -> list:
+    def _instrument_node(self, name: str, node):
         """
-        Fallback parser: Uses keyword matching when OpenAI API is unavailable
+        Wrap a workflow node so its latency, LLM token usage and cache status
+        are appended to state["timings"] (and mirrored into test_report["timings"])
         """
-        instruction_lower = instruction.lower()
-        steps = []
-        
-        # Always start with navigation
-        steps.append({"action": "navigate", "target": "website_url", "value": website_url})
-        
-        # Detect search action
-        search_keywords = ['search', 'search for', 'find', 'look for', 'query']
-        for keyword in search_keywords:
-            if keyword in instruction_lower:
-                # Extract search query
-                parts = instruction_lower.split(keyword)
-                if len(parts) > 1:
-                    search_query = parts[-1].strip()
-                    search_query = search_query.replace('for ', '').replace('the ', '').strip()
-                    if search_query:
-                        steps.append({
-                            "action": "search",
-                            "target": "search box",
-                            "value": search_query
-                        })
-                        steps.append({
-                            "action": "verify",
-                            "target": "search results",
-                            "assertion": "results displayed"
-                        })
-                break
-        
-        # Detect click action
-        if any(word in instruction_lower for word in ['click', 'press', 'select']):
-            steps.append({"action": "click", "target": "button", "value": None})
+        def instrumented(state: AgentState) -> AgentState:
+            record = {
+                "node": name,
+                "started_at": datetime.now().isoformat(),
+                "duration_ms": 0.0,
+                "status": "ok",
+                "llm_calls": 0,
+                "llm_ms": 0.0,
+                "llm_errors": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cached_tokens": 0,
+                "cache": None,
+                "fallback": False,
+            }
+            token = _current_node_timing.set(record)
+            span = tracing.start_span(f"node.{name}", {"workflow.node": name})
+            start = time.perf_counter()
+            try:
+                state = node(state)
+            except Exception as e:
+                record["status"] = "error"
+                span.record_exception(e)
+                span.end()
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                record["duration_ms"] = round(elapsed * 1000, 1)
+                _current_node_timing.reset(token)
+                metrics.NODE_DURATION.observe(elapsed, node=name)
+            
+            if state.get("error"):
+                record["status"] = "error"
+                span.set_status(tracing.STATUS_ERROR, str(state["error"])[:1000])
+            elif span.status == tracing.STATUS_UNSET:
+                span.set_status(tracing.STATUS_OK)
+            if name in ("parse_instruction", "generate_code"):
+                # Fallback whenever no LLM call succeeded for this node
+                record["fallback"] = bool(state.get("using_fallback")) or (
+                    record["llm_calls"] == record["llm_errors"] and record["cache"] != "hit"
+                    and not record.get("compiled"))
+            span.set_attributes({
+                "llm.calls": record["llm_calls"],
+                "llm.prompt_tokens": record["prompt_tokens"],
+                "llm.completion_tokens": record["completion_tokens"],
+                "workflow.fallback": record["fallback"],
+            })
+            span.end()
+            timings = state.get("timings") or []
+            timings.append(record)
+            state["timings"] = timings
+            if isinstance(state.get("test_report"), dict) and state["test_report"]:
+                state["test_report"]["timings"] = timings
+            return state
         
-        # Detect fill/input action
-        if any(word in instruction_lower for word in ['fill', 'enter', 'type', 'input']):
-            steps.append({"action": "fill", "target": "input field", "value": None})
+        return instrumented
+    
+    def _invoke_llm(self, messages: list):
+        """Invoke the LLM and record latency and token usage on the current node"""
+        record = _current_node_timing.get()
+        node = record["node"] if record is not None else "unknown"
+        start = time.perf_counter()
+        try:
+            with tracing.start_span("llm.invoke", {"workflow.node": node}):
+                response = self.llm.invoke(messages)
+        except Exception:
+            metrics.LLM_ERRORS.inc(node=node)
+            if record is not None:
+                record["llm_errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.LLM_CALL_DURATION.observe(elapsed, node=node)
+            if record is not None:
+                record["llm_calls"] += 1
+                record["llm_ms"] = round(record["llm_ms"] + elapsed * 1000, 1)
         
-        return steps
+        if record is not None:
+            usage = _extract_token_usage(response)
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens"):
+                record[key] += usage[key]
+            # Provider-side prompt cache: any cached prompt tokens count as a hit
+            record["cache"] = "hit" if record["cached_tokens"] else "miss"
+        return response
+    
+    def _parse_instruction_fallback(self, instruction: str, website_url: str) -> list:
+        """
+        Fallback parser: rule-based compiler output whatever its confidence,
+        used when the LLM is unavailable
+        """
+        return compile_instruction(instruction, website_url)["steps"]
     
     def _parse_instruction(self, state: AgentState) -> AgentState:
         """
         Instruction Parser Module: Interprets natural language and maps to browser actions
-        Uses OpenAI GPT with fallback to keyword matching
+        Uses the rule-based compiler when it is confident, otherwise the LLM (falling back to the compiler)
         """
+        replay = (state.get("options") or {}).get("replay") or {}
+        if replay.get("parsed_steps"):
+            # Steps from an earlier successful run of the same test: no LLM call
+            state["parsed_steps"] = replay["parsed_steps"]
+            state["error"] = None
+            _mark_replayed()
+            return state
+        
+        # Routine instructions compile with high confidence: no LLM call for parsing or code generation
+        compiled = compile_instruction(state["instruction"], state["website_url"])
+        if compiled["confidence"] >= INSTRUCTION_CONFIDENCE_THRESHOLD:
+            metrics.INSTRUCTIONS_COMPILED.inc(outcome="compiled")
+            state["parsed_steps"] = compiled["steps"]
+            state["error"] = None
+            state["compiled"] = True
+            _mark_compiled(compiled["confidence"])
+            return state
+        metrics.INSTRUCTIONS_COMPILED.inc(outcome="below_threshold")
+        record = _current_node_timing.get()
+        if record is not None:
+            record["compiler_confidence"] = compiled["confidence"]
+        
+        if PLAN_CACHE_ENABLED:
+            # Same instruction shape on the same site as an earlier LLM plan: reuse it with the new values
+            cached = plan_cache.lookup(state["website_url"], state["instruction"])
+            metrics.PLAN_CACHE_LOOKUPS.inc(outcome="hit" if cached else "miss")
+            if cached:
+                state["parsed_steps"] = cached["parsed_steps"]
+                state["cached_code"] = cached["generated_code"]
+                state["error"] = None
+                _mark_plan_cached()
+                return state
+        
+        if not getattr(self.llm, "available", True):
+            # Rules-only backend: use the compiled steps anyway (and the rule-based code generator)
+            state["parsed_steps"] = compiled["steps"]
+            state["error"] = None
+            state["using_fallback"] = True
+            return state
+        
         try:
             system_prompt = """You are an expert test automation engineer. 
             Parse the natural language test instruction and extract actionable test steps.
@@ -176,7 +393,7 @@ class AIWebsiteTester:
                 HumanMessage(content=user_message)
             ]
             
-            response = self.llm.invoke(messages)
+            response = self._invoke_llm(messages)
             response_text = response.content.strip()
             
             # Extract JSON from response
@@ -191,69 +408,67 @@ class AIWebsiteTester:
             state["error"] = None
             
         except Exception as e:
-            error_str = str(e).lower()
-            # Check if it's a quota/API error or connection error
-            if any(keyword in error_str for keyword in ["quota", "429", "insufficient_quota", "connection", "timeout", "network"]):
-                # Use fallback parser
-                state["parsed_steps"] = self._parse_instruction_fallback(
-                    state["instruction"], 
-                    state["website_url"]
-                )
-                state["error"] = None
-                state["using_fallback"] = True
-            else:
-                # For other errors, still try fallback
-                state["parsed_steps"] = self._parse_instruction_fallback(
-                    state["instruction"], 
-                    state["website_url"]
-                )
-                state["error"] = None
-                state["using_fallback"] = True
+            # The backend has already retried transient errors (or refused the call
+            # at once while its circuit is open), so anything left goes to the fallback
+            metrics.FALLBACK_ACTIVATIONS.inc(node="parse_instruction")
+            _record_fallback_reason(e)
+            state["parsed_steps"] = self._parse_instruction_fallback(
+                state["instruction"], 
+                state["website_url"]
+            )
+            state["error"] = None
+            state["using_fallback"] = True
         
         return state
     
     def _generate_playwright_code_fallback(self, parsed_steps: list, website_url: str) -> str:
         """
-        Fallback code generator: Creates Playwright code directly from parsed steps
+        Fallback code generator: Creates Playwright code directly from parsed steps,
+        with selectors and waits from the site's profile (profiles/*.json)
         """
+        profile = site_profiles.profile_for(website_url)
+        selectors = profile["selectors"]
+        wait = profile["wait"]
+        load_state = wait.get("load_state", "domcontentloaded")
+        networkidle_ms = int(wait.get("networkidle_ms") or 0)
+        
+        def goto_lines(url: str) -> list:
+            lines = [f'page.goto({url!r}, wait_until={load_state!r}, timeout=60000)']
+            if networkidle_ms:
+                lines += ["try:",
+                          f"    page.wait_for_load_state('networkidle', timeout={networkidle_ms})",
+                          "except:",
+                          "    pass  # Continue even if networkidle times out"]
+            return lines
+        
         code_lines = [
             "# Generated Playwright test code",
+            f"# Site profile: {profile['name']}",
             "from playwright.sync_api import expect",
             "",
             "# Navigate to website with timeout",
-            f'page.goto("{website_url}", wait_until="domcontentloaded", timeout=60000)',
-            "try:",
-            "    page.wait_for_load_state('networkidle', timeout=30000)",
-            "except:",
-            "    pass  # Continue even if networkidle times out",
+            *goto_lines(website_url),
             "",
         ]
         
-        for step in parsed_steps:
+        for index, step in enumerate(parsed_steps):
             action = step.get("action", "")
-            target = step.get("target", "")
-            value = step.get("value", "")
+            target = str(step.get("target") or "")
+            value = step.get("value")
+            value = "" if value is None else value
+            
+            # Step boundary: lets the executor sample runtime metrics per step
+            code_lines.append(f"mark_step({index})")
             
             if action == "navigate":
-                if value:
-                    code_lines.append(f'page.goto("{value}", wait_until="domcontentloaded", timeout=60000)')
-                    code_lines.append("try:")
-                    code_lines.append("    page.wait_for_load_state('networkidle', timeout=30000)")
-                    code_lines.append("except:")
-                    code_lines.append("    pass")
+                # The header already opened website_url; only navigate elsewhere
+                if value and value != website_url and target != "website_url":
+                    code_lines.extend(goto_lines(value))
             
             elif action == "search":
                 # Try multiple search box selectors with better timeout handling
                 code_lines.append("# Find and fill search box")
-                code_lines.append("search_selectors = [")
-                code_lines.append("    '#twotabsearchtextbox',  # Amazon specific")
-                code_lines.append("    'input[type=\"search\"]',")
-                code_lines.append("    'input[name=\"q\"]',")
-                code_lines.append("    'textarea[name=\"q\"]',  # Google sometimes uses textarea for search box")
-                code_lines.append("    'input[name=\"search\"]',")
-                code_lines.append("    'input[id*=\"search\"]',")
-                code_lines.append("    'input[placeholder*=\"search\" i]',")
-                code_lines.append("]")
+                code_lines.append(f"search_selectors = {selectors.get('search_input') or []!r}")
                 code_lines.append("")
                 code_lines.append("search_input = None")
                 code_lines.append("for selector in search_selectors:")
@@ -267,21 +482,30 @@ class AIWebsiteTester:
                 code_lines.append("")
                 code_lines.append("if search_input:")
                 code_lines.append("    try:")
-                code_lines.append(f'        search_input.fill("{value}", timeout=10000)')
+                code_lines.append(f'        search_input.fill({value!r}, timeout=10000)')
                 code_lines.append("        time.sleep(0.5)  # Brief pause before submitting")
-                code_lines.append("        # Wait for navigation after search (context will be destroyed)")
-                code_lines.append("        with page.expect_navigation(timeout=30000, wait_until='domcontentloaded'):")
-                code_lines.append("            # Try to submit")
-                code_lines.append("            try:")
-                code_lines.append("                page.keyboard.press('Enter')")
-                code_lines.append("            except:")
-                code_lines.append("                # Try to find and click search button")
-                code_lines.append("                try:")
-                code_lines.append("                    page.locator('#nav-search-submit-button, button[type=\"submit\"], input[type=\"submit\"]').first.click(timeout=10000)")
-                code_lines.append("                except:")
-                code_lines.append("                    pass")
-                code_lines.append("        # Wait a bit for page to fully load after navigation")
-                code_lines.append("        time.sleep(2)")
+                submit_selector = ", ".join(selectors.get("search_submit") or ['button[type="submit"]'])
+                submit_lines = [
+                    "# Try to submit",
+                    "try:",
+                    "    page.keyboard.press('Enter')",
+                    "except:",
+                    "    # Try to find and click search button",
+                    "    try:",
+                    f"        page.locator({submit_selector!r}).first.click(timeout=10000)",
+                    "    except:",
+                    "        pass",
+                ]
+                if wait.get("search_navigates", True):
+                    code_lines.append("        # Wait for navigation after search (context will be destroyed)")
+                    code_lines.append(f"        with page.expect_navigation(timeout=30000, wait_until={load_state!r}):")
+                    code_lines.extend("            " + line for line in submit_lines)
+                else:
+                    code_lines.extend("        " + line for line in submit_lines)
+                settle_ms = int(wait.get("settle_ms") or 0)
+                if settle_ms:
+                    code_lines.append("        # Wait a bit for page to fully load after navigation")
+                    code_lines.append(f"        time.sleep({settle_ms / 1000})")
                 code_lines.append("    except Exception as e:")
                 code_lines.append("        # If navigation fails, try without navigation context")
                 code_lines.append("        try:")
@@ -291,7 +515,12 @@ class AIWebsiteTester:
             
             elif action == "click":
                 code_lines.append(f"# Click {target}")
-                code_lines.append(f"page.locator('{target}').first.click(timeout=30000)")
+                if target.startswith(("#", ".", "[", "//")):
+                    code_lines.append(f"page.locator({target!r}).first.click(timeout=30000)")
+                else:
+                    # Button or link by accessible name, otherwise any element with that text
+                    code_lines.append(f"page.get_by_role('button', name={target!r}).or_(page.get_by_role('link', name={target!r}))"
+                                      f".or_(page.get_by_text({target!r})).first.click(timeout=30000)")
                 code_lines.append("try:")
                 code_lines.append("    page.wait_for_load_state('domcontentloaded', timeout=15000)")
                 code_lines.append("except:")
@@ -299,11 +528,48 @@ class AIWebsiteTester:
             
             elif action == "fill":
                 code_lines.append(f"# Fill {target}")
-                code_lines.append(f"page.locator('{target}').first.fill('{value}')")
+                if target.startswith(("#", ".", "[", "//")):
+                    code_lines.append(f"page.locator({target!r}).first.fill({value!r}, timeout=30000)")
+                else:
+                    # Field by label, placeholder or name attribute
+                    name_selector = f'[name="{target}" i]'
+                    code_lines.append(f"page.get_by_label({target!r}).or_(page.get_by_placeholder({target!r}))"
+                                      f".or_(page.locator({name_selector!r})).first.fill({value!r}, timeout=30000)")
+            
+            elif action == "press":
+                code_lines.append(f"page.keyboard.press({value!r})")
+                code_lines.append("try:")
+                code_lines.append("    page.wait_for_load_state('domcontentloaded', timeout=15000)")
+                code_lines.append("except:")
+                code_lines.append("    pass")
+            
+            elif action == "wait":
+                if target == "time" and value:
+                    code_lines.append(f"page.wait_for_timeout({int(value)})")
+                else:
+                    code_lines.append("page.wait_for_load_state('load', timeout=30000)")
+            
+            elif action == "scroll":
+                position = "0" if value == "top" else "document.body.scrollHeight"
+                code_lines.append(f"page.evaluate('window.scrollTo(0, {position})')")
             
             elif action == "verify":
                 code_lines.append(f"# Verify {target}")
-                code_lines.append(f"# Assertion: {step.get('assertion', 'element exists')}")
+                if target == "text" and value:
+                    code_lines.append(f"page.get_by_text({value!r}).first.wait_for(state='visible', timeout=15000)")
+                elif target == "title" and value:
+                    code_lines.append(f"assert {str(value).lower()!r} in page.title().lower(), "
+                                      f"'Title does not contain ' + {value!r}")
+                elif target == "url" and value:
+                    code_lines.append(f"assert {str(value).lower()!r} in page.url.lower(), 'URL does not contain ' + {value!r}")
+                elif target == "search results" and selectors.get("search_results"):
+                    results_selector = ", ".join(selectors["search_results"])
+                    code_lines.append("try:")
+                    code_lines.append(f"    page.locator({results_selector!r}).first.wait_for(state='visible', timeout=15000)")
+                    code_lines.append("except:")
+                    code_lines.append("    pass  # Reported by the search_results validation")
+                else:
+                    code_lines.append(f"# Assertion: {step.get('assertion', 'element exists')}")
         
         code_lines.append("")
         code_lines.append("# Capture screenshot after actions")
@@ -324,8 +590,23 @@ class AIWebsiteTester:
         Code Generation Module: Converts parsed actions into executable Playwright scripts
         Uses OpenAI GPT with fallback to direct code generation
         """
-        # If using fallback parser, use fallback code generator
-        if state.get("using_fallback"):
+        replay = (state.get("options") or {}).get("replay") or {}
+        if replay.get("generated_code"):
+            state["generated_code"] = replay["generated_code"]
+            state["error"] = None
+            _mark_replayed()
+            return state
+        
+        if state.get("cached_code"):
+            state["generated_code"] = state["cached_code"]
+            state["error"] = None
+            _mark_plan_cached()
+            return state
+        
+        # Compiled steps map one-to-one onto code; the fallback parser (or no model) also skips the LLM
+        if state.get("compiled"):
+            _mark_compiled()
+        if state.get("compiled") or state.get("using_fallback") or not getattr(self.llm, "available", True):
             state["generated_code"] = self._generate_playwright_code_fallback(
                 state["parsed_steps"],
                 state["website_url"]
@@ -358,6 +639,9 @@ class AIWebsiteTester:
             - Use expect() for assertions
             - Handle timeouts gracefully with try/except
             
+            A helper function mark_step(index) is already defined. Call mark_step(i)
+            immediately before the code for parsed step i (0-based), for every step.
+            
             Return ONLY the Python code, no explanations.
             """
             
@@ -375,7 +659,7 @@ class AIWebsiteTester:
                 HumanMessage(content=user_message)
             ]
             
-            response = self.llm.invoke(messages)
+            response = self._invoke_llm(messages)
             code = response.content.strip()
             
             # Extract code block if present
@@ -386,165 +670,189 @@ class AIWebsiteTester:
             
             state["generated_code"] = code
             state["error"] = None
+            # Both nodes came from the LLM: worth caching as a template if the run succeeds
+            state["plan_cacheable"] = True
             
         except Exception as e:
-            error_str = str(e).lower()
-            # Check if it's a quota/API error or connection error
-            if any(keyword in error_str for keyword in ["quota", "429", "insufficient_quota", "connection", "timeout", "network"]):
-                # Use fallback code generator
-                state["generated_code"] = self._generate_playwright_code_fallback(
-                    state["parsed_steps"],
-                    state["website_url"]
-                )
-                state["error"] = None
-            else:
-                # For other errors, still try fallback to ensure tests can run
-                state["generated_code"] = self._generate_playwright_code_fallback(
-                    state["parsed_steps"],
-                    state["website_url"]
-                )
-                state["error"] = None
+            # Retries and circuit breaking happen in the backend; fall back on whatever is left
+            metrics.FALLBACK_ACTIVATIONS.inc(node="generate_code")
+            _record_fallback_reason(e)
+            state["generated_code"] = self._generate_playwright_code_fallback(
+                state["parsed_steps"],
+                state["website_url"]
+            )
+            state["error"] = None
         
         return state
     
     def _capture_screenshot(self, name: str = "screenshot") -> dict:
-        """Capture screenshot and return base64 encoded data"""
+        """Capture screenshot into memory and add it to the content-addressed store"""
         try:
             if not self.page:
                 return None
             
+            options = self.screenshot_options
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            screenshot_path = self.screenshots_dir / f"{name}_{timestamp}.png"
-            self.page.screenshot(path=str(screenshot_path), full_page=True)
+            raw, image_format = screenshot_capture.capture_screenshot(self.page, options)
+            metrics.SCREENSHOT_BYTES.observe(len(raw))
+            filename = f"{name}_{timestamp}.{'jpg' if image_format == 'jpeg' else image_format}"
             
-            # Read and encode as base64
-            with open(screenshot_path, "rb") as f:
-                screenshot_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            return {
-                "path": str(screenshot_path),
-                "base64": screenshot_data,
-                "name": f"{name}_{timestamp}.png",
-                "timestamp": timestamp
+            mime_type = screenshot_capture.MIME_TYPES[image_format]
+            # Without persist the store keeps the frame in memory only (no disk write on the hot path)
+            artifact_id = screenshot_store.put(raw, mime_type, persist=options.persist)
+            screenshot = {
+                "id": artifact_id,
+                "url": screenshot_store.url_for(artifact_id),
+                "name": filename,
+                "timestamp": timestamp,
+                "format": image_format,
+                "mime_type": mime_type,
+                "size_bytes": len(raw)
             }
+            
+            # With persist the store's background writer keeps the only disk copy; point at it
+            if options.persist:
+                screenshot["path"] = str(screenshot_store.path_for(artifact_id, EXTENSIONS.get(mime_type, "bin")))
+            
+            return screenshot
         except Exception as e:
             return {"error": str(e)}
     
+    def _sample_runtime_metrics(self) -> dict:
+        """Sample CDP runtime metrics for the current page (None if unavailable)"""
+        if not self._metrics_sampler:
+            return None
+        try:
+            return self._metrics_sampler.sample(self.page)
+        except Exception:
+            return None
+    
+    def _mark_step(self, index=None):
+        """
+        Step boundary hook, exposed to generated code as mark_step(index).
+        Closes the previous step and starts measuring the next one.
+        """
+        self._close_step()
+        if index is not None:
+            self._capture_initial_screenshot()
+        step = {}
+        if isinstance(index, int) and 0 <= index < len(self._run_steps):
+            step = self._run_steps[index] or {}
+        self._open_step = {
+            "index": index,
+            "action": step.get("action", "script" if index is None else None),
+            "target": step.get("target"),
+            "started": time.perf_counter(),
+            "metrics_before": self._sample_runtime_metrics(),
+        }
+        self._step_span = tracing.start_span("step", {
+            "step.index": index if index is not None else -1,
+            "step.action": self._open_step["action"],
+            "step.target": str(self._open_step["target"])[:200] if self._open_step["target"] else None,
+        })
+        if self._metrics_sampler:
+            self._metrics_sampler.reattached = False
+    
+    def _close_step(self):
+        """Finish the open step and attach its runtime metric deltas"""
+        step = self._open_step
+        if step is None:
+            return
+        self._open_step = None
+        before = step.pop("metrics_before")
+        started = step.pop("started")
+        after = self._sample_runtime_metrics()
+        step["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        step["runtime_metrics"] = metrics_delta(before, after)
+        if step["runtime_metrics"] is not None and self._metrics_sampler and self._metrics_sampler.reattached:
+            # Renderer was swapped mid-step (cross-site navigation), counters restarted
+            step["metrics_reset"] = True
+        self._capture_step_frame(step)
+        self._step_records.append(step)
+        if self._step_span is not None:
+            self._step_span.set_status(tracing.STATUS_OK)
+            self._step_span.end()
+            self._step_span = None
+    
+    def _capture_initial_screenshot(self):
+        """Take the "initial" screenshot before the first step that runs on a loaded page"""
+        if self._initial_captured or not self.page:
+            return
+        try:
+            if self.page.url == "about:blank":
+                return
+            self._initial_captured = True
+            initial_screenshot = self._capture_screenshot("initial")
+            if initial_screenshot:
+                self._run_screenshots.append(initial_screenshot)
+        except Exception:
+            pass
+    
+    def _capture_step_frame(self, step: dict):
+        """Filmstrip: attach a (deduplicated) viewport frame to a finished step"""
+        if not self._filmstrip or not self.page:
+            return
+        try:
+            step["frame"] = self._filmstrip.capture(self.page, step["index"])
+        except Exception as e:
+            step["frame"] = {"error": str(e)}
+    
+    def _check_visual_regression(self, state: AgentState, screenshot: dict) -> dict:
+        """Diff the final screenshot against the baseline for this URL, instruction and viewport"""
+        options = state.get("options") or {}
+        stored = screenshot_store.get(screenshot["id"])
+        if stored is None:
+            return {"status": "error", "message": "Final screenshot not available"}
+        viewport = self.page.viewport_size or {}
+        viewport_key = f"{viewport.get('width')}x{viewport.get('height')}" + ("-full" if self.screenshot_options.full_page else "")
+        with tracing.start_span("visual.diff", {"visual.viewport": viewport_key}) as span:
+            result = visual_baselines.check(
+                state["website_url"], state["instruction"], viewport_key,
+                screenshot["id"], stored[0],
+                masks=options.get("visual_masks"),
+                update=options.get("visual") == "update",
+                mime_type=stored[1],
+                persist=self.screenshot_options.persist,
+            )
+            span.set_attributes({"visual.status": result.get("status"), "visual.score": result.get("score")})
+        return result
+    
+    def _check_performance_regression(self, result: dict):
+        """Flag metrics that regressed against the URL/instruction baseline; only successful runs update it"""
+        try:
+            with tracing.start_span("performance.regression") as span:
+                regressions = regression_detector.check(
+                    result["websiteUrl"], result["testInstruction"], result["performance"],
+                    update=result.get("status") == "success",
+                )
+                span.set_attributes({"regression.status": regressions["status"],
+                                     "regression.flagged": len(regressions["flagged"])})
+        except Exception as e:
+            print(f"Regression check failed: {e}")
+            return
+        result["regressions"] = regressions
+        for item in regressions["flagged"]:
+            metrics.REGRESSIONS_DETECTED.inc(metric=item["metric"])
+        if regressions["flagged"]:
+            result.setdefault("results", []).append(f"\n📉 Performance regression ({len(regressions['flagged'])} metric(s)):")
+            for item in regressions["flagged"]:
+                result["results"].append(
+                    f"⚠️ {item['metric']}: {item['value']:g} vs baseline {item['baseline_mean']:g} "
+                    f"(+{item['change_pct']}%, z={item['z_score']}, n={item['samples']})"
+                )
+        elif regressions["status"] == "ok":
+            result.setdefault("results", []).append(
+                f"\n📈 No performance regression ({len(regressions['checked'])} metric(s) within baseline)")
+    
     def _validate_page(self, instruction: str) -> list:
-        """Validate page elements based on instruction"""
+        """Validate page elements based on instruction (single in-page round trip)"""
         validations = []
         try:
             if not self.page:
                 return validations
-            
-            instruction_lower = instruction.lower()
-            # Get page content properly - content() is a method in Playwright
-            try:
-                page_content = self.page.content()
-                page_text = page_content.lower() if isinstance(page_content, str) else ""
-            except:
-                # Fallback: try to get text from body
-                try:
-                    page_text = self.page.locator("body").inner_text().lower()
-                except:
-                    page_text = ""
-            page_url = self.page.url
-            
-            # Validate URL is correct
-            validations.append({
-                "type": "url_validation",
-                "status": "pass",
-                "message": f"Successfully navigated to: {page_url}",
-                "details": {"url": page_url}
-            })
-            
-            # Check if page loaded
-            title = self.page.title()
-            validations.append({
-                "type": "page_load",
-                "status": "pass",
-                "message": f"Page loaded successfully: {title}",
-                "details": {"title": title}
-            })
-            
-            # Check for search-related content
-            if "search" in instruction_lower or "find" in instruction_lower:
-                search_inputs = self.page.locator("input[type='search'], input[name*='search'], input[id*='search'], textarea[name='q'], input[name='q'], #twotabsearchtextbox").count()
-                if search_inputs > 0:
-                    validations.append({
-                        "type": "search_box",
-                        "status": "pass",
-                        "message": f"Found {search_inputs} search input field(s)",
-                        "details": {"count": search_inputs}
-                    })
-                else:
-                    validations.append({
-                        "type": "search_box",
-                        "status": "warning",
-                        "message": "Search box not found",
-                        "details": {}
-                    })
-            
-            # Check for images
-            if "image" in instruction_lower or "picture" in instruction_lower:
-                images = self.page.locator("img").count()
-                validations.append({
-                    "type": "images",
-                    "status": "pass",
-                    "message": f"Found {images} image(s) on page",
-                    "details": {"count": images}
-                })
-            
-            # Check for links
-            if "link" in instruction_lower:
-                links = self.page.locator("a[href]").count()
-                validations.append({
-                    "type": "links",
-                    "status": "pass",
-                    "message": f"Found {links} link(s) on page",
-                    "details": {"count": links}
-                })
-            
-            # Check for forms
-            if "form" in instruction_lower:
-                forms = self.page.locator("form").count()
-                validations.append({
-                    "type": "forms",
-                    "status": "pass",
-                    "message": f"Found {forms} form(s) on page",
-                    "details": {"count": forms}
-                })
-            
-            # Extract search query if mentioned
-            if "search" in instruction_lower and page_text:
-                for word in ["search for", "find", "look for", "search"]:
-                    if word in instruction_lower:
-                        query = instruction_lower.split(word)[-1].strip().split()[0:3]  # Get first few words
-                        query_text = " ".join(query).strip()
-                        if query_text and len(query_text) > 0:
-                            # Check if query appears in page (case-insensitive)
-                            if query_text.lower() in page_text:
-                                validations.append({
-                                    "type": "content_validation",
-                                    "status": "pass",
-                                    "message": f"Found search query '{query_text}' in page content",
-                                    "details": {"query": query_text}
-                                })
-                            else:
-                                # Check if page title contains the query
-                                try:
-                                    title = self.page.title().lower()
-                                    if query_text.lower() in title:
-                                        validations.append({
-                                            "type": "content_validation",
-                                            "status": "pass",
-                                            "message": f"Found search query '{query_text}' in page title",
-                                            "details": {"query": query_text}
-                                        })
-                                except:
-                                    pass
-                        break
-            
+            validations, performance = validation_engine.evaluate_page(self.page, instruction)
+            if performance:
+                self._page_performance = performance
         except Exception as e:
             validations.append({
                 "type": "validation_error",
@@ -579,27 +887,56 @@ class AIWebsiteTester:
         
         screenshots = []
         validations = []
+        self._run_steps = state.get("parsed_steps") or []
+        self._step_records = []
+        self._open_step = None
+        self._run_screenshots = screenshots
+        self._initial_captured = False
+        self._filmstrip = None
+        self._page_performance = None
+        trace_recorder = None
+        execute_start = None
         
         try:
             # Initialize Playwright with increased timeouts
-            self.playwright_instance = sync_playwright().start()
-            self.browser = self.playwright_instance.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-            )
+            if not (self.keep_browser and self.browser and self.browser.is_connected()):
+                self._close_browser_process()
+                launch_start = time.perf_counter()
+                with tracing.start_span("browser.launch", {"browser.name": "chromium"}):
+                    self.playwright_instance = sync_playwright().start()
+                    self.browser = self.playwright_instance.chromium.launch(
+                        headless=True,
+                        args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+                    )
+                metrics.BROWSER_LAUNCH_DURATION.observe(time.perf_counter() - launch_start, browser="chromium")
             self.context = self.browser.new_context(
                 viewport={"width": 1920, "height": 1080},
                 user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             )
+            # LCP/CLS observers, read back with the validation round trip
+            self.context.add_init_script(validation_engine.VITALS_INIT_SCRIPT)
+            # Requests the site profile blocks (ads, beacons) never leave the browser
+            block_handler = blocking_handler(site_profiles.profile_for(state["website_url"]))
+            if block_handler:
+                self.context.route("**/*", block_handler)
+            # Playwright trace (snapshots, sources, network); kept only per the retention policy
+            trace_policy = (state.get("options") or {}).get("trace", trace_capture.POLICY_OFF)
+            if trace_policy != trace_capture.POLICY_OFF:
+                trace_recorder = trace_capture.TraceRecorder(self.context, trace_policy)
+                trace_recorder.start()
             self.page = self.context.new_page()
             # Set default timeout to 60 seconds
             self.page.set_default_timeout(60000)
             self.page.set_default_navigation_timeout(60000)
+            # Test body timing (browser launch excluded), compared across traced and untraced runs
+            execute_start = time.perf_counter()
             
-            # Capture initial screenshot
-            initial_screenshot = self._capture_screenshot("initial")
-            if initial_screenshot:
-                screenshots.append(initial_screenshot)
+            # Per-step runtime metrics via CDP (Chromium only)
+            self._metrics_sampler = RuntimeMetricsSampler(self.context)
+            
+            # Filmstrip: cheap deduplicated viewport frame after every step
+            if (state.get("options") or {}).get("filmstrip"):
+                self._filmstrip = Filmstrip(screenshot_store, persist=self.screenshot_options.persist)
             
             # Create a safe execution environment
             execution_globals = {
@@ -609,11 +946,15 @@ class AIWebsiteTester:
                 "time": time,
                 "json": json,
                 "datetime": datetime,
+                "mark_step": self._mark_step,
             }
             
             # Execute the generated code with timeout protection
             navigation_occurred = False
             try:
+                # Anything before the first mark_step() (or the whole script if the
+                # generated code has no markers) is measured as a "script" step
+                self._mark_step(None)
                 exec(state["generated_code"], execution_globals)
             except Exception as exec_error:
                 error_msg = str(exec_error)
@@ -658,10 +999,13 @@ class AIWebsiteTester:
                     if not any(keyword in error_msg.lower() for keyword in ["closed", "destroyed", "navigation"]):
                         raise exec_error
             
+            self._close_step()
+            
             # Wait a bit for page to settle (reduced from 2 to 1 second)
             time.sleep(1)
             
             # Capture final screenshot - handle case where page might have navigated
+            final_screenshot = None
             try:
                 final_screenshot = self._capture_screenshot("final")
                 if final_screenshot:
@@ -677,6 +1021,14 @@ class AIWebsiteTester:
                 except:
                     pass  # Continue even if screenshot fails
             
+            # Visual regression check of the final screenshot against its baseline
+            visual_result = None
+            if (state.get("options") or {}).get("visual") and final_screenshot and "error" not in final_screenshot:
+                try:
+                    visual_result = self._check_visual_regression(state, final_screenshot)
+                except Exception as visual_error:
+                    visual_result = {"status": "error", "message": str(visual_error)}
+            
             # Run validations - handle case where page might have navigated
             try:
                 validations = self._validate_page(state["instruction"])
@@ -750,6 +1102,12 @@ class AIWebsiteTester:
             # Add validation results to execution result
             execution_result["validations"] = validations
             execution_result["screenshots_count"] = len(screenshots)
+            if visual_result:
+                execution_result["visual"] = visual_result
+            if self._page_performance:
+                execution_result["performance"] = self._page_performance
+            if self._filmstrip:
+                execution_result["filmstrip"] = {"kept": self._filmstrip.kept, "dropped": self._filmstrip.dropped}
             
             state["execution_result"] = execution_result
             state["screenshots"] = screenshots
@@ -773,6 +1131,25 @@ class AIWebsiteTester:
             state["error"] = f"Execution error: {str(e)}"
         
         finally:
+            self._close_step()
+            state["step_records"] = self._step_records
+            failed = bool(state.get("error")) or any(
+                v.get("status") == "error" for v in state.get("validations") or [])
+            execute_ms = round((time.perf_counter() - execute_start) * 1000, 1) if execute_start else None
+            baseline_key = regression_detector.key_for(state["website_url"], state["instruction"])
+            if execute_ms is not None:
+                metrics.EXECUTE_DURATION.observe(execute_ms / 1000, traced="true" if trace_recorder else "false")
+                if not trace_recorder and not failed:
+                    trace_capture.untraced_durations.observe(baseline_key, execute_ms)
+            if trace_recorder:
+                trace_entry = trace_recorder.finish(failed, execute_ms, baseline_key)
+                if trace_entry:
+                    metrics.PLAYWRIGHT_TRACE_START_STOP.observe(
+                        trace_entry["start_stop_ms"] / 1000, outcome="kept" if trace_entry["retained"] else "discarded")
+                    state["execution_result"]["playwright_trace"] = trace_entry
+            if self._metrics_sampler:
+                self._metrics_sampler.detach()
+                self._metrics_sampler = None
             # Cleanup
             self._cleanup_browser()
         
@@ -796,24 +1173,16 @@ class AIWebsiteTester:
                 "execution_details": execution_result,
                 "parsed_steps": parsed_steps,
                 "generated_code": state.get("generated_code", ""),
+                "steps": state.get("step_records", []),
             }
+            if "visual" in execution_result:
+                report["visual_regression"] = execution_result["visual"]
+            if "playwright_trace" in execution_result:
+                report["playwright_trace"] = execution_result["playwright_trace"]
             
-            # Add performance metrics if available
-            if self.page:
-                try:
-                    performance = self.page.evaluate("""
-                        () => {
-                            const perf = performance.timing;
-                            return {
-                                loadTime: perf.loadEventEnd - perf.navigationStart,
-                                domContentLoaded: perf.domContentLoadedEventEnd - perf.navigationStart,
-                                pageSize: document.documentElement.innerHTML.length
-                            };
-                        }
-                    """)
-                    report["performance"] = performance
-                except:
-                    pass
+            # Performance metrics were collected with the validations (the browser is closed by now)
+            if execution_result.get("performance"):
+                report["performance"] = execution_result["performance"]
             
             state["test_report"] = report
             state["error"] = None
@@ -828,12 +1197,23 @@ class AIWebsiteTester:
         return state
     
     def _cleanup_browser(self):
-        """Clean up browser resources"""
+        """Clean up browser resources (the browser itself is kept with keep_browser)"""
         try:
             if self.page:
                 self.page.close()
             if self.context:
                 self.context.close()
+        except:
+            pass
+        finally:
+            self.page = None
+            self.context = None
+        if not self.keep_browser:
+            self._close_browser_process()
+    
+    def _close_browser_process(self):
+        """Close the browser and stop Playwright"""
+        try:
             if self.browser:
                 self.browser.close()
             if self.playwright_instance:
@@ -841,16 +1221,94 @@ class AIWebsiteTester:
         except:
             pass
         finally:
-            self.page = None
-            self.context = None
             self.browser = None
             self.playwright_instance = None
     
-    def run_test(self, website_url: str, test_instruction: str, browser: str = "chrome"):
+    def close_browser(self):
+        """Release everything, including a browser kept with keep_browser"""
+        self._cleanup_browser()
+        self._close_browser_process()
+    
+    def run_test(self, website_url: str, test_instruction: str, browser: str = "chrome",
+                 inline_screenshots: bool = False, filmstrip: bool = None, visual=None, visual_masks=None,
+                 trace=None, replay=None):
         """
         Main method to run tests based on natural language instruction.
         Follows the workflow: Instruction → Parse → Generate → Execute → Report
+        Screenshots are returned by reference (id + url); set inline_screenshots
+        to also embed them as base64. filmstrip captures a deduplicated viewport
+        frame after every step (defaults to the FILMSTRIP env setting).
+        visual compares the final screenshot with a stored baseline (True, or
+        "update" to replace the baseline; defaults to VISUAL_REGRESSION);
+        visual_masks is a list of {x, y, width, height} regions to ignore.
+        trace records a Playwright trace: "on", "retain-on-failure" (True) or
+        "off" (defaults to PLAYWRIGHT_TRACE).
+        replay ({"parsed_steps", "generated_code"} from an earlier successful
+        run) skips the LLM nodes and executes that plan again.
         """
+        if filmstrip is None:
+            filmstrip = os.getenv("FILMSTRIP", "").lower() in ("1", "true", "yes", "on")
+        if visual is None:
+            visual = os.getenv("VISUAL_REGRESSION", "").lower()
+            visual = "update" if visual == "update" else visual in ("1", "true", "yes", "on")
+        options = {
+            "run_id": uuid.uuid4().hex[:12],
+            "inline_screenshots": inline_screenshots,
+            "filmstrip": filmstrip,
+            "visual": visual,
+            "visual_masks": parse_masks(visual_masks if visual_masks is not None else os.getenv("VISUAL_MASKS")),
+            "trace": trace_capture.resolve_policy(trace),
+            "replay": replay,
+        }
+        metrics.RUNS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        status = "error"
+        span = tracing.start_span("run_test", {
+            "test.run_id": options["run_id"],
+            "test.url": website_url,
+            "test.instruction": test_instruction[:200],
+            "test.browser": browser,
+        })
+        try:
+            result = self._run_workflow(website_url, test_instruction, browser, options)
+            status = result.get("status", "unknown")
+            span.set_attribute("test.status", status)
+            if status == "error":
+                span.set_status(tracing.STATUS_ERROR, str(result.get("error", ""))[:1000])
+            else:
+                span.set_status(tracing.STATUS_OK)
+            result["runId"] = options["run_id"]
+            result["traceId"] = span.trace_id
+            if REGRESSION_ENABLED and result.get("performance"):
+                self._check_performance_regression(result)
+            if HISTORY_ENABLED:
+                # Queued for the history writer thread; no disk I/O on the test path
+                history_store.record(result, duration_ms=round((time.perf_counter() - start) * 1000, 1))
+            return result
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.end()
+            metrics.RUN_DURATION.observe(time.perf_counter() - start)
+            metrics.RUNS_TOTAL.inc(status=status)
+            metrics.RUNS_IN_PROGRESS.dec()
+    
+    def _update_plan_cache(self, state: AgentState, succeeded: bool):
+        """Store a successful LLM plan as a template; drop a cached template whose plan failed"""
+        try:
+            if state.get("cached_code") and not succeeded:
+                plan_cache.invalidate(state["website_url"], state["instruction"])
+                metrics.PLAN_CACHE_STORES.inc(outcome="invalidated")
+            elif state.get("plan_cacheable") and succeeded:
+                stored = plan_cache.store(state["website_url"], state["instruction"],
+                                          state.get("parsed_steps") or [], state.get("generated_code") or "")
+                metrics.PLAN_CACHE_STORES.inc(outcome="stored" if stored else "uncacheable")
+        except Exception as e:
+            print(f"⚠️ Plan cache update failed: {e}")
+    
+    def _run_workflow(self, website_url: str, test_instruction: str, browser: str, options: dict) -> dict:
+        """Invoke the LangGraph workflow and format its final state for the API"""
         try:
             # Initialize state
             initial_state: AgentState = {
@@ -862,7 +1320,14 @@ class AIWebsiteTester:
                 "test_report": {},
                 "error": None,
                 "screenshots": [],
-                "validations": []
+                "validations": [],
+                "step_records": [],
+                "timings": [],
+                "options": options,
+                "using_fallback": False,
+                "compiled": False,
+                "cached_code": "",
+                "plan_cacheable": False
             }
             
             # Run the LangGraph workflow
@@ -871,6 +1336,11 @@ class AIWebsiteTester:
             # Format response for API
             report = final_state.get("test_report", {})
             
+            timings = final_state.get("timings") or []
+            token_usage = _summarize_token_usage(timings)
+            if PLAN_CACHE_ENABLED:
+                self._update_plan_cache(final_state, not final_state.get("error") and report.get("status") == "success")
+            
             if final_state.get("error"):
                 return {
                     "status": "error",
@@ -878,7 +1348,10 @@ class AIWebsiteTester:
                     "websiteUrl": website_url,
                     "testInstruction": test_instruction,
                     "browser": browser,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": datetime.now().isoformat(),
+                    "timings": timings,
+                    "token_usage": token_usage,
+                    "playwright_trace": (final_state.get("execution_result") or {}).get("playwright_trace")
                 }
             
             # Format results for frontend
@@ -905,29 +1378,53 @@ class AIWebsiteTester:
                     status_icon = "✅" if val.get("status") == "pass" else "⚠️" if val.get("status") == "warning" else "❌"
                     results.append(f"{status_icon} {val.get('message', '')}")
             
+            # Add visual regression result
+            visual_result = report.get("visual_regression")
+            if visual_result:
+                if visual_result.get("status") == "fail":
+                    results.append(f"\n🖼️ Visual change detected: {visual_result['score'] * 100:.2f}% of pixels differ from baseline")
+                elif visual_result.get("status") == "pass":
+                    results.append(f"\n🖼️ Visual check passed ({visual_result.get('score', 0) * 100:.2f}% difference)")
+                elif visual_result.get("status") == "baseline_created":
+                    results.append("\n🖼️ Visual baseline created")
+            
             # Add performance metrics
-            if "performance" in report:
+            if report.get("performance"):
                 perf = report["performance"]
                 results.append(f"\n⚡ Performance Metrics:")
                 results.append(f"Page load time: {perf.get('loadTime', 0)}ms")
+                if perf.get("lcp") is not None:
+                    results.append(f"Largest Contentful Paint: {perf['lcp']}ms")
+                if perf.get("cls") is not None:
+                    results.append(f"Cumulative Layout Shift: {perf['cls']}")
+                if perf.get("transferBytes"):
+                    results.append(f"Transferred: {perf['transferBytes'] / 1024:.2f}KB")
                 if "pageSize" in perf:
                     page_size_kb = perf["pageSize"] / 1024
                     results.append(f"Page size: {page_size_kb:.2f}KB")
             
-            # Prepare screenshot data for frontend (filter out errors and duplicates)
+            # Prepare screenshot references for frontend (filter out errors and duplicates)
             screenshot_data = []
             seen_names = set()
             for screenshot in screenshots:
-                if screenshot and "error" not in screenshot and screenshot.get("base64"):
+                if screenshot and "error" not in screenshot and screenshot.get("id"):
                     name = screenshot.get("name", "")
                     # Avoid duplicates
                     if name and name not in seen_names:
                         seen_names.add(name)
-                        screenshot_data.append({
+                        entry = {
+                            "id": screenshot["id"],
+                            "url": screenshot.get("url"),
                             "name": name,
-                            "base64": screenshot.get("base64"),
-                            "timestamp": screenshot.get("timestamp")
-                        })
+                            "timestamp": screenshot.get("timestamp"),
+                            "mime_type": screenshot.get("mime_type", "image/png"),
+                            "size_bytes": screenshot.get("size_bytes")
+                        }
+                        if options.get("inline_screenshots"):
+                            stored = screenshot_store.get(screenshot["id"])
+                            if stored:
+                                entry["base64"] = base64.b64encode(stored[0]).decode('utf-8')
+                        screenshot_data.append(entry)
             
             return {
                 "status": report.get("status", "success"),
@@ -939,6 +1436,13 @@ class AIWebsiteTester:
                 "timestamp": report.get("timestamp", datetime.now().isoformat()),
                 "execution_details": execution_details,
                 "validations": validations,
+                "parsed_steps": report.get("parsed_steps", []),
+                "generated_code": report.get("generated_code", ""),
+                "steps": report.get("steps", []),
+                "visual": report.get("visual_regression"),
+                "playwright_trace": report.get("playwright_trace"),
+                "timings": timings,
+                "token_usage": token_usage,
                 "screenshots": screenshot_data,
                 "screenshots_count": len(screenshot_data)
             }
@@ -957,4 +1461,4 @@ class AIWebsiteTester:
     
     def __del__(self):
         """Cleanup on deletion"""
-        self._cleanup_browser()
+        self.close_browser()
@@ -1,241 +1,86 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, redirect, render_template, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
 import json
+import multiprocessing
 import time
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
-from fpdf import FPDF
 
 # Load environment variables
 load_dotenv()
 
 from ai_agent import AIWebsiteTester
+import metrics
+import tracing
+from artifact_store import is_content_id, screenshot_store
+import thumbnails
+from reports import REPORTS_DIR, report_jobs
+import suite_report
+import uuid
+from retention import configure_default_areas, retention_manager
+from visual_regression import visual_baselines
+from history import history_store
+from scheduler import monitor_scheduler
+from site_profiles import site_profiles
+from singleflight import run_flights
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 CORS(app)
 
 # Report directory
-REPORTS_DIR = Path("reports")
 REPORTS_DIR.mkdir(exist_ok=True)
 
-# Helper function to remove all emojis and special characters from text
-def remove_emojis(text: str) -> str:
-    """Remove all emoji and special Unicode characters that aren't supported by PDF fonts"""
-    import re
-    # Remove emojis and other non-ASCII characters that might cause issues
-    # Keep only ASCII printable characters and common punctuation
-    text = re.sub(r'[^\x00-\x7F]+', '', text)  # Remove non-ASCII characters
-    return text.strip()
-
-# Enhanced PDF generator for comprehensive test reports
-def create_pdf_report(result: dict) -> str:
+# Suite report workers are spawned processes that re-import this module as __mp_main__;
+# they must not start the retention sweep, an agent or the monitors
+_main_process = multiprocessing.parent_process() is None
+
+# Artifact retention: size/age quotas and daily archives, swept in the background
+if _main_process:
+    configure_default_areas(protected_screenshots=visual_baselines.artifact_ids)
+    retention_manager.start(interval_s=float(os.getenv("RETENTION_INTERVAL_S", "600")))
+
+# Cache lifetime for artifacts whose URL never points to different content
+IMMUTABLE_MAX_AGE = 31536000
+
+def send_artifact(directory, filename, mimetype=None, as_attachment=False, etag=True, immutable=False):
     """
-    Generate a comprehensive PDF report from the test result.
-    Includes test instructions, what was checked, detailed results, and metrics.
-    Returns the PDF filename (stored in REPORTS_DIR).
+    Stream a file from disk in chunks with conditional GET (ETag / Last-Modified -> 304)
+    and byte-range support. Immutable artifacts get a one-year cache lifetime.
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"report_{timestamp}.pdf"
-    filepath = REPORTS_DIR / filename
-
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Header
-    pdf.set_font("Arial", "B", 20)
-    pdf.set_x(0)
-    pdf.cell(0, 12, "AI Website Test Report", ln=1, align='C')
-    pdf.ln(5)
-    
-    # Report metadata
-    pdf.set_font("Arial", "", 10)
-    report_date = result.get('timestamp', datetime.now().isoformat())
-    if 'T' in report_date:
-        report_date = report_date.split('T')[0] + ' ' + report_date.split('T')[1].split('.')[0]
-    pdf.set_x(0)
-    pdf.cell(0, 6, f"Generated: {report_date}", ln=1, align='C')
-    pdf.ln(8)
-    
-    # Test Information Section
-    pdf.set_font("Arial", "B", 14)
-    pdf.set_x(10)
-    pdf.cell(0, 8, "Test Information", ln=1)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(4)
-    
-    # Website URL
-    pdf.set_font("Arial", "B", 11)
-    pdf.set_x(10)
-    pdf.cell(40, 7, "Website URL:", 0)
-    pdf.set_font("Arial", "", 11)
-    url = result.get('websiteUrl', 'N/A')
-    pdf.set_x(50)
-    pdf.multi_cell(150, 7, url)
-    
-    # Browser
-    pdf.set_font("Arial", "B", 11)
-    pdf.set_x(10)
-    pdf.cell(40, 7, "Browser:", 0)
-    pdf.set_font("Arial", "", 11)
-    browser = result.get('browser', 'N/A')
-    pdf.set_x(50)
-    pdf.multi_cell(150, 7, browser)
-    
-    # Status
-    pdf.set_font("Arial", "B", 11)
-    pdf.set_x(10)
-    pdf.cell(40, 7, "Status:", 0)
-    pdf.set_font("Arial", "B", 11)
-    status = result.get('status', 'unknown')
-    pdf.set_text_color(0, 128, 0) if status == 'success' else pdf.set_text_color(255, 0, 0)
-    pdf.set_x(50)
-    pdf.multi_cell(150, 7, status.upper())
-    pdf.set_text_color(0, 0, 0)
-    
-    pdf.ln(3)
-    
-    # Test Instruction Section (What user requested)
-    pdf.set_font("Arial", "B", 14)
-    pdf.set_x(10)
-    pdf.cell(0, 8, "Test Instruction", ln=1)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(4)
-    pdf.set_font("Arial", "", 11)
-    instruction = remove_emojis(result.get('testInstruction', 'No instruction provided'))
-    pdf.set_x(10)
-    pdf.multi_cell(190, 6, instruction)
-    pdf.ln(3)
-    
-    # What Was Checked Section
-    pdf.set_font("Arial", "B", 14)
-    pdf.set_x(10)
-    pdf.cell(0, 8, "What Was Checked", ln=1)
-    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-    pdf.ln(4)
-    pdf.set_font("Arial", "", 11)
-    
-    # Extract what was checked from validations and results
-    checked_items = []
-    validations = result.get("validations", [])
-    for val in validations:
-        val_type = val.get("type", "").replace("_", " ").title()
-        # Use simple ASCII hyphen to avoid font issues in PDF
-        checked_items.append(f"- {val_type}: {val.get('message', '')}")
-    
-    pdf.set_x(10)
-    if checked_items:
-        for item in checked_items:
-            pdf.multi_cell(190, 6, remove_emojis(item))
-    else:
-        pdf.multi_cell(190, 6, "- Page navigation and basic functionality")
-        pdf.multi_cell(190, 6, "- Test instruction execution")
-    
-    pdf.ln(3)
-    
-    # Test Results Section
-    results = result.get("results", [])
-    if results:
-        pdf.set_font("Arial", "B", 14)
-        pdf.set_x(10)
-        pdf.cell(0, 8, "Test Results", ln=1)
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(4)
-        pdf.set_font("Arial", "", 11)
-        pdf.set_x(10)
-        for line in results:
-            # Clean up emoji and formatting - remove all emojis
-            clean_line = remove_emojis(str(line))
-            if clean_line:
-                pdf.multi_cell(190, 6, clean_line)
-        pdf.ln(3)
-    
-    # Detailed Validations
-    if validations:
-        pdf.set_font("Arial", "B", 14)
-        pdf.set_x(10)
-        pdf.cell(0, 8, f"Detailed Validations ({len(validations)} checks)", ln=1)
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(4)
-        pdf.set_font("Arial", "", 10)
-        pdf.set_x(10)
-        for idx, val in enumerate(validations, 1):
-            status = val.get("status", "").upper()
-            val_type = remove_emojis(val.get("type", "").replace("_", " ").title())
-            message = remove_emojis(val.get("message", ""))
-            
-            # Status color
-            if status == "PASS":
-                pdf.set_text_color(0, 128, 0)
-            elif status == "WARNING":
-                pdf.set_text_color(255, 165, 0)
-            else:
-                pdf.set_text_color(255, 0, 0)
-            
-            pdf.set_font("Arial", "B", 10)
-            pdf.multi_cell(190, 6, f"{idx}. [{status}] {val_type}")
-            pdf.set_text_color(0, 0, 0)
-            pdf.set_font("Arial", "", 10)
-            pdf.set_x(10)
-            pdf.multi_cell(190, 5, f"   {message}")
-            pdf.ln(2)
-        pdf.ln(2)
-    
-    # Performance Metrics
-    performance = result.get("performance")
-    if performance:
-        pdf.set_font("Arial", "B", 14)
-        pdf.set_x(10)
-        pdf.cell(0, 8, "Performance Metrics", ln=1)
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(4)
-        pdf.set_font("Arial", "", 11)
-        pdf.set_x(10)
-        
-        load_time = performance.get('loadTime', 0)
-        if isinstance(load_time, (int, float)):
-            load_time_sec = load_time / 1000
-            pdf.multi_cell(190, 6, f"Page Load Time: {load_time} ms ({load_time_sec:.2f} seconds)")
-        else:
-            pdf.multi_cell(190, 6, f"Page Load Time: {load_time}")
-        
-        if "pageSize" in performance:
-            page_size = performance.get('pageSize', 0)
-            if isinstance(page_size, (int, float)):
-                page_size_kb = page_size / 1024
-                pdf.set_x(10)
-                pdf.multi_cell(190, 6, f"Page Size: {page_size_kb:.2f} KB")
-            else:
-                pdf.set_x(10)
-                pdf.multi_cell(190, 6, f"Page Size: {page_size}")
-        
-        pdf.ln(3)
-    
-    # Screenshots count
-    screenshots_count = result.get("screenshots_count", 0)
-    if screenshots_count > 0:
-        pdf.set_font("Arial", "B", 11)
-        pdf.set_x(10)
-        pdf.multi_cell(190, 6, f"Note: {screenshots_count} screenshot(s) captured during test execution.")
-        pdf.ln(3)
-    
-    # Footer
-    pdf.set_y(-15)
-    pdf.set_font("Arial", "I", 8)
-    pdf.set_x(0)
-    pdf.cell(0, 10, "Generated by AI Website Test Agent", 0, 0, 'C')
-    
-    pdf.output(str(filepath))
-    return filename
+    response = send_from_directory(
+        str(Path(directory).resolve()), filename,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=etag,
+        max_age=IMMUTABLE_MAX_AGE if immutable else None,
+    )
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
 
 # Initialize AI agent
-try:
-    ai_tester = AIWebsiteTester()
-    print("✅ AI Agent initialized successfully with LangGraph + OpenAI + Playwright")
-except Exception as e:
-    print(f"❌ Error initializing AI Agent: {e}")
-    ai_tester = None
+ai_tester = None
+if _main_process:
+    try:
+        ai_tester = AIWebsiteTester()
+        print(f"✅ AI Agent initialized successfully with LangGraph + Playwright (LLM backend: {ai_tester.llm.name})")
+    except Exception as e:
+        print(f"❌ Error initializing AI Agent: {e}")
+        ai_tester = None
+
+# Identical concurrent /api/run-test requests share one run (RUN_COALESCING=false to disable)
+RUN_COALESCING = os.getenv("RUN_COALESCING", "true").lower() not in ("0", "false", "no", "off")
+
+# Recurring monitors run in-process on their own browser workers (MONITORS_ENABLED=false to disable).
+# In debug mode the Werkzeug reloader imports this module in a watcher process and again in the
+# serving child (WERKZEUG_RUN_MAIN=true); only the child starts the scheduler so checks don't run twice.
+_serving_process = _main_process and (not (app.debug or __name__ == "__main__") or os.environ.get("WERKZEUG_RUN_MAIN") == "true")
+if ai_tester and _serving_process and os.getenv("MONITORS_ENABLED", "true").lower() not in ("0", "false", "no", "off"):
+    monitor_scheduler.start()
 
 @app.route('/')
 def index():
@@ -253,6 +98,10 @@ def run_test():
         website_url = data.get('websiteUrl', '').strip()
         test_instruction = data.get('testInstruction', '').strip()
         browser = data.get('browser', 'chrome')
+        inline_screenshots = bool(data.get('inlineScreenshots', False))
+        filmstrip = data.get('filmstrip')
+        visual = data.get('visual')
+        trace = data.get('trace')
 
         # Input validation
         if not website_url:
@@ -284,18 +133,33 @@ def run_test():
                 'field': 'testInstruction'
             }), 400
 
-        # Run the test using AI agent (LangGraph workflow)
-        result = ai_tester.run_test(website_url, test_instruction, browser)
+        def execute():
+            # Run the test using AI agent (LangGraph workflow)
+            result = ai_tester.run_test(website_url, test_instruction, browser, inline_screenshots=inline_screenshots,
+                                        filmstrip=None if filmstrip is None else bool(filmstrip),
+                                        visual=visual if visual in (None, "update") else bool(visual),
+                                        visual_masks=data.get('visualMasks'),
+                                        trace=trace)
+
+            # Register the PDF report; it is rendered in the background / on first download
+            try:
+                report_id = report_jobs.submit(result)
+                result["reportId"] = report_id
+                result["reportUrl"] = f"/api/reports/{report_jobs.filename_for(report_id)}"
+                result["reportStatusUrl"] = f"/api/reports/{report_id}/status"
+            except Exception as pdf_error:
+                # Do not block the main flow if PDF fails
+                result["reportError"] = f"Could not generate PDF: {pdf_error}"
+            return result
 
-        # Generate PDF report and attach link
-        try:
-            pdf_filename = create_pdf_report(result)
-            result["reportUrl"] = f"/api/reports/{pdf_filename}"
-        except Exception as pdf_error:
-            # Do not block the main flow if PDF fails
-            result["reportError"] = f"Could not generate PDF: {pdf_error}"
+        if not RUN_COALESCING:
+            return jsonify(execute())
 
-        return jsonify(result)
+        # Same URL, instruction, browser and options as a run in progress: wait for it and share its result
+        flight_key = json.dumps([website_url, test_instruction, browser, inline_screenshots, filmstrip, visual, trace,
+                                 data.get('visualMasks')], sort_keys=True, default=str)
+        result, shared = run_flights.do(flight_key, execute)
+        return jsonify({**result, 'coalesced': shared})
 
     except Exception as e:
         return jsonify({
@@ -307,36 +171,210 @@ def run_test():
 def health():
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'llm': ai_tester.llm.describe() if ai_tester and hasattr(ai_tester.llm, 'describe') else None
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose in-process counters and histograms in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/history', methods=['GET'])
+def run_history():
+    """
+    Stored runs, newest first. Filters: url, domain, instruction, status, since/until
+    (ISO timestamps); paginate with limit and before=<nextCursor>.
+    """
+    args = request.args
+    try:
+        since = datetime.fromisoformat(args['since']).timestamp() if args.get('since') else None
+        until = datetime.fromisoformat(args['until']).timestamp() if args.get('until') else None
+        before = int(args['before']) if args.get('before') else None
+        limit = int(args.get('limit', 100))
+    except ValueError:
+        return jsonify({'error': 'since/until must be ISO timestamps; before/limit must be integers'}), 400
+    page = history_store.query(
+        url=args.get('url'), domain=args.get('domain'), instruction=args.get('instruction'),
+        status=args.get('status'), since=since, until=until, before=before, limit=limit
+    )
+    return jsonify({'runs': page['runs'], 'nextCursor': page['next_cursor']})
+
+@app.route('/api/history/<run_id>', methods=['GET'])
+def run_history_detail(run_id):
+    """Full stored result of one run (steps, timings, validations, metrics, artifact references)"""
+    run = history_store.get(run_id)
+    if run is None:
+        return jsonify({'error': 'Run not found'}), 404
+    return jsonify(run)
+
+@app.route('/api/monitors', methods=['GET'])
+def list_monitors():
+    """Registered monitors with their next run, last result and skip counts"""
+    return jsonify({'monitors': monitor_scheduler.list()})
+
+@app.route('/api/monitors', methods=['POST'])
+def create_monitor():
+    """Register a recurring test. Body: {"websiteUrl", "testInstruction", "intervalSeconds", "browser"}"""
+    data = request.json or {}
+    website_url = (data.get('websiteUrl') or '').strip()
+    test_instruction = (data.get('testInstruction') or '').strip()
+    if not website_url or not test_instruction:
+        return jsonify({'error': 'websiteUrl and testInstruction are required'}), 400
+    if not website_url.startswith(('http://', 'https://')):
+        website_url = 'https://' + website_url
+    try:
+        interval_s = float(data.get('intervalSeconds', 300))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'intervalSeconds must be a number'}), 400
+    monitor = monitor_scheduler.add(website_url, test_instruction, interval_s, data.get('browser', 'chrome'))
+    return jsonify(monitor.to_dict()), 201
+
+@app.route('/api/monitors/<monitor_id>', methods=['DELETE'])
+def delete_monitor(monitor_id):
+    if not monitor_scheduler.remove(monitor_id):
+        return jsonify({'error': 'Monitor not found'}), 404
+    return jsonify({'deleted': monitor_id})
+
+@app.route('/api/site-profiles', methods=['GET'])
+def list_site_profiles():
+    """Loaded site profiles and the domains they apply to"""
+    return jsonify({'profiles': site_profiles.list(), 'directory': str(site_profiles.directory)})
+
+@app.route('/api/site-profiles/reload', methods=['POST'])
+def reload_site_profiles():
+    """Re-read the profile files now (they are also reloaded automatically when changed)"""
+    return jsonify({'profiles': site_profiles.reload()})
+
+@app.route('/api/artifacts/usage', methods=['GET'])
+def artifact_usage():
+    """Indexed disk usage per retention area and the result of the last sweep"""
+    return jsonify({'areas': retention_manager.usage(), 'lastSweep': retention_manager.last_sweep})
+
+@app.route('/api/traces/active', methods=['GET'])
+def active_traces():
+    """List spans that are still open (e.g. the Playwright call a hanging run is stuck in)"""
+    return jsonify({'spans': tracing.tracer.active_spans()})
+
+@app.route('/api/playwright-traces/<filename>', methods=['GET'])
+def get_playwright_trace(filename):
+    """Download a retained Playwright trace zip"""
+    traces_dir = Path(os.getenv("PLAYWRIGHT_TRACE_DIR", "traces/playwright"))
+    trace_path = traces_dir / filename
+    if filename.endswith('.zip') and trace_path.exists() and trace_path.is_file():
+        return send_artifact(traces_dir, filename, mimetype='application/zip', as_attachment=True, immutable=True)
+    return jsonify({'error': 'Trace not found'}), 404
+
 @app.route('/api/screenshots/<filename>', methods=['GET'])
 def get_screenshot(filename):
-    """Serve screenshot files"""
+    """Serve screenshots: content-addressed ids (immutable, cacheable) or legacy files"""
+    if is_content_id(filename):
+        # The id is the content hash, so it doubles as a strong ETag
+        cache_headers = {
+            'ETag': f'"{filename}"',
+            'Cache-Control': 'public, max-age=31536000, immutable'
+        }
+        if request.if_none_match.contains(filename):
+            return Response(status=304, headers=cache_headers)
+        path = screenshot_store.locate(filename)
+        if path is not None:
+            # On disk: stream it (range requests supported) instead of loading it into memory
+            return send_artifact(path.parent, path.name, mimetype=screenshot_store.mime_type(filename),
+                                 etag=filename, immutable=True)
+        stored = screenshot_store.get(filename)
+        if stored is None:
+            return jsonify({'error': 'Screenshot not found'}), 404
+        data, mime_type = stored
+        return Response(data, mimetype=mime_type, headers=cache_headers)
+    
     screenshots_dir = Path("screenshots")
     screenshot_path = screenshots_dir / filename
     if screenshot_path.exists() and screenshot_path.is_file():
-        return send_from_directory(str(screenshots_dir), filename)
+        return send_artifact(screenshots_dir, filename)
     return jsonify({'error': 'Screenshot not found'}), 404
 
+@app.route('/api/screenshots/<artifact_id>/thumbnail', methods=['GET'])
+def get_screenshot_thumbnail(artifact_id):
+    """Resized/cropped variant of a stored screenshot, e.g. ?w=320&h=240&fit=crop"""
+    if not is_content_id(artifact_id):
+        return jsonify({'error': 'Screenshot not found'}), 404
+    if not thumbnails.PIL_AVAILABLE:
+        # No image library available - fall back to the full-size image
+        return redirect(screenshot_store.url_for(artifact_id))
+    try:
+        width = int(request.args.get('w', 320))
+        height = int(request.args['h']) if request.args.get('h') else None
+    except ValueError:
+        return jsonify({'error': 'w and h must be integers'}), 400
+    crop = request.args.get('fit') == 'crop'
+    width, height = thumbnails.normalize_size(width, height)
+
+    etag = thumbnails.ThumbnailCache.key(artifact_id, width, height, crop)
+    cache_headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'public, max-age=31536000, immutable'
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=cache_headers)
+    data = thumbnails.thumbnail_cache.get(screenshot_store, artifact_id, width, height, crop)
+    if data is None:
+        return jsonify({'error': 'Screenshot not found'}), 404
+    return Response(data, mimetype='image/jpeg', headers=cache_headers)
+
+@app.route('/api/suite-reports', methods=['POST'])
+def create_suite_report():
+    """Consolidated PDF + HTML report for a batch of run-test results ({"results": [...], "title": "..."})"""
+    data = request.json or {}
+    results = data.get('results')
+    if not isinstance(results, list) or not results:
+        return jsonify({'error': 'results must be a non-empty list of run-test results', 'field': 'results'}), 400
+    title = str(data.get('title') or 'AI Website Test Suite Report')[:200]
+    suite_id = uuid.uuid4().hex[:16]
+    pdf_filename = f"suite_{suite_id}.pdf"
+    html_filename = f"suite_{suite_id}.html"
+    try:
+        pdf_stats = suite_report.render_suite_pdf(results, REPORTS_DIR / pdf_filename, title)
+        html_stats = suite_report.render_suite_html(results, REPORTS_DIR / html_filename, title)
+    except Exception as e:
+        return jsonify({'error': f'Could not generate suite report: {e}'}), 500
+    return jsonify({
+        'suiteId': suite_id,
+        'tests': len(results),
+        'pdfUrl': f"/api/reports/{pdf_filename}",
+        'htmlUrl': f"/api/reports/{html_filename}",
+        'pdf': pdf_stats,
+        'html': html_stats
+    })
+
+@app.route('/api/reports/<report_id>/status', methods=['GET'])
+def get_report_status(report_id):
+    """Poll a report job: pending, rendering, ready or failed"""
+    status = report_jobs.status(report_id)
+    if status is None:
+        return jsonify({'error': 'Report not found'}), 404
+    return jsonify(status)
+
 @app.route('/api/reports/<filename>', methods=['GET'])
 def get_report(filename):
-    """Serve generated PDF reports - force download"""
+    """Serve generated PDF reports - force download (rendered on first request if still pending)"""
     report_path = REPORTS_DIR / filename
-    if report_path.exists() and report_path.is_file():
-        from flask import Response
-        with open(report_path, 'rb') as f:
-            pdf_data = f.read()
-        response = Response(
-            pdf_data,
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
-        return response
-    return jsonify({'error': 'Report not found'}), 404
+    if filename.startswith('report_') and filename.endswith('.pdf'):
+        rendered = report_jobs.ensure_rendered(filename[len('report_'):-len('.pdf')])
+        if rendered is not None:
+            report_path = rendered
+    if not (report_path.exists() and report_path.is_file()):
+        # Older reports may have been moved into a daily archive by retention
+        archived = retention_manager.read_archived(report_path)
+        if archived is None:
+            return jsonify({'error': 'Report not found'}), 404
+        mimetype = 'text/html' if filename.endswith('.html') else 'application/pdf'
+        disposition = 'inline' if filename.endswith('.html') else f'attachment; filename="{filename}"'
+        return Response(archived, mimetype=mimetype, headers={'Content-Disposition': disposition})
+    # Report files are written once under unique names, so they can be cached indefinitely
+    if filename.endswith('.html'):
+        # HTML suite reports are viewed in the browser
+        return send_artifact(REPORTS_DIR, filename, mimetype='text/html', immutable=True)
+    return send_artifact(REPORTS_DIR, filename, mimetype='application/pdf', as_attachment=True, immutable=True)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
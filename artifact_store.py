@@ -0,0 +1,160 @@
+"""
+Content-addressed artifact store.
+Images are keyed by the SHA-256 of their bytes, so identical frames are
+stored once, and served by reference (/api/screenshots/<id>) instead of
+being inlined as base64 in every response. Recent artifacts are kept in a
+bounded in-memory LRU. Artifacts put with persist=True (SCREENSHOT_PERSIST)
+are also written to disk in the background so they can be served after
+eviction or from another worker; the others live only as long as they stay
+in memory.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from screenshot_capture import writer
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+MIME_BY_EXTENSION = {ext: mime for mime, ext in EXTENSIONS.items()}
+
+
+def content_id(data: bytes) -> str:
+    """Artifact id: hex SHA-256 of the content"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_content_id(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+class ArtifactStore:
+    """Stores blobs once per content hash, in memory (LRU) and on disk"""
+
+    def __init__(self, root="screenshots/store", url_prefix="/api/screenshots", memory_limit_bytes=64 * 1024 * 1024,
+                 max_index_entries=100_000):
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.memory_limit_bytes = memory_limit_bytes
+        self.max_index_entries = max_index_entries
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        # Known extension per id, LRU-bounded; on a miss locate() probes every extension
+        self._extensions = OrderedDict()
+        # Ids held only in memory (not persisted); they are forgotten when the LRU evicts them
+        self._memory_only = set()
+        self._lock = threading.Lock()
+        # Optional callable(path) -> bytes for artifacts moved into archives by retention
+        self.archive_reader = None
+
+    def path_for(self, artifact_id: str, extension: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.root / artifact_id[:2] / f"{artifact_id}.{extension}"
+
+    def url_for(self, artifact_id: str) -> str:
+        return f"{self.url_prefix}/{artifact_id}"
+
+    def put(self, data: bytes, mime_type: str = "image/png", persist: bool = True) -> str:
+        """Store data (once per content) and return its id; persist=False keeps it in memory only"""
+        artifact_id = content_id(data)
+        extension = EXTENSIONS.get(mime_type, "bin")
+        with self._lock:
+            on_disk = artifact_id in self._extensions and artifact_id not in self._memory_only
+            self._index(artifact_id, extension)
+            if persist or on_disk:
+                self._memory_only.discard(artifact_id)
+            else:
+                self._memory_only.add(artifact_id)
+            self._remember(artifact_id, data, mime_type)
+            if artifact_id in self._memory_only and artifact_id not in self._memory:
+                # Too large for the memory LRU and not persisted: nothing to serve it from
+                self._forget(artifact_id)
+        if persist and not on_disk:
+            path = self.path_for(artifact_id, extension)
+            if not path.exists():
+                writer.submit(path, data)
+        return artifact_id
+
+    def _index(self, artifact_id: str, extension: str):
+        """Record an id's extension, dropping the least recently used ids over the cap (caller holds the lock)"""
+        self._extensions[artifact_id] = extension
+        self._extensions.move_to_end(artifact_id)
+        while len(self._extensions) > self.max_index_entries:
+            self._extensions.popitem(last=False)
+
+    def _forget(self, artifact_id: str):
+        """Drop a memory-only artifact from the index (caller holds the lock)"""
+        self._memory_only.discard(artifact_id)
+        self._extensions.pop(artifact_id, None)
+
+    def _remember(self, artifact_id: str, data: bytes, mime_type: str):
+        """Insert into the memory LRU (caller holds the lock)"""
+        if artifact_id in self._memory:
+            self._memory.move_to_end(artifact_id)
+            return
+        if len(data) > self.memory_limit_bytes:
+            return
+        self._memory[artifact_id] = (data, mime_type)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_limit_bytes:
+            evicted_id, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            if evicted_id in self._memory_only:
+                self._forget(evicted_id)
+
+    def locate(self, artifact_id: str):
+        """Path of the artifact on disk, or None if it has not been written (yet)"""
+        extension = self._extensions.get(artifact_id)
+        candidates = [extension] if extension else list(MIME_BY_EXTENSION) + ["bin"]
+        for ext in candidates:
+            path = self.path_for(artifact_id, ext)
+            if path.exists():
+                with self._lock:
+                    self._index(artifact_id, ext)
+                return path
+        return None
+
+    def mime_type(self, artifact_id: str) -> str:
+        extension = self._extensions.get(artifact_id)
+        return MIME_BY_EXTENSION.get(extension, "application/octet-stream")
+
+    def get(self, artifact_id: str):
+        """Return (bytes, mime type) or None"""
+        with self._lock:
+            cached = self._memory.get(artifact_id)
+            if cached is not None:
+                self._memory.move_to_end(artifact_id)
+                return cached
+        path = self.locate(artifact_id)
+        if path is None:
+            return self._get_archived(artifact_id)
+        data = path.read_bytes()
+        mime_type = self.mime_type(artifact_id)
+        with self._lock:
+            self._remember(artifact_id, data, mime_type)
+        return data, mime_type
+
+    def _get_archived(self, artifact_id: str):
+        """(bytes, mime type) from the retention archives, or None"""
+        if self.archive_reader is None:
+            return None
+        extension = self._extensions.get(artifact_id)
+        for ext in [extension] if extension else list(MIME_BY_EXTENSION) + ["bin"]:
+            data = self.archive_reader(self.path_for(artifact_id, ext))
+            if data is not None:
+                with self._lock:
+                    self._index(artifact_id, ext)
+                    self._remember(artifact_id, data, MIME_BY_EXTENSION.get(ext, "application/octet-stream"))
+                return data, MIME_BY_EXTENSION.get(ext, "application/octet-stream")
+        return None
+    
+    def exists(self, artifact_id: str) -> bool:
+        return artifact_id in self._memory or self.locate(artifact_id) is not None
+
+
+screenshot_store = ArtifactStore(
+    root=os.getenv("SCREENSHOT_STORE_DIR", "screenshots/store"),
+    memory_limit_bytes=int(os.getenv("SCREENSHOT_STORE_MEMORY_MB", "64")) * 1024 * 1024,
+)
@@ -0,0 +1,121 @@
+"""
+Deterministic LLM backend used by the benchmarks in place of ChatOpenAI.
+It answers the parse and code generation prompts with canned plans for the
+fixture pages (matched by the page in the prompt's "Website URL:"),
+optionally after a fixed simulated latency, and reports fixed token usage
+so the telemetry paths are exercised exactly as with a real model. As an
+LLMBackend it goes through the same concurrency limit and backend metrics.
+"""
+
+import json
+import re
+import time
+
+from llm_backends import LLMBackend
+
+URL_PATTERN = re.compile(r"Website URL:\s*(\S+)")
+
+# Fixture page -> parsed steps and Playwright code ({url} is the page URL)
+PLANS = {
+    "search.html": {
+        "steps": [
+            {"action": "navigate", "target": "website_url", "value": "{url}"},
+            {"action": "search", "target": "search box", "value": "laptop"},
+            {"action": "verify", "target": "search results", "assertion": "results displayed"},
+        ],
+        "code": """mark_step(0)
+page.goto("{url}", wait_until="domcontentloaded", timeout=60000)
+mark_step(1)
+page.locator('input[name="q"]').fill("laptop", timeout=10000)
+with page.expect_navigation(wait_until="load", timeout=30000):
+    page.keyboard.press("Enter")
+mark_step(2)
+page.locator(".result").first.wait_for(state="visible", timeout=10000)
+""",
+    },
+    "form.html": {
+        "steps": [
+            {"action": "navigate", "target": "website_url", "value": "{url}"},
+            {"action": "fill", "target": "contact form", "value": "Ada Lovelace / ada@example.com"},
+            {"action": "click", "target": "Send button", "value": None},
+            {"action": "verify", "target": "confirmation", "assertion": "thank you message displayed"},
+        ],
+        "code": """mark_step(0)
+page.goto("{url}", wait_until="domcontentloaded", timeout=60000)
+mark_step(1)
+page.locator("#name").fill("Ada Lovelace", timeout=10000)
+page.locator("#email").fill("ada@example.com", timeout=10000)
+page.locator("#message").fill("Benchmark message", timeout=10000)
+mark_step(2)
+page.locator('button[type="submit"]').click(timeout=10000)
+mark_step(3)
+page.locator("#thanks").wait_for(state="visible", timeout=10000)
+""",
+    },
+    "images.html": {
+        "steps": [
+            {"action": "navigate", "target": "website_url", "value": "{url}"},
+            {"action": "verify", "target": "product images", "assertion": "all images loaded"},
+        ],
+        "code": """mark_step(0)
+page.goto("{url}", wait_until="load", timeout=60000)
+mark_step(1)
+page.wait_for_function("Array.from(document.images).every(img => img.complete)", timeout=30000)
+""",
+    },
+    "slow.html": {
+        "steps": [
+            {"action": "navigate", "target": "website_url", "value": "{url}"},
+            {"action": "verify", "target": "status", "assertion": "slow script loaded"},
+        ],
+        "code": """mark_step(0)
+page.goto("{url}", wait_until="load", timeout=60000)
+mark_step(1)
+page.locator("#status", has_text="Loaded").wait_for(timeout=30000)
+""",
+    },
+}
+
+
+class FakeResponse:
+    """Minimal chat response: content plus OpenAI-style token usage metadata"""
+
+    def __init__(self, content: str, prompt_tokens: int, completion_tokens: int):
+        self.content = content
+        self.response_metadata = {"token_usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }}
+
+
+class FakeChatModel(LLMBackend):
+    """Backend with canned answers for the fixture pages"""
+
+    name = "fake"
+
+    def __init__(self, latency_s: float = 0.0, plans: dict = None, max_concurrency: int = 64):
+        super().__init__(model="fake", timeout_s=30.0, max_concurrency=max_concurrency)
+        self.latency_s = latency_s
+        self.plans = plans or PLANS
+        self.calls = 0
+
+    def _plan_for(self, url: str) -> dict:
+        page = url.split("?", 1)[0].rsplit("/", 1)[-1]
+        if page not in self.plans:
+            raise ValueError(f"No benchmark plan for {url}")
+        return self.plans[page]
+
+    def _invoke(self, messages: list) -> FakeResponse:
+        self.calls += 1
+        prompt = messages[-1].content
+        match = URL_PATTERN.search(prompt)
+        url = match.group(1) if match else ""
+        plan = self._plan_for(url)
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if "Parsed Steps:" in prompt:
+            content = "```python\n" + plan["code"].replace("{url}", url) + "```"
+            return FakeResponse(content, prompt_tokens=520, completion_tokens=180)
+        steps = json.loads(json.dumps(plan["steps"]).replace("{url}", url))
+        return FakeResponse(json.dumps(steps), prompt_tokens=310, completion_tokens=90)
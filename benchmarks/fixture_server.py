@@ -0,0 +1,114 @@
+"""
+Local HTTP server for the benchmark fixture pages.
+Static pages come from benchmarks/fixtures; /img/<n>.png serves deterministic
+uncompressible images and /slow/<name> answers after SLOW_DELAY_S, so the
+benchmarks never depend on the network.
+"""
+
+import random
+import struct
+import threading
+import time
+import zlib
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+_png_cache = {}
+_png_lock = threading.Lock()
+
+
+def noise_png(seed: int, size: int = 200) -> bytes:
+    """Deterministic RGB noise image (about size*size*3 bytes, does not compress)"""
+    with _png_lock:
+        if seed in _png_cache:
+            return _png_cache[seed]
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+    data = (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b""))
+    with _png_lock:
+        _png_cache[seed] = data
+    return data
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    slow_delay_s = 1.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/img/") and path.endswith(".png"):
+            try:
+                seed = int(path[len("/img/"):-len(".png")])
+            except ValueError:
+                return self.send_error(404)
+            return self._send(noise_png(seed), "image/png")
+        if path.startswith("/slow/"):
+            time.sleep(self.slow_delay_s)
+            name = path[len("/slow/"):]
+            if name.endswith(".css"):
+                return self._send(b"body { font-family: sans-serif; margin: 2rem; }", "text/css")
+            if name.endswith(".js"):
+                return self._send(b"document.getElementById('status').textContent = 'Loaded';", "application/javascript")
+            return self._send(noise_png(1000), "image/png")
+        return super().do_GET()
+
+
+class FixtureServer:
+    """Serves the fixtures on 127.0.0.1 from a daemon thread; use as a context manager"""
+
+    def __init__(self, port: int = 0, slow_delay_s: float = 1.0):
+        handler = type("Handler", (FixtureHandler,), {"slow_delay_s": slow_delay_s})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), partial(handler, directory=str(FIXTURES_DIR)))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, page: str) -> str:
+        return f"{self.base_url}/{page}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    with FixtureServer(port=8765) as server:
+        print(f"Serving fixtures on {server.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,365 @@
+"""
+Benchmark suite for the agent, run against local fixture pages with a fake LLM.
+
+Measures per-node and end-to-end latency of AIWebsiteTester.run_test for
+each fixture page (search, form, images, slow), throughput at several
+concurrency levels, the /api/run-test path through the Flask app, and the
+peak RSS of this process and of the whole process tree (browsers included)
+for each phase.
+Results are written as JSON; pass --compare to diff against an earlier run.
+
+    python benchmarks/run_benchmarks.py --iterations 5 --concurrency 1,2,4
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<earlier>.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_llm import FakeChatModel, PLANS
+from fixture_server import FixtureServer
+
+SCENARIOS = {
+    "search": ("search.html", "Search for laptop"),
+    "form": ("form.html", "Fill the contact form and send it"),
+    "images": ("images.html", "Check that all product images load"),
+    "slow": ("slow.html", "Check that the page finishes loading its slow resources"),
+}
+PHASES = ("scenarios", "throughput", "api")
+
+
+def summarize(values: list) -> dict:
+    """Latency summary in milliseconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 1),
+        "p50": round(ordered[len(ordered) // 2], 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        "min": round(ordered[0], 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+class RssSampler:
+    """Samples RSS of this process and its descendants (Linux /proc) and keeps the peaks"""
+
+    def __init__(self, interval_s: float = 0.1):
+        self.interval_s = interval_s
+        self.peak_process_kb = 0
+        self.peak_tree_kb = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _rss_kb(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def _tree_pids(self) -> list:
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as stat:
+                    # The process name may contain spaces; fields after it are fixed
+                    ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        pids, stack = [], [os.getpid()]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(children.get(pid, []))
+        return pids
+
+    def sample(self):
+        own = self._rss_kb(os.getpid())
+        tree = sum(self._rss_kb(pid) for pid in self._tree_pids())
+        self.peak_process_kb = max(self.peak_process_kb, own)
+        self.peak_tree_kb = max(self.peak_tree_kb, tree)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.sample()
+
+    def start(self):
+        if os.path.isdir("/proc"):
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self.sample()
+        return {"process_mb": round(self.peak_process_kb / 1024, 1), "process_tree_mb": round(self.peak_tree_kb / 1024, 1)}
+
+
+def process_maxrss_mb():
+    """High-water RSS of this process since it started (covers spikes between samples, but not per phase)"""
+    try:
+        import resource
+        # ru_maxrss is in KB on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except ImportError:
+        return None
+
+
+def make_agent(latency_s: float, keep_browser: bool):
+    from ai_agent import AIWebsiteTester
+    return AIWebsiteTester(keep_browser=keep_browser, llm_backend=FakeChatModel(latency_s=latency_s))
+
+
+def run_once(agent, url: str, instruction: str) -> tuple:
+    """(end-to-end ms, result)"""
+    start = time.perf_counter()
+    result = agent.run_test(url, instruction)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def collect(samples: list) -> dict:
+    """Aggregate (elapsed_ms, result) pairs into end-to-end and per-node latency"""
+    nodes = {}
+    for _, result in samples:
+        for timing in result.get("timings") or []:
+            nodes.setdefault(timing["node"], []).append(timing["duration_ms"])
+    errors = [r.get("error") or (r.get("execution_details") or {}).get("error")
+              for _, r in samples if r.get("status") != "success"]
+    return {
+        "runs": len(samples),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "e2e_ms": summarize([elapsed for elapsed, _ in samples]),
+        "nodes_ms": {node: summarize(values) for node, values in nodes.items()},
+    }
+
+
+def bench_scenarios(server, args) -> dict:
+    """Sequential latency per fixture page (one warm-up run each, not counted)"""
+    agent = make_agent(args.llm_latency_ms / 1000, args.keep_browser)
+    results = {}
+    try:
+        for name in args.scenarios:
+            page, instruction = SCENARIOS[name]
+            url = server.url(page)
+            run_once(agent, url, instruction)
+            samples = [run_once(agent, url, instruction) for _ in range(args.iterations)]
+            results[name] = collect(samples)
+            print(f"  {name:<8} e2e p50 {results[name]['e2e_ms'].get('p50')} ms"
+                  f"  ({results[name]['errors']} error(s))")
+    finally:
+        agent.close_browser()
+    return results
+
+
+def bench_throughput(server, args) -> list:
+    """Runs per second with N threads, each driving its own agent over all scenarios"""
+    levels = []
+    work = [SCENARIOS[name] for name in args.scenarios] * args.iterations
+    for concurrency in args.concurrency:
+        agents = [make_agent(args.llm_latency_ms / 1000, args.keep_browser) for _ in range(concurrency)]
+        samples = []
+        lock = threading.Lock()
+
+        def worker(agent):
+            for page, instruction in work:
+                sample = run_once(agent, server.url(page), instruction)
+                with lock:
+                    samples.append(sample)
+
+        threads = [threading.Thread(target=worker, args=(agent,)) for agent in agents]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_s = time.perf_counter() - start
+        for agent in agents:
+            agent.close_browser()
+        level = collect(samples)
+        level.pop("nodes_ms")
+        level.update({"concurrency": concurrency, "wall_s": round(wall_s, 2),
+                      "runs_per_s": round(len(samples) / wall_s, 3) if wall_s else None})
+        levels.append(level)
+        print(f"  concurrency {concurrency}: {level['runs_per_s']} runs/s, e2e p50 {level['e2e_ms'].get('p50')} ms")
+    return levels
+
+
+def bench_api(server, args) -> dict:
+    """POST /api/run-test through the Flask app (the app shares one agent, so requests are sequential)"""
+    import app as web_app
+    if web_app.ai_tester is None:
+        return {"error": "AI agent failed to initialize"}
+    web_app.ai_tester.llm = FakeChatModel(latency_s=args.llm_latency_ms / 1000)
+    client = web_app.app.test_client()
+    results = {}
+    for name in args.scenarios:
+        page, instruction = SCENARIOS[name]
+        body = {"websiteUrl": server.url(page), "testInstruction": instruction}
+        client.post("/api/run-test", json=body)
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            response = client.post("/api/run-test", json=body)
+            elapsed = (time.perf_counter() - start) * 1000
+            result = response.get_json() or {}
+            if response.status_code != 200:
+                result = {"status": "error", "error": result.get("error", f"HTTP {response.status_code}")}
+            samples.append((elapsed, result))
+        results[name] = collect(samples)
+        print(f"  {name:<8} e2e p50 {results[name]['e2e_ms'].get('p50')} ms")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(previous: dict, current: dict):
+    """Print p50/p95 and throughput changes between two result files"""
+    def change(old, new):
+        if not old or new is None:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    print(f"\nComparison with {previous.get('meta', {}).get('git_commit')} ({previous.get('meta', {}).get('timestamp')}):")
+    for section in ("scenarios", "api"):
+        for name, stats in (current.get(section) or {}).items():
+            old = ((previous.get(section) or {}).get(name) or {}).get("e2e_ms", {})
+            new = stats.get("e2e_ms", {})
+            print(f"  {section}/{name:<8} p50 {old.get('p50')} -> {new.get('p50')} ms ({change(old.get('p50'), new.get('p50'))}),"
+                  f" p95 {old.get('p95')} -> {new.get('p95')} ms ({change(old.get('p95'), new.get('p95'))})")
+    old_levels = {level["concurrency"]: level for level in previous.get("throughput") or []}
+    for level in current.get("throughput") or []:
+        old = old_levels.get(level["concurrency"], {})
+        print(f"  throughput x{level['concurrency']}: {old.get('runs_per_s')} -> {level['runs_per_s']} runs/s"
+              f" ({change(old.get('runs_per_s'), level['runs_per_s'])})")
+    for phase in PHASES:
+        old_rss = (previous.get("peak_rss") or {}).get(phase) or {}
+        new_rss = (current.get("peak_rss") or {}).get(phase)
+        if not new_rss:
+            continue
+        for key in ("process_mb", "process_tree_mb"):
+            print(f"  peak rss {phase}/{key}: {old_rss.get(key)} -> {new_rss.get(key)}"
+                  f" ({change(old_rss.get(key), new_rss.get(key))})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent against local fixture pages with a fake LLM")
+    parser.add_argument("--iterations", type=int, default=3, help="measured runs per scenario (default 3)")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma-separated concurrency levels (default 1,2,4)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated latency per LLM call")
+    parser.add_argument("--slow-delay-ms", type=float, default=1000, help="delay of the slow fixture's resources")
+    parser.add_argument("--keep-browser", action="store_true", help="reuse one browser per agent across runs")
+    parser.add_argument("--compiler", action="store_true",
+                        help="let the rule-based instruction compiler skip the LLM (default: every run uses the fake LLM)")
+    parser.add_argument("--plan-cache", action="store_true",
+                        help="reuse cached plans for repeated instruction templates (default: off, like --compiler)")
+    parser.add_argument("--skip", default="", help="comma-separated phases to skip: scenarios,throughput,api")
+    parser.add_argument("--output", help="result file (default benchmarks/results/bench_<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS or SCENARIOS[name][0] not in PLANS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    skip = {phase.strip() for phase in args.skip.split(",") if phase.strip()}
+
+    previous_path = Path(args.compare).resolve() if args.compare else None
+    output = Path(args.output or BENCH_DIR / "results" / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json").resolve()
+
+    # Keep artifacts, history and reports of benchmark runs out of the working tree
+    workdir = tempfile.mkdtemp(prefix="agent-bench-")
+    os.chdir(workdir)
+    os.environ.setdefault("LLM_BACKEND", "rules")
+    os.environ["HISTORY_DB"] = str(Path(workdir) / "history.db")
+    os.environ["MONITORS_ENABLED"] = "false"
+    os.environ["MONITORS_FILE"] = str(Path(workdir) / "monitors.json")
+    if not args.compiler:
+        # Keep runs on the fake LLM's plans so results stay comparable across versions
+        os.environ["INSTRUCTION_CONFIDENCE_THRESHOLD"] = "1.1"
+    os.environ["PLAN_CACHE"] = "true" if args.plan_cache else "false"
+    os.environ["PLAN_CACHE_FILE"] = str(Path(workdir) / "plan_cache.json")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "scenarios": args.scenarios,
+            "llm_latency_ms": args.llm_latency_ms,
+            "slow_delay_ms": args.slow_delay_ms,
+            "keep_browser": args.keep_browser,
+            "compiler": args.compiler,
+            "plan_cache": args.plan_cache,
+            "workdir": workdir,
+        },
+    }
+    # A fresh sampler per phase, so each phase's peak is its own and not the earlier phases' maximum
+    results["peak_rss"] = {}
+    with FixtureServer(slow_delay_s=args.slow_delay_ms / 1000) as server:
+        for phase, title, bench in (("scenarios", "run_test latency per scenario:", bench_scenarios),
+                                    ("throughput", "Throughput:", bench_throughput),
+                                    ("api", "/api/run-test latency:", bench_api)):
+            if phase in skip:
+                continue
+            print(title)
+            sampler = RssSampler().start()
+            try:
+                results[phase] = bench(server, args)
+            finally:
+                results["peak_rss"][phase] = sampler.stop()
+            print(f"  peak RSS: {results['peak_rss'][phase]}")
+    results["process_maxrss_mb"] = process_maxrss_mb()
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if previous_path:
+        try:
+            previous = json.loads(previous_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Could not read {previous_path}: {e}")
+        else:
+            compare(previous, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Per-step filmstrip capture.
+After every step a cheap viewport JPEG is taken; a 64-bit difference hash
+(dHash) of each frame is compared with the last kept frame and
+near-identical frames are dropped, so only frames where the page visibly
+changed are stored.
+"""
+
+import io
+import os
+import hashlib
+
+# Pillow is optional: without it only byte-identical frames are deduplicated
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+FRAME_QUALITY = 50
+
+
+def dhash(data: bytes, hash_size: int = 8) -> int:
+    """Difference hash: compare adjacent pixels of a (hash_size+1) x hash_size grayscale thumbnail"""
+    image = Image.open(io.BytesIO(data))
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    image = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def frame_hash(data: bytes) -> int:
+    """Perceptual hash when Pillow is available, otherwise a hash of the exact bytes"""
+    if PIL_AVAILABLE:
+        return dhash(data)
+    return int.from_bytes(hashlib.sha256(data).digest()[:8], "big")
+
+
+class Filmstrip:
+    """Captures a frame per step and keeps only frames that differ from the previous kept one"""
+
+    def __init__(self, store, threshold: int = None, quality: int = FRAME_QUALITY, persist: bool = False):
+        self.store = store
+        # Write kept frames to disk too (same switch as the run's screenshots, SCREENSHOT_PERSIST)
+        self.persist = persist
+        # Max Hamming distance (out of 64 bits) still considered "the same frame"
+        self.threshold = threshold if threshold is not None else int(os.getenv("FILMSTRIP_HASH_THRESHOLD", "4"))
+        self.quality = quality
+        self._last_hash = None
+        self._last_step = None
+        self.kept = 0
+        self.dropped = 0
+
+    def capture(self, page, step_index) -> dict:
+        """Grab a viewport frame for a finished step; returns the frame entry for the report"""
+        data = page.screenshot(type="jpeg", quality=self.quality, full_page=False)
+        value = frame_hash(data)
+        if self._last_hash is not None:
+            distance = hamming(value, self._last_hash) if PIL_AVAILABLE else (0 if value == self._last_hash else 64)
+            if distance <= self.threshold:
+                self.dropped += 1
+                return {"duplicate_of": self._last_step, "distance": distance}
+        else:
+            distance = None
+
+        artifact_id = self.store.put(data, "image/jpeg", persist=self.persist)
+        self._last_hash = value
+        self._last_step = step_index
+        self.kept += 1
+        return {
+            "id": artifact_id,
+            "url": self.store.url_for(artifact_id),
+            "hash": f"{value:016x}",
+            "distance": distance,
+            "size_bytes": len(data),
+        }
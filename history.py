@@ -0,0 +1,264 @@
+"""
+Run history in an embedded SQLite database.
+Every run_test result is queued and written by a background thread in
+batched transactions, so recording costs the test path only a queue put.
+Runs are indexed by domain, URL, instruction hash, status and time, and
+listed newest first with keyset pagination (?before=<cursor>).
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    url TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    instruction TEXT NOT NULL,
+    instruction_hash TEXT NOT NULL,
+    browser TEXT,
+    status TEXT NOT NULL,
+    duration_ms REAL,
+    error TEXT,
+    trace_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_domain_status ON runs (domain, status, id);
+CREATE INDEX IF NOT EXISTS idx_runs_url ON runs (url, id);
+CREATE INDEX IF NOT EXISTS idx_runs_instruction ON runs (instruction_hash, id);
+CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status, id);
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs (created_at);
+CREATE TABLE IF NOT EXISTS baselines (
+    key TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL NOT NULL,
+    variance REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (key, metric)
+);
+"""
+
+# Columns returned by list queries; the full JSON document is only loaded per run
+SUMMARY_COLUMNS = ("id", "run_id", "created_at", "url", "domain", "instruction", "browser", "status",
+                   "duration_ms", "error", "trace_id")
+
+# Response keys persisted with each run (inline base64 screenshots are never stored)
+STORED_KEYS = ("status", "websiteUrl", "testInstruction", "browser", "timestamp", "results", "parsed_steps",
+               "steps", "timings", "token_usage", "validations", "performance", "execution_details",
+               "screenshots", "visual", "playwright_trace", "regressions", "error", "runId", "traceId")
+
+
+def instruction_hash(instruction: str) -> str:
+    """Stable key for an instruction (case and whitespace insensitive)"""
+    return hashlib.sha256(" ".join(instruction.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _slim(result: dict) -> dict:
+    data = {key: result[key] for key in STORED_KEYS if key in result}
+    if data.get("screenshots"):
+        data["screenshots"] = [{k: v for k, v in s.items() if k != "base64"} for s in data["screenshots"]]
+    return data
+
+
+class HistoryStore:
+    """SQLite-backed run history with a batching background writer"""
+
+    def __init__(self, path="data/history.db", batch_size: int = 100, flush_interval: float = 0.5):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.path), timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _init(self):
+        with self._lock:
+            if self._initialized:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            connection.executescript(SCHEMA)
+            connection.close()
+            self._initialized = True
+
+    def _reader(self) -> sqlite3.Connection:
+        """One read connection per thread (WAL lets reads run alongside the writer)"""
+        self._init()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+
+    def record(self, result: dict, duration_ms: float = None):
+        """Queue a run_test result for persistence (returns immediately)"""
+        self._ensure_started()
+        self._queue.put(("run", (time.time(), dict(result), duration_ms)))
+
+    def save_baselines(self, key: str, stats: dict):
+        """Queue rolling-baseline state ({metric: (count, mean, variance)}) for persistence"""
+        self._ensure_started()
+        now = time.time()
+        self._queue.put(("baselines", [(key, metric, *values, now) for metric, values in stats.items()]))
+
+    def load_baselines(self, key: str) -> dict:
+        """Stored rolling-baseline state for key: {metric: (count, mean, variance)}"""
+        rows = self._reader().execute(
+            "SELECT metric, count, mean, variance FROM baselines WHERE key = ?", (key,)
+        ).fetchall()
+        return {row["metric"]: (row["count"], row["mean"], row["variance"]) for row in rows}
+
+    def flush(self, timeout: float = None):
+        """Block until everything queued so far has been written"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    @staticmethod
+    def _row(created_at: float, result: dict, duration_ms: float) -> tuple:
+        url = result.get("websiteUrl", "")
+        instruction = result.get("testInstruction", "")
+        return (
+            result.get("runId") or f"run-{created_at:.6f}",
+            created_at,
+            url,
+            domain_of(url),
+            instruction,
+            instruction_hash(instruction),
+            result.get("browser"),
+            result.get("status", "unknown"),
+            duration_ms,
+            str(result["error"])[:2000] if result.get("error") else None,
+            result.get("traceId"),
+            json.dumps(_slim(result), default=str, separators=(",", ":")),
+        )
+
+    def _run(self):
+        self._init()
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            # Collect whatever else arrives within the flush interval, up to batch_size
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not isinstance(batch[-1], threading.Event):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            rows, baseline_rows = [], []
+            try:
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        continue
+                    kind, payload = item
+                    if kind == "run":
+                        rows.append(self._row(*payload))
+                    else:
+                        baseline_rows.extend(payload)
+                if rows or baseline_rows:
+                    with connection:
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO runs (run_id, created_at, url, domain, instruction, instruction_hash,"
+                            " browser, status, duration_ms, error, trace_id, data) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                            rows,
+                        )
+                        connection.executemany(
+                            "INSERT OR REPLACE INTO baselines (key, metric, count, mean, variance, updated_at)"
+                            " VALUES (?,?,?,?,?,?)",
+                            baseline_rows,
+                        )
+            except Exception as e:
+                print(f"History writer failed to store {len(rows)} run(s): {e}")
+            finally:
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+    def query(self, url: str = None, domain: str = None, instruction: str = None, status: str = None,
+              since: float = None, until: float = None, before: int = None, limit: int = 100) -> dict:
+        """Newest-first run summaries matching the filters; pass next_cursor back as before"""
+        clauses, params = [], []
+        if url:
+            clauses.append("url = ?")
+            params.append(url)
+        if domain:
+            clauses.append("domain = ?")
+            params.append(domain_of(domain) if "://" in domain else domain.lower().removeprefix("www."))
+        if instruction:
+            clauses.append("instruction_hash = ?")
+            params.append(instruction_hash(instruction))
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        limit = max(1, min(int(limit), 1000))
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC LIMIT ?"
+        rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+        runs = []
+        for row in rows[:limit]:
+            run = dict(row)
+            run["created_at"] = datetime.fromtimestamp(run["created_at"]).isoformat()
+            runs.append(run)
+        return {"runs": runs, "next_cursor": runs[-1]["id"] if len(rows) > limit else None}
+
+    def get(self, run_id: str):
+        """Full stored document of one run, or None"""
+        row = self._reader().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)}, data FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["created_at"] = datetime.fromtimestamp(run["created_at"]).isoformat()
+        run["data"] = json.loads(run["data"])
+        return run
+
+
+history_store = HistoryStore(path=os.getenv("HISTORY_DB", "data/history.db"))
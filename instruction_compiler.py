@@ -0,0 +1,261 @@
+"""
+Rule-based instruction compiler.
+Turns routine natural language instructions into the same step list the LLM
+parser produces, without an API call:
+
+    Search for "iphone 17", click "Add to Cart" and verify the text "Added"
+    -> navigate, search(iphone 17), click(Add to Cart), verify(text: Added)
+
+Instructions are split into clauses ("then", "and <verb>", commas, ";", ". "),
+each clause is matched against verb patterns (search, click, fill, verify,
+wait, scroll, press, navigate) and scored. The overall confidence is the
+lowest clause score, so a single clause the rules do not understand sends the
+whole instruction to the LLM.
+"""
+
+import re
+from urllib.parse import urlparse
+
+# Clause confidence for arguments that were quoted vs. inferred from free text
+QUOTED = 1.0
+UNQUOTED = 0.9
+GENERIC = 0.85
+
+VERBS = ("search", "find", "look", "query", "click", "tap", "press", "select", "choose", "open", "go", "navigate",
+         "visit", "fill", "enter", "type", "input", "set", "verify", "check", "ensure", "assert", "confirm",
+         "validate", "wait", "scroll", "submit", "login", "log", "then")
+
+_QUOTE_RE = re.compile(r'"([^"]*)"|“([^”]*)”|\'([^\']*)\'')
+_PLACEHOLDER_RE = re.compile(r"\x00(\d+)\x00")
+_VERB_ALT = "|".join(VERBS)
+_SPLIT_RE = re.compile(
+    rf"\s*(?:;|\.\s+|,?\s+and\s+then\s+|,?\s+then\s+|,\s*(?=(?:{_VERB_ALT})\b)|\s+and\s+(?=(?:{_VERB_ALT})\b))\s*",
+    re.IGNORECASE,
+)
+_URL_RE = re.compile(r"^(?:https?://)?[\w-]+(?:\.[\w-]+)+(?:[/?#]\S*)?$", re.IGNORECASE)
+_ARTICLE_RE = re.compile(r"^(?:the|a|an)\s+", re.IGNORECASE)
+_ELEMENT_SUFFIX_RE = re.compile(r"\s+(?:button|link|tab|menu item|menu|icon|option|checkbox|field|box|input)$",
+                                re.IGNORECASE)
+# Trailing "on amazon" / "in the search box" after a search term ({site} = labels of the site under test)
+_SEARCH_TAIL = r"\s+(?:on|in|at|using|via)\s+(?:the\s+)?(?:website|site|page|home\s*page|search\s*(?:box|bar|field)|{site})\b.*$"
+
+PATTERNS = [
+    ("search", re.compile(r"^(?:search|find|look|query)(?:\s+up)?(?:\s+for)?\s+(?P<value>.+)$", re.I)),
+    ("navigate", re.compile(r"^(?:go|navigate|browse)\s+(?:back\s+)?to\s+(?P<target>.+)$|^(?:open|visit|load)\s+(?P<target2>.+)$", re.I)),
+    ("fill", re.compile(r"^(?:fill(?:\s+in|\s+out)?|enter|type|input|put|write)\s+(?P<value>.+?)\s+(?:in|into|in\s+to)\s+(?P<target>.+)$", re.I)),
+    ("fill_with", re.compile(r"^(?:fill(?:\s+in|\s+out)?|enter|set|populate)\s+(?P<target>.+?)\s+(?:with|as|to|=)\s+(?P<value>.+)$", re.I)),
+    ("press", re.compile(r"^press\s+(?:the\s+)?(?P<value>enter|tab|escape|esc|space|backspace|arrow\s*(?:up|down|left|right))(?:\s+key)?$", re.I)),
+    ("click", re.compile(r"^(?:click|tap|press|select|choose|hit)(?:\s+on)?\s+(?P<target>.+)$", re.I)),
+    ("submit", re.compile(r"^submit(?:\s+the)?(?:\s+(?P<target>form|search|login form|\S+ form))?$", re.I)),
+    ("wait_time", re.compile(r"^wait(?:\s+for)?\s+(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>ms|milliseconds?|s|secs?|seconds?)$", re.I)),
+    ("wait_for", re.compile(r"^wait\s+(?:for|until)\s+(?P<target>.+?)(?:\s+(?:to\s+)?(?:appear|appears|is\s+visible|shows?|loads?))?$", re.I)),
+    ("scroll", re.compile(r"^scroll\s*(?P<value>down|up|to\s+(?:the\s+)?(?:bottom|top|end))?(?:\s+(?:of\s+)?(?:the\s+)?page)?$", re.I)),
+    ("verify_title", re.compile(r"^(?:verify|check|ensure|assert|confirm|validate)\s+(?:that\s+)?(?:the\s+)?(?:page\s+)?title\s+(?:contains|includes|is|equals|has)\s+(?P<value>.+)$", re.I)),
+    ("verify_url", re.compile(r"^(?:verify|check|ensure|assert|confirm|validate)\s+(?:that\s+)?(?:the\s+)?(?:url|address)\s+(?:contains|includes|is|has)\s+(?P<value>.+)$", re.I)),
+    # "verify the page contains (the text) X" or just "verify (the) text X"
+    ("verify_text", re.compile(r"^(?:verify|check|ensure|assert|confirm|validate)\s+(?:that\s+)?(?:the\s+)?(?:(?:page|it|site|screen|result(?:s)?)?\s*(?:contains|shows|displays|has|includes|says)\s+(?:the\s+)?(?:text\s+|message\s+)?|(?:text|message)\s+)(?P<value>.+)$", re.I)),
+    ("verify_visible", re.compile(r"^(?:verify|check|ensure|assert|confirm|validate)\s+(?:that\s+)?(?:the\s+)?(?P<target>.+?)\s+(?:(?:is|are)\s+(?:visible|displayed|shown|present|loaded)|appears?|shows\s+up)$", re.I)),
+    ("verify_generic", re.compile(r"^(?:verify|check|ensure|confirm|validate)\s+(?:that\s+)?(?:the\s+)?(?P<target>.+)$", re.I)),
+]
+
+
+def _protect_quotes(text: str) -> tuple:
+    """Replace quoted strings with placeholders so splitting and matching ignore their content"""
+    quoted = []
+
+    def replace(match):
+        quoted.append(next(group for group in match.groups() if group is not None))
+        return f"\x00{len(quoted) - 1}\x00"
+
+    return _QUOTE_RE.sub(replace, text), quoted
+
+
+def _restore(text: str, quoted: list) -> tuple:
+    """Put quoted strings back; returns (text, whether the whole text was one quoted string)"""
+    text = text.strip()
+    whole = _PLACEHOLDER_RE.fullmatch(text) is not None
+    return _PLACEHOLDER_RE.sub(lambda m: quoted[int(m.group(1))], text).strip(), whole
+
+
+def _clean_target(text: str) -> str:
+    text = _ARTICLE_RE.sub("", text.strip().rstrip(".!"))
+    return _ELEMENT_SUFFIX_RE.sub("", text).strip() or text
+
+
+def _site_words(website_url: str) -> set:
+    host = (urlparse(website_url if "://" in website_url else f"https://{website_url}").hostname or "").lower()
+    labels = [label for label in host.split(".") if label not in ("www", "com", "org", "net", "co", "io", "in", "uk")]
+    return set(labels) | {host}
+
+
+def split_clauses(instruction: str) -> tuple:
+    """(clauses with quotes protected, quoted strings)"""
+    protected, quoted = _protect_quotes(" ".join(instruction.split()))
+    clauses = [clause.strip(" ,.") for clause in _SPLIT_RE.split(protected)]
+    return [clause for clause in clauses if clause], quoted
+
+
+def _compile_clause(clause: str, quoted: list, site_words: set) -> tuple:
+    """(steps, confidence) for one clause; confidence 0 when no rule matches"""
+    clause = re.sub(r"^(?:and|also|please|now|first|finally|next)\s+", "", clause, flags=re.I).strip()
+    clause = re.sub(r"^(?:then)\s+", "", clause, flags=re.I).strip()
+    for kind, pattern in PATTERNS:
+        match = pattern.match(clause)
+        if not match:
+            continue
+        groups = {key: value for key, value in match.groupdict().items() if value is not None}
+
+        if kind == "search":
+            tail = _SEARCH_TAIL.replace("{site}", "|".join(re.escape(word) for word in site_words) or "site")
+            value_text = re.sub(tail, "", groups["value"], flags=re.I)
+            value, whole = _restore(value_text, quoted)
+            value = re.sub(r"^(?:the\s+)", "", value, flags=re.I) if not whole else value
+            if not value:
+                return [], 0.0
+            return [{"action": "search", "target": "search box", "value": value}], QUOTED if whole else UNQUOTED
+
+        if kind == "navigate":
+            target, whole = _restore(groups.get("target") or groups.get("target2"), quoted)
+            target = _ARTICLE_RE.sub("", target)
+            if _URL_RE.match(target):
+                url = target if "://" in target else f"https://{target}"
+                return [{"action": "navigate", "target": "url", "value": url}], QUOTED
+            words = set(re.findall(r"[\w-]+", target.lower()))
+            if words & site_words or target.lower() in ("website", "site", "homepage", "home page", "the website"):
+                # The site under test is opened by the first step already
+                return [], QUOTED
+            # "Go to the login page" / "open Settings": follow a link with that name
+            target = re.sub(r"\s+(?:page|section|tab|menu)$", "", target, flags=re.I)
+            return [{"action": "click", "target": target, "value": None}], QUOTED if whole else 0.8
+
+        if kind in ("fill", "fill_with"):
+            value, value_quoted = _restore(groups["value"], quoted)
+            target, target_quoted = _restore(groups["target"], quoted)
+            target = _clean_target(target)
+            if not value or not target:
+                return [], 0.0
+            if target.lower() in ("search", "search box", "search bar", "search field"):
+                return [{"action": "search", "target": "search box", "value": value}], QUOTED if value_quoted else UNQUOTED
+            confidence = QUOTED if value_quoted else UNQUOTED
+            return [{"action": "fill", "target": target, "value": value}], confidence
+
+        if kind == "press":
+            key = groups["value"].strip().title().replace(" ", "")
+            key = {"Esc": "Escape", "Space": " "}.get(key, key).replace("Arrowup", "ArrowUp").replace(
+                "Arrowdown", "ArrowDown").replace("Arrowleft", "ArrowLeft").replace("Arrowright", "ArrowRight")
+            return [{"action": "press", "target": "keyboard", "value": key}], QUOTED
+
+        if kind == "click":
+            target, whole = _restore(groups["target"], quoted)
+            target = target if whole else _clean_target(target)
+            if not target:
+                return [], 0.0
+            return [{"action": "click", "target": target, "value": None}], QUOTED if whole else UNQUOTED
+
+        if kind == "submit":
+            return [{"action": "press", "target": "keyboard", "value": "Enter"}], GENERIC
+
+        if kind == "wait_time":
+            amount = float(groups["value"])
+            unit = groups["unit"].lower()
+            ms = amount if unit.startswith("m") else amount * 1000
+            return [{"action": "wait", "target": "time", "value": int(ms)}], QUOTED
+
+        if kind == "wait_for":
+            target, whole = _restore(groups["target"], quoted)
+            if re.fullmatch(r"(?:the\s+)?page(?:\s+to)?(?:\s+(?:load|finish loading))?", target, re.I):
+                return [{"action": "wait", "target": "load", "value": None}], QUOTED
+            return [{"action": "verify", "target": "text", "value": _clean_target(target) if not whole else target,
+                     "assertion": "visible"}], QUOTED if whole else GENERIC
+
+        if kind == "scroll":
+            direction = (groups.get("value") or "down").lower()
+            value = "top" if ("up" in direction or "top" in direction) else "bottom"
+            return [{"action": "scroll", "target": "page", "value": value}], QUOTED
+
+        if kind in ("verify_title", "verify_url"):
+            value, whole = _restore(groups["value"], quoted)
+            target = "title" if kind == "verify_title" else "url"
+            return [{"action": "verify", "target": target, "value": value, "assertion": "contains"}], \
+                QUOTED if whole else UNQUOTED
+
+        if kind == "verify_text":
+            # "verify text "Added" is visible": the state words are not part of the text
+            value_text = re.sub(r"\s+(?:(?:is|are)\s+(?:visible|displayed|shown|present)|appears?|shows\s+up)$", "",
+                                groups["value"], flags=re.I)
+            value, whole = _restore(value_text, quoted)
+            if not whole and re.fullmatch(r"(?:search\s+)?results?", value, re.I):
+                return [{"action": "verify", "target": "search results", "assertion": "results displayed"}], GENERIC
+            return [{"action": "verify", "target": "text", "value": value, "assertion": "visible"}], \
+                QUOTED if whole else UNQUOTED
+
+        if kind == "verify_visible":
+            target, whole = _restore(groups["target"], quoted)
+            if not whole and re.search(r"\bresults?\b", target, re.I):
+                return [{"action": "verify", "target": "search results", "assertion": "results displayed"}], GENERIC
+            return [{"action": "verify", "target": "text", "value": target if whole else _clean_target(target),
+                     "assertion": "visible"}], QUOTED if whole else GENERIC
+
+        if kind == "verify_generic":
+            target, whole = _restore(groups["target"], quoted)
+            if whole:
+                return [{"action": "verify", "target": "text", "value": target, "assertion": "visible"}], QUOTED
+            if re.search(r"\b(?:search\s+)?results?\b", target, re.I):
+                return [{"action": "verify", "target": "search results", "assertion": "results displayed"}], GENERIC
+            if re.search(r"\b(?:page|site|website|homepage)\b.*\b(?:loads?|works?|opens?)\b|\b(?:loads?|loading)\b", target, re.I):
+                return [{"action": "verify", "target": "page", "assertion": "page loaded"}], GENERIC
+            # Free-form check ("check the prices look right"): leave it to the LLM
+            return [{"action": "verify", "target": target, "assertion": "element exists"}], 0.5
+    return [], 0.0
+
+
+# Instructions that must compile without the LLM (checked by running this module)
+EXAMPLES = [
+    'Search for "iphone 17", click "Add to Cart" and verify the text "Added"',
+    'verify text "Added"',
+    'verify that "Added" appears',
+    'Click "Sign in", fill "Email" with "a@b.com" and press Enter',
+    "search for laptop then check the title contains Laptop",
+]
+
+
+def compile_instruction(instruction: str, website_url: str) -> dict:
+    """
+    Compile an instruction into steps. Returns {steps, confidence, clauses, unparsed};
+    steps always start by opening website_url.
+    """
+    steps = [{"action": "navigate", "target": "website_url", "value": website_url}]
+    clauses, quoted = split_clauses(instruction or "")
+    site_words = _site_words(website_url)
+    scores, unparsed = [], []
+    for clause in clauses:
+        clause_steps, confidence = _compile_clause(clause, quoted, site_words)
+        if confidence == 0.0:
+            unparsed.append(_restore(clause, quoted)[0])
+        scores.append(confidence)
+        steps.extend(clause_steps)
+
+    # A search not directly followed by a check verifies that results appeared, before any later
+    # click or navigation ("search for X and click the first result")
+    for index in range(len(steps) - 1, -1, -1):
+        if steps[index]["action"] == "search" and (index + 1 == len(steps) or steps[index + 1]["action"] != "verify"):
+            steps.insert(index + 1, {"action": "verify", "target": "search results", "assertion": "results displayed"})
+
+    return {
+        "steps": steps,
+        "confidence": round(min(scores), 2) if scores else 0.0,
+        "clauses": len(clauses),
+        "unparsed": unparsed,
+    }
+
+
+if __name__ == "__main__":
+    # python instruction_compiler.py - every example must compile at the default threshold (0.8)
+    for example in EXAMPLES:
+        compiled = compile_instruction(example, "https://www.example.com")
+        print(f"{compiled['confidence']:.2f}  {example}")
+        assert compiled["confidence"] >= 0.8, (example, compiled)
+    # The implicit results check belongs right after its search, not after the steps that follow it
+    steps = compile_instruction("search for laptop and click the first result", "https://www.example.com")["steps"]
+    actions = [(step["action"], step.get("target")) for step in steps]
+    assert actions[1:] == [("search", "search box"), ("verify", "search results"), ("click", "first result")], actions
@@ -0,0 +1,280 @@
+"""
+LLM backends for the agent.
+- openai: ChatOpenAI with OPENAI_API_KEY
+- local: any OpenAI-compatible endpoint (LLM_BASE_URL, e.g. vLLM, Ollama, LM Studio)
+- rules: no model at all; the agent uses its rule-based parser and code generator
+With LLM_BACKEND=auto (the default) the first one that is configured is used, so
+the agent starts without a key. Every backend enforces a request timeout and a
+concurrency limit shared by all agents in the process, and reports latency,
+queue wait and in-flight calls to metrics. Model backends also share a
+requests/tokens-per-minute limiter, retry transient errors with jittered
+backoff and stop calling a failing API through a circuit breaker.
+"""
+
+import os
+import time
+import threading
+
+import metrics
+from resilience import (CircuitBreaker, TokenBucket, classify_error, retry_after, retry_delay,
+                        CLOSED, HALF_OPEN, OPEN)
+
+# LangChain OpenAI client (optional - only the openai/local backends need it)
+try:
+    from langchain_openai import ChatOpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    ChatOpenAI = None
+    OPENAI_AVAILABLE = False
+
+BACKEND_AUTO = "auto"
+BACKEND_OPENAI = "openai"
+BACKEND_LOCAL = "local"
+BACKEND_RULES = "rules"
+BACKENDS = (BACKEND_OPENAI, BACKEND_LOCAL, BACKEND_RULES)
+
+
+class LLMUnavailable(Exception):
+    """No model can serve the call; callers fall back to the rule-based path"""
+
+
+class LLMTimeout(LLMUnavailable):
+    """The call did not get a concurrency slot or a response in time"""
+
+
+class RateLimited(LLMTimeout):
+    """The shared rate limit had no budget for the call within the allowed wait"""
+
+
+class CircuitOpen(LLMUnavailable):
+    """The backend failed repeatedly; calls are refused until the cool-down ends"""
+
+
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _total_tokens(response) -> int:
+    """Total tokens reported by a chat response (0 if unknown)"""
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("total_tokens"):
+        return token_usage["total_tokens"]
+    return (getattr(response, "usage_metadata", None) or {}).get("total_tokens") or 0
+
+
+class LLMBackend:
+    """
+    Base backend: circuit breaker, rate limit, retries, concurrency limit,
+    timeout and telemetry around _invoke()
+    """
+
+    name = "base"
+    available = True
+
+    def __init__(self, model: str = None, timeout_s: float = 30.0, max_concurrency: int = 4,
+                 rate_limit_rpm: float = 0, rate_limit_tpm: float = 0, rate_limit_wait_s: float = 10.0,
+                 max_retries: int = 2, retry_budget_s: float = 20.0,
+                 breaker_threshold: int = 5, breaker_reset_s: float = 30.0):
+        self.model = model
+        self.timeout_s = timeout_s
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Buckets start full and refill per minute; 0 disables a limit
+        self.request_bucket = TokenBucket(rate_limit_rpm / 60, rate_limit_rpm) if rate_limit_rpm else None
+        self.token_bucket = TokenBucket(rate_limit_tpm / 60, rate_limit_tpm) if rate_limit_tpm else None
+        self.rate_limit_wait_s = rate_limit_wait_s
+        self.max_retries = max_retries
+        self.retry_budget_s = retry_budget_s
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset_s)
+
+    def _invoke(self, messages: list):
+        raise NotImplementedError
+
+    @staticmethod
+    def _estimate_tokens(messages: list) -> int:
+        """Rough prompt size (4 characters per token) plus room for the completion"""
+        characters = sum(len(str(getattr(message, "content", message))) for message in messages)
+        return characters // 4 + 500
+
+    def _publish_breaker(self):
+        metrics.LLM_CIRCUIT_STATE.set(CIRCUIT_STATE_VALUES[self.breaker.state], backend=self.name)
+
+    def _rate_limit(self, estimated_tokens: int):
+        """Take request and token budget from the shared buckets (raises RateLimited)"""
+        wait_start = time.perf_counter()
+        for bucket, amount, unit in ((self.request_bucket, 1, "requests"), (self.token_bucket, estimated_tokens, "tokens")):
+            if bucket is None:
+                continue
+            remaining = self.rate_limit_wait_s - (time.perf_counter() - wait_start)
+            if not bucket.acquire(amount, timeout=max(remaining, 0)):
+                metrics.LLM_REJECTED.inc(backend=self.name, reason="rate_limited")
+                raise RateLimited(f"{self.name} backend: {unit} per minute limit reached")
+        metrics.LLM_RATE_LIMIT_WAIT.observe(time.perf_counter() - wait_start, backend=self.name)
+
+    def invoke(self, messages: list):
+        """
+        Call the model. Transient errors (429, 5xx, timeouts) are retried with
+        jittered backoff; while the circuit is open this raises CircuitOpen at once.
+        """
+        if not self.breaker.allow():
+            metrics.LLM_REJECTED.inc(backend=self.name, reason="circuit_open")
+            raise CircuitOpen(f"{self.name} backend circuit open; retrying in {self.breaker.retry_in():.0f}s")
+        first_attempt = time.monotonic()
+        estimated_tokens = self._estimate_tokens(messages)
+        attempt = 0
+        try:
+            while True:
+                try:
+                    self._rate_limit(estimated_tokens)
+                    response = self._call(messages)
+                except LLMUnavailable:
+                    # Local throttling says nothing about the API's health
+                    self.breaker.cancel_trial()
+                    raise
+                except Exception as e:
+                    kind = classify_error(e)
+                    delay = retry_after(e) or retry_delay(attempt)
+                    if (kind == "transient" and attempt < self.max_retries
+                            and time.monotonic() + delay - first_attempt < self.retry_budget_s):
+                        metrics.LLM_RETRIES.inc(backend=self.name)
+                        attempt += 1
+                        time.sleep(delay)
+                        continue
+                    self.breaker.record_failure(open_now=kind == "quota")
+                    raise
+                if self.token_bucket:
+                    actual = _total_tokens(response)
+                    if actual:
+                        self.token_bucket.adjust(actual - estimated_tokens)
+                self.breaker.record_success()
+                return response
+        finally:
+            self._publish_breaker()
+
+    def _call(self, messages: list):
+        """One attempt: wait for a concurrency slot, then call _invoke()"""
+        wait_start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout_s):
+            metrics.LLM_BACKEND_DURATION.observe(time.perf_counter() - wait_start, backend=self.name, outcome="queue_timeout")
+            raise LLMTimeout(f"{self.name} backend: no free slot within {self.timeout_s}s "
+                             f"({self.max_concurrency} concurrent calls)")
+        metrics.LLM_QUEUE_WAIT.observe(time.perf_counter() - wait_start, backend=self.name)
+        metrics.LLM_IN_FLIGHT.inc(backend=self.name)
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self._invoke(messages)
+            outcome = "ok"
+            return response
+        finally:
+            metrics.LLM_IN_FLIGHT.dec(backend=self.name)
+            metrics.LLM_BACKEND_DURATION.observe(time.perf_counter() - start, backend=self.name, outcome=outcome)
+            self._slots.release()
+
+    def describe(self) -> dict:
+        return {"backend": self.name, "model": self.model, "available": self.available,
+                "timeout_s": self.timeout_s, "max_concurrency": self.max_concurrency,
+                "rate_limit_rpm": self.request_bucket.capacity if self.request_bucket else None,
+                "rate_limit_tpm": self.token_bucket.capacity if self.token_bucket else None,
+                "max_retries": self.max_retries, "circuit": self.breaker.state}
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI API, or an OpenAI-compatible server when base_url is set"""
+
+    def __init__(self, model: str, api_key: str, base_url: str = None, name: str = BACKEND_OPENAI, **kwargs):
+        super().__init__(model=model, **kwargs)
+        if not OPENAI_AVAILABLE:
+            raise LLMUnavailable("langchain-openai is not installed")
+        self.name = name
+        self.base_url = base_url
+        client_options = {"model": model, "temperature": 0, "api_key": api_key,
+                          "timeout": self.timeout_s, "max_retries": 0}
+        if base_url:
+            client_options["base_url"] = base_url
+        self.client = ChatOpenAI(**client_options)
+
+    def _invoke(self, messages: list):
+        return self.client.invoke(messages)
+
+    def describe(self) -> dict:
+        info = super().describe()
+        if self.base_url:
+            info["base_url"] = self.base_url
+        return info
+
+
+class RulesBackend(LLMBackend):
+    """No model: every call is refused immediately so the rule-based path runs without waiting"""
+
+    name = BACKEND_RULES
+    available = False
+
+    def _invoke(self, messages: list):
+        raise LLMUnavailable("rules backend has no model")
+
+    def invoke(self, messages: list):
+        return self._invoke(messages)
+
+
+def resolve_backend_name(name: str = None) -> str:
+    """Concrete backend for a name, resolving auto from the environment"""
+    name = (name or os.getenv("LLM_BACKEND", BACKEND_AUTO)).strip().lower()
+    if name in BACKENDS:
+        return name
+    if os.getenv("OPENAI_API_KEY"):
+        return BACKEND_OPENAI
+    if os.getenv("LLM_BASE_URL"):
+        return BACKEND_LOCAL
+    return BACKEND_RULES
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = None, model: str = None) -> LLMBackend:
+    """
+    Shared backend instance for (backend, model), so the concurrency limit holds
+    across agents. Falls back to the rules backend if the requested one cannot be
+    created (missing key or client library).
+    """
+    name = resolve_backend_name(name)
+    model = model or os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+    key = (name, model)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is not None:
+            return backend
+        options = {
+            "timeout_s": float(os.getenv("LLM_TIMEOUT_S", "30")),
+            "max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            "max_retries": int(os.getenv("LLM_MAX_RETRIES", "2")),
+            "retry_budget_s": float(os.getenv("LLM_RETRY_BUDGET_S", "20")),
+            "rate_limit_wait_s": float(os.getenv("LLM_RATE_LIMIT_WAIT_S", "10")),
+            "breaker_threshold": int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            "breaker_reset_s": float(os.getenv("LLM_BREAKER_RESET_S", "30")),
+        }
+        # Requests/tokens per minute: OpenAI account limits by default, none for local servers
+        default_rpm, default_tpm = ("500", "200000") if name == BACKEND_OPENAI else ("0", "0")
+        options["rate_limit_rpm"] = float(os.getenv("LLM_RATE_LIMIT_RPM", default_rpm))
+        options["rate_limit_tpm"] = float(os.getenv("LLM_RATE_LIMIT_TPM", default_tpm))
+        try:
+            if name == BACKEND_OPENAI:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise LLMUnavailable("OPENAI_API_KEY not found in environment variables")
+                backend = OpenAIBackend(model, api_key, base_url=os.getenv("OPENAI_BASE_URL"), **options)
+            elif name == BACKEND_LOCAL:
+                base_url = os.getenv("LLM_BASE_URL")
+                if not base_url:
+                    raise LLMUnavailable("LLM_BASE_URL is required for the local backend")
+                # Local servers usually ignore the key, but the client requires one
+                backend = OpenAIBackend(model, os.getenv("LLM_API_KEY", "not-needed"), base_url=base_url,
+                                        name=BACKEND_LOCAL, **options)
+            else:
+                backend = RulesBackend(model=None, **options)
+        except LLMUnavailable as e:
+            print(f"⚠️ LLM backend '{name}' unavailable ({e}); using rule-based parsing")
+            backend = RulesBackend(model=None, **options)
+        _backends[key] = backend
+        return backend
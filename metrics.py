@@ -0,0 +1,234 @@
+"""
+In-process metrics registry exposed in the Prometheus text format.
+Counters, gauges and histograms are plain Python objects guarded by a lock,
+so recording a sample on the hot path costs a dict lookup and an addition.
+"""
+
+import threading
+from bisect import bisect_left
+
+# Default latency buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Byte-size buckets for screenshots and other artifacts
+BYTE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape_label(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class: a named metric with optional labels"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self, **labels) -> dict:
+        """Count and sum for one label set (used by reports and tests)"""
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": state[2], "sum": state[1]}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for labelvalues, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Runs
+RUNS_TOTAL = REGISTRY.counter("agent_runs_total", "Test runs by final status", ["status"])
+RUNS_IN_PROGRESS = REGISTRY.gauge("agent_runs_in_progress", "Test runs currently executing")
+RUN_DURATION = REGISTRY.histogram("agent_run_duration_seconds", "End-to-end run_test latency")
+NODE_DURATION = REGISTRY.histogram("agent_node_duration_seconds", "Latency of each LangGraph workflow node", ["node"])
+
+# LLM
+LLM_CALL_DURATION = REGISTRY.histogram("agent_llm_call_duration_seconds", "Latency of LLM calls", ["node"])
+LLM_ERRORS = REGISTRY.counter("agent_llm_errors_total", "Failed LLM calls", ["node"])
+FALLBACK_ACTIVATIONS = REGISTRY.counter("agent_fallback_activations_total",
+                                        "Times the keyword fallback replaced the LLM", ["node"])
+INSTRUCTIONS_COMPILED = REGISTRY.counter("agent_instructions_compiled_total",
+                                         "Instructions by rule compiler outcome (compiled skips the LLM)", ["outcome"])
+PLAN_CACHE_LOOKUPS = REGISTRY.counter("agent_plan_cache_lookups_total",
+                                      "Template plan cache lookups by outcome (hit skips the LLM)", ["outcome"])
+PLAN_CACHE_STORES = REGISTRY.counter("agent_plan_cache_stores_total",
+                                     "Template plan cache updates: stored, uncacheable or invalidated", ["outcome"])
+
+# Browser and artifacts
+SITE_REQUESTS_BLOCKED = REGISTRY.counter("agent_site_requests_blocked_total",
+                                         "Requests aborted by site profile blocking rules", ["profile"])
+BROWSER_LAUNCH_DURATION = REGISTRY.histogram("agent_browser_launch_seconds",
+                                             "Time to start Playwright and launch the browser", ["browser"])
+SCREENSHOT_BYTES = REGISTRY.histogram("agent_screenshot_bytes", "Encoded screenshot size", buckets=BYTE_BUCKETS)
+PDF_GENERATION_DURATION = REGISTRY.histogram("agent_pdf_generation_seconds", "Time to render a PDF report")
+SUITE_REPORT_DURATION = REGISTRY.histogram("agent_suite_report_seconds", "Time to render a suite report", ["format"])
+PLAYWRIGHT_TRACE_START_STOP = REGISTRY.histogram("agent_playwright_trace_start_stop_seconds",
+                                                 "Time spent starting and stopping Playwright tracing", ["outcome"])
+EXECUTE_DURATION = REGISTRY.histogram("agent_execute_duration_seconds",
+                                      "Test body execution time (after browser setup), by Playwright tracing", ["traced"])
+REGRESSIONS_DETECTED = REGISTRY.counter("agent_performance_regressions_total",
+                                        "Performance metrics flagged as regressed against their baseline", ["metric"])
+
+# Scheduled monitors
+MONITOR_RUNS = REGISTRY.counter("agent_monitor_runs_total", "Scheduled monitor runs by final status", ["status"])
+MONITOR_SKIPPED = REGISTRY.counter("agent_monitor_skipped_total",
+                                   "Scheduled monitor runs skipped because the previous run was still going")
+MONITOR_START_DELAY = REGISTRY.histogram("agent_monitor_start_delay_seconds",
+                                         "Delay between a monitor's scheduled time and the start of its run")
+
+# LLM backends (all nodes; per-node latency is agent_llm_call_duration_seconds)
+LLM_BACKEND_DURATION = REGISTRY.histogram("agent_llm_backend_seconds", "LLM backend call latency",
+                                          ["backend", "outcome"])
+LLM_QUEUE_WAIT = REGISTRY.histogram("agent_llm_queue_wait_seconds",
+                                    "Time LLM calls waited for a concurrency slot", ["backend"])
+LLM_IN_FLIGHT = REGISTRY.gauge("agent_llm_in_flight", "LLM calls currently running", ["backend"])
+LLM_RETRIES = REGISTRY.counter("agent_llm_retries_total", "LLM calls retried after a transient error", ["backend"])
+LLM_REJECTED = REGISTRY.counter("agent_llm_rejected_total",
+                                "LLM calls refused locally (rate limited or circuit open)", ["backend", "reason"])
+LLM_RATE_LIMIT_WAIT = REGISTRY.histogram("agent_llm_rate_limit_wait_seconds",
+                                         "Time LLM calls waited for rate limit budget", ["backend"])
+LLM_CIRCUIT_STATE = REGISTRY.gauge("agent_llm_circuit_state",
+                                   "LLM circuit breaker state (0 closed, 1 half-open, 2 open)", ["backend"])
+
+# Request coalescing (identical concurrent /api/run-test requests share one run)
+COALESCED_REQUESTS = REGISTRY.counter("agent_coalesced_requests_total",
+                                      "Run requests that attached to an identical in-flight run instead of starting one")
+COALESCED_WAITERS = REGISTRY.histogram("agent_coalesced_waiters", "Extra requests served by each coalesced run",
+                                       buckets=(0, 1, 2, 5, 10, 25, 50, 100))
+COALESCING_WAITING = REGISTRY.gauge("agent_coalescing_waiting", "Requests currently waiting on an in-flight run")
@@ -0,0 +1,284 @@
+"""
+Template-level plan cache.
+Instructions are normalized into templates with their values pulled out as
+parameters (quoted strings, search terms and numbers), so
+
+    search for iphone 17   and   search for pixel 9
+
+share the template "search for <p0>". A successful LLM plan (parsed steps
+and generated code) is stored per (origin, template) with the parameter
+values replaced by placeholders, and re-instantiated with the values of the
+next instruction of the same shape; only new shapes reach the LLM.
+
+Values are only substituted inside string literals of the generated code
+(and string values of the steps), and a plan is not cached if a value does
+not appear in it or two values collide, so a hit can never rewrite code
+it does not understand.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import tokenize
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse
+
+from instruction_compiler import VERBS
+
+_QUOTED_RE = re.compile(r'"([^"]+)"|“([^”]+)”|(?<!\w)\'([^\']+)\'(?!\w)')
+_SEARCH_RE = re.compile(
+    r"\b(search(?:\s+up)?(?:\s+for)?|find|look\s+for|query)\s+(?!for\b)((?:(?!<p\d).)+?)"
+    rf"(?=\s+(?:on|in|at|using|via)\s|\s*[,;]|\.\s|\.?$|\s+(?:and|then)\s+(?:{'|'.join(VERBS)})\b)",
+    re.IGNORECASE,
+)
+_NUMBER_RE = re.compile(r"(?<![\w<.])\d+(?:\.\d+)?(?![\w>])")
+_PLACEHOLDER_RE = re.compile(r"\x00(p\d+|url)\x00")
+
+
+def templatize(instruction: str) -> tuple:
+    """(template, params): values replaced by <p0>, <p1>, ... in a lowercased, whitespace-normalized template"""
+    params = []
+
+    def take(value: str) -> str:
+        params.append(value)
+        return f"<p{len(params) - 1}>"
+
+    text = " ".join((instruction or "").split())
+    text = _QUOTED_RE.sub(lambda m: take(next(g for g in m.groups() if g is not None)), text)
+    text = _SEARCH_RE.sub(lambda m: f"{m.group(1)} {take(m.group(2))}", text)
+    text = _NUMBER_RE.sub(lambda m: take(m.group(0)), text)
+    return text.lower().rstrip(" .!"), params
+
+
+def origin_of(url: str) -> str:
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+
+def _value_pattern(value: str):
+    return re.compile(r"(?<!\w)" + re.escape(value) + r"(?!\w)")
+
+
+def _escape_literal(value: str) -> str:
+    """A value as it has to appear inside any (non-raw) Python string literal"""
+    return (value.replace("\\", "\\\\").replace("'", "\\'").replace('"', '\\"')
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _string_spans(code: str) -> tuple:
+    """
+    (spans, opaque): offsets of plain string literal contents, and of literals a value must
+    not be substituted into. f-strings would evaluate braces in a value as code, and raw and
+    byte strings escape differently, so those are opaque.
+    """
+    line_offsets = [0]
+    for line in code.splitlines(keepends=True):
+        line_offsets.append(line_offsets[-1] + len(line))
+    spans, opaque = [], []
+    fstring_depth = 0
+    for token in tokenize.generate_tokens(io.StringIO(code).readline):
+        start = line_offsets[token.start[0] - 1] + token.start[1]
+        end = line_offsets[token.end[0] - 1] + token.end[1]
+        # Python 3.12+ splits f-strings into FSTRING_START / FSTRING_MIDDLE / FSTRING_END tokens
+        if getattr(tokenize, "FSTRING_START", None) == token.type:
+            fstring_depth += 1
+        elif getattr(tokenize, "FSTRING_END", None) == token.type:
+            fstring_depth -= 1
+        elif getattr(tokenize, "FSTRING_MIDDLE", None) == token.type:
+            opaque.append((start, end))
+        elif token.type == tokenize.STRING:
+            prefix = re.match(r"[a-zA-Z]*", token.string).group(0)
+            if fstring_depth or set(prefix.lower()) & {"r", "f", "b"}:
+                opaque.append((start, end))
+                continue
+            quote = 3 if token.string[len(prefix):len(prefix) + 3] in ('"""', "'''") else 1
+            spans.append((start + len(prefix) + quote, end - quote))
+    return spans, opaque
+
+
+def _abstract_code(code: str, values: dict) -> tuple:
+    """
+    Replace values (name -> value) inside string literals by placeholders; (code, names found).
+    ValueError if a value also shows up in a literal it cannot be substituted into.
+    """
+    found = set()
+    spans, opaque = _string_spans(code)
+    for start, end in opaque:
+        if any(_value_pattern(value).search(code[start:end]) or _value_pattern(_escape_literal(value)).search(code[start:end])
+               for value in values.values()):
+            raise ValueError("instruction value inside an f-string, raw or byte string literal")
+    parts, position = [], 0
+    for start, end in spans:
+        body = code[start:end]
+        for name, value in sorted(values.items(), key=lambda item: -len(item[1])):
+            body, count = _value_pattern(_escape_literal(value)).subn(f"\x00{name}\x00", body)
+            if count:
+                found.add(name)
+        parts.append(code[position:start])
+        parts.append(body)
+        position = end
+    parts.append(code[position:])
+    return "".join(parts), found
+
+
+def _abstract_steps(steps, values: dict, found: set):
+    """Replace values in the string values of parsed steps (recursively)"""
+    if isinstance(steps, list):
+        return [_abstract_steps(item, values, found) for item in steps]
+    if isinstance(steps, dict):
+        return {key: _abstract_steps(item, values, found) for key, item in steps.items()}
+    if isinstance(steps, str):
+        for name, value in sorted(values.items(), key=lambda item: -len(item[1])):
+            steps, count = _value_pattern(value).subn(f"\x00{name}\x00", steps)
+            if count:
+                found.add(name)
+    return steps
+
+
+def _instantiate_steps(steps, values: dict):
+    if isinstance(steps, list):
+        return [_instantiate_steps(item, values) for item in steps]
+    if isinstance(steps, dict):
+        return {key: _instantiate_steps(item, values) for key, item in steps.items()}
+    if isinstance(steps, str):
+        return _PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], steps)
+    return steps
+
+
+def _instantiate_code(code: str, values: dict) -> str:
+    return _PLACEHOLDER_RE.sub(lambda m: _escape_literal(values[m.group(1)]), code)
+
+
+class PlanCache:
+    """LRU of plan templates keyed by origin + instruction template, persisted to a JSON file"""
+
+    def __init__(self, max_entries: int = 512, ttl_s: float = 86400.0, path="data/plan_cache.json"):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.path = Path(path) if path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def key_for(website_url: str, instruction: str) -> tuple:
+        template, params = templatize(instruction)
+        return f"{origin_of(website_url)}|{template}", params
+
+    def _load(self):
+        """Read the persisted cache once (caller holds the lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not self.path.exists():
+            return
+        try:
+            for key, entry in json.loads(self.path.read_text(encoding="utf-8")).items():
+                self._entries[key] = entry
+        except Exception as e:
+            print(f"⚠️ Could not load plan cache: {e}")
+
+    def _save(self):
+        """Write the cache atomically (caller holds the lock)"""
+        if not self.path:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self._entries, separators=(",", ":")), encoding="utf-8")
+            tmp_path.replace(self.path)
+        except Exception as e:
+            print(f"⚠️ Could not save plan cache: {e}")
+
+    def lookup(self, website_url: str, instruction: str):
+        """{"parsed_steps", "generated_code"} for this instruction's template, or None"""
+        key, params = self.key_for(website_url, instruction)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl_s and time.time() - entry["stored_at"] > self.ttl_s:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] = entry.get("hits", 0) + 1
+        values = {f"p{index}": value for index, value in enumerate(params)}
+        values["url"] = website_url
+        return {
+            "parsed_steps": _instantiate_steps(entry["parsed_steps"], values),
+            "generated_code": _instantiate_code(entry["generated_code"], values),
+        }
+
+    def store(self, website_url: str, instruction: str, parsed_steps: list, generated_code: str) -> bool:
+        """Cache a successful plan; False if its values cannot be substituted safely"""
+        key, params = self.key_for(website_url, instruction)
+        values = {f"p{index}": value for index, value in enumerate(params)}
+        values["url"] = website_url
+        # Repeated values (or one inside another, or inside a placeholder name) make substitution ambiguous
+        if len(set(params)) != len(params) or any(
+                _value_pattern(a).search(b) for a in params for b in list(params) + list(values) if a != b):
+            return False
+        try:
+            found = set()
+            steps_template = _abstract_steps(parsed_steps, values, found)
+            code_template, code_found = _abstract_code(generated_code, values)
+        except (tokenize.TokenError, SyntaxError, IndentationError, ValueError):
+            return False
+        found |= code_found
+        # Every instruction value must show up in the plan, and the template must reproduce it exactly
+        if any(f"p{index}" not in found for index in range(len(params))):
+            return False
+        if (_instantiate_steps(steps_template, values) != parsed_steps
+                or _instantiate_code(code_template, values) != generated_code):
+            return False
+        with self._lock:
+            self._load()
+            self._entries[key] = {"parsed_steps": steps_template, "generated_code": code_template,
+                                  "params": len(params), "stored_at": time.time(), "hits": 0}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+        return True
+
+    def invalidate(self, website_url: str, instruction: str):
+        """Drop the template of an instruction whose cached plan failed"""
+        key, _ = self.key_for(website_url, instruction)
+        with self._lock:
+            self._load()
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._entries)
+
+
+# Global plan cache (PLAN_CACHE_FILE= empty keeps it in memory only)
+plan_cache = PlanCache(
+    max_entries=int(os.getenv("PLAN_CACHE_SIZE", "512")),
+    ttl_s=float(os.getenv("PLAN_CACHE_TTL_S", "86400")),
+    path=os.getenv("PLAN_CACHE_FILE", "data/plan_cache.json"),
+)
+
+
+if __name__ == "__main__":
+    # python plan_cache.py - values never end up inside f-strings, and braces in a value stay text
+    cache = PlanCache(path=None)
+    steps = [{"action": "search", "value": "laptop"}]
+    assert not cache.store("https://shop.example", "search for laptop", steps,
+                           'page.fill("#q", "laptop")\nprint(f"searched laptop in {page.url}")\n')
+    assert cache.store("https://shop.example", "search for laptop", steps,
+                       'page.fill("#q", "laptop")\nprint(f"searched in {page.url}")\n')
+    for value in ("{__import__}", "{", "}"):
+        plan = cache.lookup("https://shop.example", f"search for {value}")
+        compile(plan["generated_code"], "<plan>", "exec")
+        assert f'page.fill("#q", "{value}")' in plan["generated_code"], plan
+        assert plan["parsed_steps"] == [{"action": "search", "value": value}], plan
+    print("plan cache checks passed")
@@ -0,0 +1,117 @@
+"""
+Performance regression detection against rolling baselines.
+For every (URL, instruction) the agent keeps an exponentially weighted mean
+and variance of each performance metric, updated in O(1) per run - history
+is never rescanned. A run is flagged when a metric is both far above its
+baseline (z-score) and meaningfully worse in relative terms. Baseline state
+lives in memory and is persisted to the history database.
+"""
+
+import os
+import math
+import threading
+
+from history import history_store, instruction_hash
+
+# Metric -> smallest standard deviation assumed (keeps near-constant metrics from flagging noise)
+TRACKED_METRICS = {
+    "loadTime": 25.0,
+    "domContentLoaded": 25.0,
+    "ttfb": 20.0,
+    "fcp": 25.0,
+    "lcp": 50.0,
+    "cls": 0.01,
+    "transferBytes": 10_000.0,
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def update_baseline(state: tuple, value: float, alpha: float) -> tuple:
+    """One step of the exponentially weighted mean/variance: (count, mean, variance) -> new state"""
+    count, mean, variance = state
+    if count == 0:
+        return 1, value, 0.0
+    diff = value - mean
+    increment = alpha * diff
+    return count + 1, mean + increment, (1 - alpha) * (variance + diff * increment)
+
+
+class RegressionDetector:
+    """Checks run metrics against rolling baselines and folds them in afterwards"""
+
+    def __init__(self, store=history_store, window: int = None, z_threshold: float = None,
+                 min_samples: int = None, min_change: float = None):
+        self.store = store
+        # Effective window of the exponential weighting (alpha = 2 / (window + 1))
+        self.window = window or int(_env_float("REGRESSION_WINDOW", 30))
+        self.alpha = 2 / (self.window + 1)
+        self.z_threshold = z_threshold or _env_float("REGRESSION_Z_THRESHOLD", 3.0)
+        self.min_samples = min_samples or int(_env_float("REGRESSION_MIN_SAMPLES", 5))
+        # Minimum relative increase (0.1 = 10% worse than the baseline mean)
+        self.min_change = min_change if min_change is not None else _env_float("REGRESSION_MIN_CHANGE", 0.1)
+        self._baselines = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(url: str, instruction: str) -> str:
+        return f"{url.strip().rstrip('/').lower()}|{instruction_hash(instruction)}"
+
+    def _load(self, key: str) -> dict:
+        """Baseline state for key from memory, falling back to the database once (caller holds the lock)"""
+        baseline = self._baselines.get(key)
+        if baseline is None:
+            try:
+                baseline = self.store.load_baselines(key)
+            except Exception:
+                baseline = {}
+            self._baselines[key] = baseline
+        return baseline
+
+    def check(self, url: str, instruction: str, performance: dict, update: bool = True) -> dict:
+        """
+        Compare a run's performance metrics with the baseline, then (if update)
+        fold them into it. Returns {status, flagged, checked, baseline_key}.
+        """
+        key = self.key_for(url, instruction)
+        values = {
+            metric: float(performance[metric]) for metric in TRACKED_METRICS
+            if isinstance((performance or {}).get(metric), (int, float)) and performance[metric] >= 0
+        }
+        flagged = []
+        checked = {}
+        with self._lock:
+            baseline = self._load(key)
+            for metric, value in values.items():
+                count, mean, variance = baseline.get(metric, (0, 0.0, 0.0))
+                if count < self.min_samples:
+                    continue
+                std = max(math.sqrt(variance), TRACKED_METRICS[metric], abs(mean) * 0.05)
+                z_score = (value - mean) / std
+                change = (value - mean) / mean if mean > 0 else 0.0
+                checked[metric] = {"value": value, "baseline_mean": round(mean, 3), "baseline_std": round(std, 3),
+                                   "z_score": round(z_score, 2), "change_pct": round(change * 100, 1), "samples": count}
+                if z_score >= self.z_threshold and change >= self.min_change:
+                    flagged.append(dict(checked[metric], metric=metric))
+            if update and values:
+                for metric, value in values.items():
+                    baseline[metric] = update_baseline(baseline.get(metric, (0, 0.0, 0.0)), value, self.alpha)
+                updated = {metric: baseline[metric] for metric in values}
+        if update and values:
+            self.store.save_baselines(key, updated)
+
+        if flagged:
+            status = "regression"
+        elif checked:
+            status = "ok"
+        else:
+            status = "warming_up" if values else "no_data"
+        return {"status": status, "flagged": flagged, "checked": checked, "baseline_key": key}
+
+
+regression_detector = RegressionDetector()
@@ -0,0 +1,378 @@
+"""
+PDF test reports.
+Rendering happens off the request path: run-test only registers a report job
+and gets back an id. The PDF is rendered by a background worker (or, in lazy
+mode, on the first download) and the file is reused for later downloads.
+"""
+
+import os
+import re
+import uuid
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from fpdf import FPDF
+
+import metrics
+from retention import retention_manager
+
+# Report directory
+REPORTS_DIR = Path("reports")
+
+# Helper function to remove all emojis and special characters from text
+def remove_emojis(text: str) -> str:
+    """Remove all emoji and special Unicode characters that aren't supported by PDF fonts"""
+    # Remove emojis and other non-ASCII characters that might cause issues
+    # Keep only ASCII printable characters and common punctuation
+    text = re.sub(r'[^\x00-\x7F]+', '', text)  # Remove non-ASCII characters
+    return text.strip()
+
+# Enhanced PDF generator for comprehensive test reports
+def create_pdf_report(result: dict, filename: str = None) -> str:
+    """
+    Generate a comprehensive PDF report from the test result.
+    Includes test instructions, what was checked, detailed results, and metrics.
+    Returns the PDF filename (stored in REPORTS_DIR).
+    """
+    if filename is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"report_{timestamp}_{uuid.uuid4().hex[:8]}.pdf"
+    REPORTS_DIR.mkdir(exist_ok=True)
+    filepath = REPORTS_DIR / filename
+
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Header
+    pdf.set_font("Arial", "B", 20)
+    pdf.set_x(0)
+    pdf.cell(0, 12, "AI Website Test Report", ln=1, align='C')
+    pdf.ln(5)
+    
+    # Report metadata
+    pdf.set_font("Arial", "", 10)
+    report_date = result.get('timestamp', datetime.now().isoformat())
+    if 'T' in report_date:
+        report_date = report_date.split('T')[0] + ' ' + report_date.split('T')[1].split('.')[0]
+    pdf.set_x(0)
+    pdf.cell(0, 6, f"Generated: {report_date}", ln=1, align='C')
+    pdf.ln(8)
+    
+    # Test Information Section
+    pdf.set_font("Arial", "B", 14)
+    pdf.set_x(10)
+    pdf.cell(0, 8, "Test Information", ln=1)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(4)
+    
+    # Website URL
+    pdf.set_font("Arial", "B", 11)
+    pdf.set_x(10)
+    pdf.cell(40, 7, "Website URL:", 0)
+    pdf.set_font("Arial", "", 11)
+    url = result.get('websiteUrl', 'N/A')
+    pdf.set_x(50)
+    pdf.multi_cell(150, 7, url)
+    
+    # Browser
+    pdf.set_font("Arial", "B", 11)
+    pdf.set_x(10)
+    pdf.cell(40, 7, "Browser:", 0)
+    pdf.set_font("Arial", "", 11)
+    browser = result.get('browser', 'N/A')
+    pdf.set_x(50)
+    pdf.multi_cell(150, 7, browser)
+    
+    # Status
+    pdf.set_font("Arial", "B", 11)
+    pdf.set_x(10)
+    pdf.cell(40, 7, "Status:", 0)
+    pdf.set_font("Arial", "B", 11)
+    status = result.get('status', 'unknown')
+    pdf.set_text_color(0, 128, 0) if status == 'success' else pdf.set_text_color(255, 0, 0)
+    pdf.set_x(50)
+    pdf.multi_cell(150, 7, status.upper())
+    pdf.set_text_color(0, 0, 0)
+    
+    pdf.ln(3)
+    
+    # Test Instruction Section (What user requested)
+    pdf.set_font("Arial", "B", 14)
+    pdf.set_x(10)
+    pdf.cell(0, 8, "Test Instruction", ln=1)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(4)
+    pdf.set_font("Arial", "", 11)
+    instruction = remove_emojis(result.get('testInstruction', 'No instruction provided'))
+    pdf.set_x(10)
+    pdf.multi_cell(190, 6, instruction)
+    pdf.ln(3)
+    
+    # What Was Checked Section
+    pdf.set_font("Arial", "B", 14)
+    pdf.set_x(10)
+    pdf.cell(0, 8, "What Was Checked", ln=1)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(4)
+    pdf.set_font("Arial", "", 11)
+    
+    # Extract what was checked from validations and results
+    checked_items = []
+    validations = result.get("validations", [])
+    for val in validations:
+        val_type = val.get("type", "").replace("_", " ").title()
+        # Use simple ASCII hyphen to avoid font issues in PDF
+        checked_items.append(f"- {val_type}: {val.get('message', '')}")
+    
+    pdf.set_x(10)
+    if checked_items:
+        for item in checked_items:
+            pdf.multi_cell(190, 6, remove_emojis(item))
+    else:
+        pdf.multi_cell(190, 6, "- Page navigation and basic functionality")
+        pdf.multi_cell(190, 6, "- Test instruction execution")
+    
+    pdf.ln(3)
+    
+    # Test Results Section
+    results = result.get("results", [])
+    if results:
+        pdf.set_font("Arial", "B", 14)
+        pdf.set_x(10)
+        pdf.cell(0, 8, "Test Results", ln=1)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(4)
+        pdf.set_font("Arial", "", 11)
+        pdf.set_x(10)
+        for line in results:
+            # Clean up emoji and formatting - remove all emojis
+            clean_line = remove_emojis(str(line))
+            if clean_line:
+                pdf.multi_cell(190, 6, clean_line)
+        pdf.ln(3)
+    
+    # Detailed Validations
+    if validations:
+        pdf.set_font("Arial", "B", 14)
+        pdf.set_x(10)
+        pdf.cell(0, 8, f"Detailed Validations ({len(validations)} checks)", ln=1)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(4)
+        pdf.set_font("Arial", "", 10)
+        pdf.set_x(10)
+        for idx, val in enumerate(validations, 1):
+            status = val.get("status", "").upper()
+            val_type = remove_emojis(val.get("type", "").replace("_", " ").title())
+            message = remove_emojis(val.get("message", ""))
+            
+            # Status color
+            if status == "PASS":
+                pdf.set_text_color(0, 128, 0)
+            elif status == "WARNING":
+                pdf.set_text_color(255, 165, 0)
+            else:
+                pdf.set_text_color(255, 0, 0)
+            
+            pdf.set_font("Arial", "B", 10)
+            pdf.multi_cell(190, 6, f"{idx}. [{status}] {val_type}")
+            pdf.set_text_color(0, 0, 0)
+            pdf.set_font("Arial", "", 10)
+            pdf.set_x(10)
+            pdf.multi_cell(190, 5, f"   {message}")
+            pdf.ln(2)
+        pdf.ln(2)
+    
+    # Performance Metrics
+    performance = result.get("performance")
+    if performance:
+        pdf.set_font("Arial", "B", 14)
+        pdf.set_x(10)
+        pdf.cell(0, 8, "Performance Metrics", ln=1)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(4)
+        pdf.set_font("Arial", "", 11)
+        pdf.set_x(10)
+        
+        load_time = performance.get('loadTime', 0)
+        if isinstance(load_time, (int, float)):
+            load_time_sec = load_time / 1000
+            pdf.multi_cell(190, 6, f"Page Load Time: {load_time} ms ({load_time_sec:.2f} seconds)")
+        else:
+            pdf.multi_cell(190, 6, f"Page Load Time: {load_time}")
+        
+        if "pageSize" in performance:
+            page_size = performance.get('pageSize', 0)
+            if isinstance(page_size, (int, float)):
+                page_size_kb = page_size / 1024
+                pdf.set_x(10)
+                pdf.multi_cell(190, 6, f"Page Size: {page_size_kb:.2f} KB")
+            else:
+                pdf.set_x(10)
+                pdf.multi_cell(190, 6, f"Page Size: {page_size}")
+        
+        for key, label, unit in (("lcp", "Largest Contentful Paint", " ms"), ("cls", "Cumulative Layout Shift", ""),
+                                 ("ttfb", "Time to First Byte", " ms")):
+            if isinstance(performance.get(key), (int, float)):
+                pdf.set_x(10)
+                pdf.multi_cell(190, 6, f"{label}: {performance[key]}{unit}")
+        
+        pdf.ln(3)
+    
+    # Performance regressions against the rolling baseline
+    regressions = result.get("regressions")
+    if regressions and regressions.get("flagged"):
+        pdf.set_font("Arial", "B", 14)
+        pdf.set_x(10)
+        pdf.cell(0, 8, "Performance Regressions", ln=1)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+        pdf.ln(4)
+        pdf.set_font("Arial", "", 11)
+        for item in regressions["flagged"]:
+            pdf.set_x(10)
+            pdf.set_text_color(200, 0, 0)
+            pdf.multi_cell(190, 6, f"{item['metric']}: {item['value']:g} vs baseline {item['baseline_mean']:g} "
+                                   f"(+{item['change_pct']}%, z={item['z_score']}, {item['samples']} runs)")
+        pdf.set_text_color(0, 0, 0)
+        pdf.ln(3)
+    
+    # Screenshots count
+    screenshots_count = result.get("screenshots_count", 0)
+    if screenshots_count > 0:
+        pdf.set_font("Arial", "B", 11)
+        pdf.set_x(10)
+        pdf.multi_cell(190, 6, f"Note: {screenshots_count} screenshot(s) captured during test execution.")
+        pdf.ln(3)
+    
+    # Footer
+    pdf.set_y(-15)
+    pdf.set_font("Arial", "I", 8)
+    pdf.set_x(0)
+    pdf.cell(0, 10, "Generated by AI Website Test Agent", 0, 0, 'C')
+    
+    # Write to a temp name first so a download never sees a half-written file
+    tmp_path = filepath.with_name(filepath.name + ".tmp")
+    pdf.output(str(tmp_path))
+    os.replace(tmp_path, filepath)
+    retention_manager.register(filepath)
+    return filename
+
+
+STATUS_PENDING = "pending"
+STATUS_RENDERING = "rendering"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class ReportJobs:
+    """
+    Tracks PDF report jobs by id. In "background" mode a worker renders each
+    report right after it is submitted; in "lazy" mode nothing is rendered
+    until the report is first requested. Either way a report is rendered once.
+    Only finished jobs are forgotten past max_jobs; in lazy mode a pending job
+    that would have to go is rendered first, so its report URL keeps working.
+    """
+
+    def __init__(self, mode: str = "background", max_workers: int = 1, max_jobs: int = 1000):
+        self.mode = mode
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pdf-report") if mode == "background" else None
+        # Lazy mode: renders pending jobs pushed out by max_jobs (threads start only when used)
+        self._overflow_executor = None if self._executor else ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pdf-report-overflow")
+
+    @staticmethod
+    def filename_for(report_id: str) -> str:
+        return f"report_{report_id}.pdf"
+
+    def submit(self, result: dict) -> str:
+        """Register a report for a test result and return its id (rendering is deferred)"""
+        report_id = uuid.uuid4().hex[:16]
+        job = {
+            "id": report_id,
+            "status": STATUS_PENDING,
+            "filename": self.filename_for(report_id),
+            "created_at": datetime.now().isoformat(),
+            "result": dict(result),
+            "error": None,
+            "lock": threading.Lock(),
+        }
+        with self._lock:
+            self._jobs[report_id] = job
+            overflow = self._evict()
+        if self._executor:
+            self._executor.submit(self._render, job)
+        for pending in overflow:
+            self._overflow_executor.submit(self._render, pending)
+        return report_id
+
+    def _evict(self) -> list:
+        """
+        Forget the oldest finished jobs over max_jobs (their PDFs stay downloadable by
+        filename). Returns the unrendered lazy jobs that have to be rendered before they
+        can go; caller holds the lock.
+        """
+        excess = len(self._jobs) - self.max_jobs
+        overflow = []
+        for report_id, job in list(self._jobs.items()):
+            if excess <= 0:
+                break
+            if job["status"] in (STATUS_READY, STATUS_FAILED):
+                del self._jobs[report_id]
+                excess -= 1
+            elif job.get("overflow"):
+                # Already queued to render; forgotten on a later submit
+                excess -= 1
+            elif self._executor is None and job["status"] == STATUS_PENDING:
+                job["overflow"] = True
+                overflow.append(job)
+                excess -= 1
+        return overflow
+
+    def _render(self, job: dict):
+        """Render the job's PDF once; concurrent callers wait for the first one"""
+        with job["lock"]:
+            if job["status"] in (STATUS_READY, STATUS_FAILED):
+                return
+            job["status"] = STATUS_RENDERING
+            start = time.perf_counter()
+            try:
+                create_pdf_report(job["result"], job["filename"])
+                metrics.PDF_GENERATION_DURATION.observe(time.perf_counter() - start)
+                job["status"] = STATUS_READY
+            except Exception as e:
+                print(f"Error generating PDF report {job['id']}: {e}")
+                job["status"] = STATUS_FAILED
+                job["error"] = str(e)
+            # The result is only needed for rendering
+            job["result"] = None
+
+    def get(self, report_id: str):
+        with self._lock:
+            return self._jobs.get(report_id)
+
+    def status(self, report_id: str):
+        """Public view of a job, or None if the id is unknown"""
+        job = self.get(report_id)
+        if job is None:
+            if (REPORTS_DIR / self.filename_for(report_id)).exists():
+                return {"id": report_id, "status": STATUS_READY, "filename": self.filename_for(report_id)}
+            return None
+        return {key: job[key] for key in ("id", "status", "filename", "created_at", "error")}
+
+    def ensure_rendered(self, report_id: str):
+        """Path of the report's PDF, rendering it now if no worker has yet (None if unknown or failed)"""
+        job = self.get(report_id)
+        path = REPORTS_DIR / self.filename_for(report_id)
+        if job is None:
+            return path if path.exists() else None
+        if job["status"] != STATUS_READY:
+            self._render(job)
+        return path if job["status"] == STATUS_READY else None
+
+
+report_jobs = ReportJobs(mode=os.getenv("REPORT_RENDER_MODE", "background"))
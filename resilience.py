@@ -0,0 +1,146 @@
+"""
+Rate limiting, retries and circuit breaking for outbound LLM calls.
+- TokenBucket: shared requests-per-minute / tokens-per-minute budget
+- retry_delay / classify_error: jittered exponential backoff, transient errors only
+- CircuitBreaker: after repeated failures calls are refused immediately for a
+  cool-down period, so runs go straight to the fallback instead of waiting on
+  timeouts; one trial call then decides whether to close it again
+"""
+
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# HTTP statuses worth retrying (rate limited, timeouts, server errors)
+TRANSIENT_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+                    "Timeout", "ReadTimeout", "ConnectTimeout", "ConnectError"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_s up to capacity"""
+
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate_per_s = rate_per_s
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0, timeout: float = None) -> bool:
+        """Take amount tokens, waiting up to timeout seconds; False if they did not become available in time"""
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return True
+                wait = (amount - self._tokens) / self.rate_per_s
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount: float):
+        """Charge (or refund, if negative) tokens after the fact, e.g. actual vs estimated usage"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open after reset_timeout_s"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (in half-open state only one trial call at a time)"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout_s:
+                    return False
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self.state == HALF_OPEN:
+                if self._trial_running:
+                    return False
+                self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def cancel_trial(self):
+        """An allowed call never reached the API; let the next one be the trial"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self, open_now: bool = False):
+        """Count a failed call; open_now trips the breaker at once (e.g. quota exhausted)"""
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if open_now or self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial call through"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout_s - (time.monotonic() - self.opened_at))
+
+
+def _status_code(error: Exception):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def classify_error(error: Exception) -> str:
+    """'quota' (account out of credit: stop calling), 'transient' (retry) or 'fatal'"""
+    text = str(error).lower()
+    if "insufficient_quota" in text or getattr(error, "code", None) == "insufficient_quota":
+        return "quota"
+    if _status_code(error) in TRANSIENT_STATUSES or type(error).__name__ in TRANSIENT_ERRORS:
+        return "transient"
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return "transient"
+    return "fatal"
+
+
+def retry_after(error: Exception):
+    """Server-requested delay in seconds (Retry-After header), if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, base_s: float = 0.5, max_s: float = 8.0) -> float:
+    """Full-jitter exponential backoff for the given retry (0-based)"""
+    return random.uniform(0, min(max_s, base_s * (2 ** attempt)))
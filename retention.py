@@ -0,0 +1,375 @@
+"""
+Artifact retention for screenshots/, reports/ and traces/.
+Each managed area has a size quota, a maximum age and an age after which
+files are moved into per-day zip archives. File sizes and ages are kept in
+an in-memory index that writers update as they go, so the periodic sweep
+works from the index and only rescans the directories occasionally.
+Archived files stay readable through read_archived().
+"""
+
+import os
+import time
+import shutil
+import zipfile
+import threading
+from datetime import datetime
+from pathlib import Path
+
+DAY_SECONDS = 86400
+
+
+def _archive_time(name: str) -> float:
+    """Age reference of a daily archive: the end of the day it holds (its mtime changes on every append)"""
+    try:
+        return datetime.strptime(name[:-len(".zip")], "%Y-%m-%d").timestamp() + DAY_SECONDS
+    except ValueError:
+        return 0.0
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class ManagedArea:
+    """A directory under retention, with its quotas and in-memory file index"""
+
+    def __init__(self, name: str, root, max_bytes: int, max_age_s: float, archive_after_s: float = None,
+                 exclude=(), protected=None):
+        self.name = name
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.archive_after_s = archive_after_s
+        # Top-level subdirectories managed elsewhere (e.g. the thumbnail cache has its own LRU)
+        self.exclude = set(exclude)
+        # Callable returning file stems that must never be archived or deleted
+        self.protected = protected
+        self.files = {}
+        self.archives = {}
+        self.archived_names = {}
+
+    def relpath(self, path) -> str:
+        return Path(path).resolve().relative_to(self.root.resolve()).as_posix()
+
+    def contains(self, path) -> bool:
+        try:
+            rel = self.relpath(path)
+        except ValueError:
+            return False
+        return rel.split("/", 1)[0] not in self.exclude
+
+
+class RetentionManager:
+    """Indexes managed areas and enforces their quotas from a background thread"""
+
+    def __init__(self, archive_root="archive", rescan_every: int = 24):
+        self.archive_root = Path(archive_root)
+        self.rescan_every = rescan_every
+        self.areas = {}
+        self.last_sweep = None
+        self._sweeps = 0
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add_area(self, area: ManagedArea):
+        index = self._scan(area)
+        with self._lock:
+            self.areas[area.name] = area
+            area.files, area.archives, area.archived_names = index
+
+    def _archive_dir(self, area: ManagedArea) -> Path:
+        return self.archive_root / area.name
+
+    def _scan(self, area: ManagedArea) -> tuple:
+        """(files, archives, archived_names) of an area read from disk; runs without the lock"""
+        files = {}
+        if area.root.exists():
+            stack = [area.root]
+            while stack:
+                directory = stack.pop()
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if directory == area.root and entry.name in area.exclude:
+                                continue
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                            stat = entry.stat()
+                            files[Path(entry.path).relative_to(area.root).as_posix()] = (stat.st_mtime, stat.st_size)
+
+        archives = {}
+        archived_names = {}
+        archive_dir = self._archive_dir(area)
+        if archive_dir.exists():
+            for path in archive_dir.glob("*.zip"):
+                archives[path.name] = (_archive_time(path.name), path.stat().st_size)
+                try:
+                    with zipfile.ZipFile(path) as archive:
+                        for name in archive.namelist():
+                            archived_names[name] = path.name
+                except zipfile.BadZipFile:
+                    continue
+        return files, archives, archived_names
+
+    def _rescan(self, area: ManagedArea):
+        """Swap in a fresh index, keeping files registered while the directories were being read"""
+        started = time.time()
+        files, archives, archived_names = self._scan(area)
+        with self._lock:
+            for rel, info in area.files.items():
+                if info[0] >= started and rel not in files:
+                    files[rel] = info
+            area.files, area.archives, area.archived_names = files, archives, archived_names
+
+    def register(self, path, size: int = None):
+        """Record a newly written file (cheap; called by writers instead of rescanning)"""
+        path = Path(path)
+        with self._lock:
+            for area in self.areas.values():
+                if area.contains(path):
+                    try:
+                        if size is None:
+                            size = path.stat().st_size
+                        area.files[area.relpath(path)] = (time.time(), size)
+                    except OSError:
+                        pass
+                    return
+
+    def usage(self) -> dict:
+        """Indexed bytes and file counts per area"""
+        with self._lock:
+            return {
+                name: {
+                    "files": len(area.files),
+                    "bytes": sum(size for _, size in area.files.values()),
+                    "archives": len(area.archives),
+                    "archive_bytes": sum(size for _, size in area.archives.values()),
+                    "max_bytes": area.max_bytes,
+                }
+                for name, area in self.areas.items()
+            }
+
+    def read_archived(self, path):
+        """Bytes of a file (by its original path) that has been moved into an archive, or None"""
+        with self._lock:
+            area = next((a for a in self.areas.values() if a.contains(path)), None)
+            relpath = area.relpath(path) if area else None
+            archive_name = area.archived_names.get(relpath) if area else None
+        if archive_name is None:
+            return None
+        try:
+            with zipfile.ZipFile(self._archive_dir(area) / archive_name) as archive:
+                return archive.read(relpath)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def _unlink_file(self, area: ManagedArea, rel: str):
+        """Delete a file and any directories it leaves empty"""
+        path = area.root / rel
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        parent = path.parent
+        while parent != area.root and area.root in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def _delete_files(self, area: ManagedArea, entries: list) -> int:
+        """Drop planned files from the index (unless rewritten since), then delete them"""
+        with self._lock:
+            dropped = [rel for rel, info in entries if area.files.get(rel) == info]
+            for rel in dropped:
+                del area.files[rel]
+        for rel in dropped:
+            self._unlink_file(area, rel)
+        return len(dropped)
+
+    def _delete_archives(self, area: ManagedArea, names: list) -> int:
+        with self._lock:
+            for name in names:
+                area.archives.pop(name, None)
+            area.archived_names = {rel: zip_name for rel, zip_name in area.archived_names.items()
+                                   if zip_name not in names}
+        for name in names:
+            try:
+                (self._archive_dir(area) / name).unlink()
+            except FileNotFoundError:
+                pass
+        return len(names)
+
+    def _write_archive(self, area: ManagedArea, day: str, entries: list) -> tuple:
+        """
+        Append files to the day's zip; returns (zip name, zip size, entries now archived).
+        The zip is extended in a copy and swapped in, so read_archived() never opens a
+        half-written archive.
+        """
+        archive_dir = self._archive_dir(area)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        archive_path = archive_dir / f"{day}.zip"
+        tmp_path = archive_path.with_name(archive_path.name + ".tmp")
+        if archive_path.exists():
+            shutil.copyfile(archive_path, tmp_path)
+        archived = []
+        with zipfile.ZipFile(tmp_path, "a", compression=zipfile.ZIP_DEFLATED) as archive:
+            names = set(archive.namelist())
+            for rel, info in entries:
+                if rel not in names:
+                    try:
+                        archive.write(area.root / rel, rel)
+                    except OSError:
+                        continue
+                archived.append((rel, info))
+        os.replace(tmp_path, archive_path)
+        return archive_path.name, archive_path.stat().st_size, archived
+
+    def _archive_cold(self, area: ManagedArea, by_day: dict) -> int:
+        """Move planned files into per-day zips; the index is updated before the originals go"""
+        moved_total = 0
+        for day, entries in by_day.items():
+            name, size, archived = self._write_archive(area, day, entries)
+            with self._lock:
+                for rel, _ in archived:
+                    area.archived_names[rel] = name
+                area.archives[name] = (_archive_time(name), size)
+                moved = [rel for rel, info in archived if area.files.get(rel) == info]
+                for rel in moved:
+                    del area.files[rel]
+            for rel in moved:
+                self._unlink_file(area, rel)
+            moved_total += len(moved)
+        return moved_total
+
+    def _sweep_area(self, area: ManagedArea, now: float) -> dict:
+        """
+        Archive cold files, then enforce the age and size quotas. Each step is planned
+        under the lock and its compression and deletes run outside it, so writers
+        (register) and readers (read_archived) are not held up by a sweep.
+        """
+        stats = {"archived": 0, "deleted": 0, "archives_deleted": 0}
+        protected = set(area.protected()) if area.protected else set()
+
+        with self._lock:
+            by_day, expired = {}, []
+            for rel, (mtime, size) in area.files.items():
+                if Path(rel).stem in protected:
+                    continue
+                if area.archive_after_s is not None and now - mtime >= area.archive_after_s:
+                    by_day.setdefault(datetime.fromtimestamp(mtime).strftime("%Y-%m-%d"), []).append((rel, (mtime, size)))
+                elif now - mtime > area.max_age_s:
+                    expired.append((rel, (mtime, size)))
+        stats["archived"] = self._archive_cold(area, by_day)
+
+        # Age quota: plain files first, then whole daily archives
+        stats["deleted"] += self._delete_files(area, expired)
+        with self._lock:
+            expired_archives = [name for name, (mtime, _) in area.archives.items() if now - mtime > area.max_age_s]
+        stats["archives_deleted"] += self._delete_archives(area, expired_archives)
+
+        # Size quota: oldest first, archives before live files
+        with self._lock:
+            total = sum(size for _, size in area.files.values()) + sum(size for _, size in area.archives.values())
+            over_archives, over_files = [], []
+            if total > area.max_bytes:
+                for name, (_, size) in sorted(area.archives.items(), key=lambda item: item[1][0]):
+                    if total <= area.max_bytes:
+                        break
+                    over_archives.append(name)
+                    total -= size
+                for rel, info in sorted(((rel, info) for rel, info in area.files.items()
+                                         if Path(rel).stem not in protected), key=lambda item: item[1][0]):
+                    if total <= area.max_bytes:
+                        break
+                    over_files.append((rel, info))
+                    total -= info[1]
+        stats["archives_deleted"] += self._delete_archives(area, over_archives)
+        stats["deleted"] += self._delete_files(area, over_files)
+        stats["bytes"] = total
+        return stats
+
+    def sweep(self) -> dict:
+        """One retention pass over every area; returns per-area stats"""
+        start = time.perf_counter()
+        results = {}
+        # One sweep at a time; the index lock is only taken to plan and to apply each step
+        with self._sweep_lock:
+            with self._lock:
+                self._sweeps += 1
+                rescan = self._sweeps % self.rescan_every == 0
+                now = time.time()
+                areas = list(self.areas.items())
+            for name, area in areas:
+                try:
+                    if rescan:
+                        self._rescan(area)
+                    results[name] = self._sweep_area(area, now)
+                except Exception as e:
+                    results[name] = {"error": str(e)}
+        self.last_sweep = {"at": datetime.now().isoformat(), "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                           "rescanned": rescan, "areas": results}
+        return self.last_sweep
+
+    def start(self, interval_s: float = 600):
+        """Run sweep() every interval_s seconds on a daemon thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while True:
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"Retention sweep failed: {e}")
+                if self._stop.wait(interval_s):
+                    break
+
+        self._thread = threading.Thread(target=run, name="artifact-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+retention_manager = RetentionManager(archive_root=os.getenv("ARCHIVE_DIR", "archive"))
+
+
+def configure_default_areas(protected_screenshots=None):
+    """
+    Register screenshots/, reports/ and Playwright traces with quotas from the
+    environment, index files as the background writer lands them and let the
+    screenshot store read archived artifacts
+    """
+    from screenshot_capture import writer
+    from artifact_store import screenshot_store
+
+    archive_after = _env_number("ARCHIVE_AFTER_DAYS", 7) * DAY_SECONDS
+    retention_manager.add_area(ManagedArea(
+        "screenshots", "screenshots",
+        max_bytes=int(_env_number("SCREENSHOTS_MAX_MB", 2048) * 1024 * 1024),
+        max_age_s=_env_number("SCREENSHOTS_MAX_AGE_DAYS", 30) * DAY_SECONDS,
+        archive_after_s=archive_after,
+        exclude=("thumbs", "baselines"),
+        protected=protected_screenshots,
+    ))
+    retention_manager.add_area(ManagedArea(
+        "reports", "reports",
+        max_bytes=int(_env_number("REPORTS_MAX_MB", 1024) * 1024 * 1024),
+        max_age_s=_env_number("REPORTS_MAX_AGE_DAYS", 90) * DAY_SECONDS,
+        archive_after_s=archive_after,
+    ))
+    retention_manager.add_area(ManagedArea(
+        "traces", os.getenv("PLAYWRIGHT_TRACE_DIR", "traces/playwright"),
+        max_bytes=int(_env_number("TRACES_MAX_MB", 1024) * 1024 * 1024),
+        max_age_s=_env_number("TRACES_MAX_AGE_DAYS", 14) * DAY_SECONDS,
+    ))
+    writer.add_listener(retention_manager.register)
+    screenshot_store.archive_reader = retention_manager.read_archived
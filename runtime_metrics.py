@@ -0,0 +1,99 @@
+"""
+Chromium runtime metrics via the CDP Performance domain.
+Samples Performance.getMetrics around each test step so the report can show
+which step grew the JS heap, added DOM nodes or triggered layout/style work.
+"""
+
+# CDP metric name -> report key. Durations are reported by CDP in seconds.
+TRACKED_METRICS = {
+    "JSHeapUsedSize": "jsHeapUsedBytes",
+    "Nodes": "domNodes",
+    "LayoutCount": "layoutCount",
+    "RecalcStyleDuration": "recalcStyleMs",
+    "ScriptDuration": "scriptMs",
+}
+
+DURATION_METRICS = {"RecalcStyleDuration", "ScriptDuration"}
+
+
+class RuntimeMetricsSampler:
+    """
+    Samples renderer metrics for the current page through a CDP session.
+    Only Chromium exposes CDP; on other browsers every sample returns None.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.enabled = True
+        self._session = None
+        self._page = None
+        self.reattached = False
+
+    def _attach(self, page):
+        """Open a CDP session on the page and enable the Performance domain"""
+        if self._session is not None:
+            try:
+                self._session.detach()
+            except Exception:
+                pass
+        self._session = self.context.new_cdp_session(page)
+        self._session.send("Performance.enable")
+        self._page = page
+        self.reattached = True
+
+    def sample(self, page) -> dict:
+        """Return the tracked metrics for the page, or None if unavailable"""
+        if not self.enabled or page is None:
+            return None
+        try:
+            if page is not self._page or self._session is None:
+                self._attach(page)
+            try:
+                raw = self._session.send("Performance.getMetrics")
+            except Exception:
+                # Session is gone (renderer swap after cross-site navigation) - reattach once
+                self._attach(page)
+                raw = self._session.send("Performance.getMetrics")
+        except Exception:
+            self._session = None
+            self._page = None
+            try:
+                page_closed = page.is_closed()
+            except Exception:
+                page_closed = True
+            # A closed page is transient; anything else means CDP is not supported (Firefox/WebKit)
+            if not page_closed:
+                self.enabled = False
+            return None
+
+        values = {}
+        for metric in raw.get("metrics", []):
+            name = metric.get("name")
+            if name in TRACKED_METRICS:
+                value = metric.get("value", 0)
+                if name in DURATION_METRICS:
+                    value = round(value * 1000, 3)
+                values[TRACKED_METRICS[name]] = value
+        return values
+
+    def detach(self):
+        """Release the CDP session"""
+        if self._session is not None:
+            try:
+                self._session.detach()
+            except Exception:
+                pass
+        self._session = None
+        self._page = None
+
+
+def metrics_delta(before: dict, after: dict) -> dict:
+    """Difference between two samples (after - before) for every tracked metric"""
+    if not before or not after:
+        return None
+    delta = {}
+    for key in TRACKED_METRICS.values():
+        if key in before and key in after:
+            value = after[key] - before[key]
+            delta[key] = round(value, 3) if isinstance(value, float) else value
+    return delta
@@ -0,0 +1,252 @@
+"""
+In-process scheduler for recurring synthetic monitoring.
+Registered monitors (URL, instruction, interval) run on a fixed pool of
+worker threads. Each worker owns one agent whose browser stays running
+between runs, so a check only pays for a new context. Start times are
+spread with jitter, a monitor whose previous run is still queued or running
+is skipped rather than stacked, and after a successful run the parsed steps
+and generated code are replayed so later checks make no LLM calls. Results
+go to history and metrics through run_test like any other run.
+
+Run standalone (instead of cron) with: python scheduler.py
+Don't run it alongside the web app on the same MONITORS_FILE: both would
+run every monitor (set MONITORS_ENABLED=false in the app instead).
+"""
+
+import os
+import json
+import time
+import heapq
+import queue
+import random
+import uuid
+import threading
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+MIN_INTERVAL_S = 30
+
+
+class Monitor:
+    """A registered recurring test and its scheduling state"""
+
+    def __init__(self, url: str, instruction: str, interval_s: float, browser: str = "chrome",
+                 monitor_id: str = None, enabled: bool = True):
+        self.id = monitor_id or uuid.uuid4().hex[:12]
+        self.url = url
+        self.instruction = instruction
+        self.interval_s = max(float(interval_s), MIN_INTERVAL_S)
+        self.browser = browser
+        self.enabled = enabled
+        self.next_run = None
+        self.busy = False
+        self.replay = None
+        self.last_run = None
+        self.runs = 0
+        self.skipped = 0
+
+    def definition(self) -> dict:
+        """Persisted fields"""
+        return {"id": self.id, "url": self.url, "instruction": self.instruction,
+                "interval_s": self.interval_s, "browser": self.browser, "enabled": self.enabled}
+
+    def to_dict(self) -> dict:
+        data = self.definition()
+        data.update({
+            "next_run": datetime.fromtimestamp(self.next_run).isoformat() if self.next_run else None,
+            "running": self.busy,
+            "replay": self.replay is not None,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "last_run": self.last_run,
+        })
+        return data
+
+
+class MonitorScheduler:
+    """Dispatches due monitors to a shared pool of browser workers"""
+
+    def __init__(self, workers: int = 2, jitter: float = 0.1, path="data/monitors.json", agent_factory=None):
+        self.workers = max(1, workers)
+        # Fraction of the interval each start time is randomly shifted by
+        self.jitter = jitter
+        self.path = Path(path) if path else None
+        self.agent_factory = agent_factory or _default_agent
+        self.monitors = {}
+        self._heap = []
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            definitions = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        for definition in definitions:
+            try:
+                self._schedule_first(Monitor(
+                    definition["url"], definition["instruction"], definition["interval_s"],
+                    definition.get("browser", "chrome"), definition["id"], definition.get("enabled", True)))
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Skipping invalid monitor definition {definition!r}: {e}")
+
+    def _save(self):
+        """Atomically rewrite the monitor definitions (caller holds the lock)"""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps([m.definition() for m in self.monitors.values()], indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def _schedule_first(self, monitor: Monitor):
+        """First run at a random point within one interval, so monitors added together do not start together"""
+        self.monitors[monitor.id] = monitor
+        monitor.next_run = time.time() + random.uniform(0, monitor.interval_s)
+        heapq.heappush(self._heap, (monitor.next_run, monitor.id))
+
+    def add(self, url: str, instruction: str, interval_s: float, browser: str = "chrome") -> Monitor:
+        monitor = Monitor(url, instruction, interval_s, browser)
+        with self._cond:
+            self._schedule_first(monitor)
+            self._save()
+            self._cond.notify()
+        return monitor
+
+    def remove(self, monitor_id: str) -> bool:
+        with self._cond:
+            if self.monitors.pop(monitor_id, None) is None:
+                return False
+            # Its heap entry is dropped when it comes due
+            self._save()
+            return True
+
+    def get(self, monitor_id: str):
+        return self.monitors.get(monitor_id)
+
+    def list(self) -> list:
+        with self._cond:
+            return [m.to_dict() for m in self.monitors.values()]
+
+    def _next_time(self, monitor: Monitor, scheduled: float) -> float:
+        """Next start: one interval after the scheduled (not actual) start, with jitter; never in the past"""
+        spread = monitor.interval_s * self.jitter
+        return max(scheduled + monitor.interval_s + random.uniform(-spread, spread), time.time())
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, monitor_id = self._heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                monitor = self.monitors.get(monitor_id)
+                if monitor is None or monitor.next_run != due:
+                    continue
+                monitor.next_run = self._next_time(monitor, due)
+                heapq.heappush(self._heap, (monitor.next_run, monitor.id))
+                if not monitor.enabled:
+                    continue
+                if monitor.busy:
+                    # Previous run still queued or running: skip instead of piling up
+                    monitor.skipped += 1
+                    metrics.MONITOR_SKIPPED.inc()
+                    continue
+                monitor.busy = True
+                self._queue.put((monitor, due))
+
+    def _worker_loop(self):
+        agent = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            monitor, due = item
+            metrics.MONITOR_START_DELAY.observe(max(time.time() - due, 0))
+            status = "error"
+            try:
+                if agent is None:
+                    agent = self.agent_factory()
+                result = agent.run_test(monitor.url, monitor.instruction, monitor.browser, replay=monitor.replay)
+                status = result.get("status", "unknown")
+                if status == "success" and result.get("generated_code"):
+                    monitor.replay = {"parsed_steps": result.get("parsed_steps"),
+                                      "generated_code": result["generated_code"]}
+                else:
+                    # Re-plan through the LLM next time
+                    monitor.replay = None
+                monitor.last_run = {"at": datetime.now().isoformat(), "status": status,
+                                    "runId": result.get("runId"), "error": result.get("error")}
+            except Exception as e:
+                print(f"Monitor {monitor.id} failed: {e}")
+                monitor.replay = None
+                monitor.last_run = {"at": datetime.now().isoformat(), "status": "error", "error": str(e)}
+            finally:
+                monitor.runs += 1
+                monitor.busy = False
+                metrics.MONITOR_RUNS.inc(status=status)
+        if agent is not None:
+            agent.close_browser()
+
+    def start(self):
+        """Start the dispatcher and worker threads (idempotent)"""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopped = False
+            self._threads.append(threading.Thread(target=self._dispatch_loop, name="monitor-dispatch", daemon=True))
+            for index in range(self.workers):
+                self._threads.append(threading.Thread(target=self._worker_loop, name=f"monitor-worker-{index}",
+                                                      daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = None):
+        """Stop dispatching; workers finish their current run and close their browsers"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+def _default_agent():
+    from ai_agent import AIWebsiteTester
+    return AIWebsiteTester(keep_browser=True)
+
+
+monitor_scheduler = MonitorScheduler(
+    workers=int(os.getenv("MONITOR_WORKERS", "2")),
+    jitter=float(os.getenv("MONITOR_JITTER", "0.1")),
+    path=os.getenv("MONITORS_FILE", "data/monitors.json"),
+)
+
+
+if __name__ == "__main__":
+    print(f"Running {len(monitor_scheduler.monitors)} monitor(s) on {monitor_scheduler.workers} worker(s); Ctrl+C to stop")
+    monitor_scheduler.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        monitor_scheduler.stop(timeout=120)
+        from history import history_store
+        history_store.flush(timeout=10)
@@ -0,0 +1,164 @@
+"""
+In-memory screenshot capture with configurable encoding.
+Screenshots are taken straight into memory (no write/read-back through disk),
+encoded as PNG, JPEG or WebP, optionally limited to the viewport or a maximum
+height, and only persisted to disk - off the hot path - when asked to.
+"""
+
+import io
+import os
+import queue
+import threading
+from pathlib import Path
+
+# Pillow is optional: only needed to encode WebP
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default):
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+class ScreenshotOptions:
+    """How screenshots are captured and encoded"""
+
+    def __init__(self, format: str = "png", quality: int = None, full_page: bool = True,
+                 max_height: int = 8000, persist: bool = False):
+        format = (format or "png").lower()
+        if format == "jpg":
+            format = "jpeg"
+        if format not in MIME_TYPES:
+            raise ValueError(f"Unsupported screenshot format: {format}")
+        self.format = format
+        self.quality = quality
+        self.full_page = full_page
+        self.max_height = max_height if max_height and max_height > 0 else None
+        self.persist = persist
+
+    @classmethod
+    def from_env(cls) -> "ScreenshotOptions":
+        """
+        SCREENSHOT_FORMAT (png|jpeg|webp), SCREENSHOT_QUALITY (1-100, jpeg/webp),
+        SCREENSHOT_FULL_PAGE, SCREENSHOT_MAX_HEIGHT (px, 0 = unlimited), SCREENSHOT_PERSIST
+        """
+        return cls(
+            format=os.getenv("SCREENSHOT_FORMAT", "png"),
+            quality=_env_int("SCREENSHOT_QUALITY", None),
+            full_page=_env_bool("SCREENSHOT_FULL_PAGE", True),
+            max_height=_env_int("SCREENSHOT_MAX_HEIGHT", 8000),
+            persist=_env_bool("SCREENSHOT_PERSIST", False),
+        )
+
+    def copy(self, **overrides) -> "ScreenshotOptions":
+        values = {
+            "format": self.format, "quality": self.quality, "full_page": self.full_page,
+            "max_height": self.max_height, "persist": self.persist,
+        }
+        values.update(overrides)
+        return ScreenshotOptions(**values)
+
+
+def capture_screenshot(page, options: ScreenshotOptions) -> tuple:
+    """
+    Capture the page into memory.
+    Returns (image bytes, format actually used).
+    """
+    kwargs = {"full_page": options.full_page}
+    # Playwright encodes PNG and JPEG natively; WebP is transcoded from PNG
+    native_format = "jpeg" if options.format == "jpeg" else "png"
+    kwargs["type"] = native_format
+    if native_format == "jpeg" and options.quality:
+        kwargs["quality"] = options.quality
+
+    if options.full_page and options.max_height:
+        viewport = page.viewport_size or {}
+        width = viewport.get("width")
+        if width:
+            # Playwright trims the clip to the document size, so no extra round trip is needed
+            kwargs["clip"] = {"x": 0, "y": 0, "width": width, "height": options.max_height}
+
+    data = page.screenshot(**kwargs)
+
+    if options.format == "webp":
+        if not PIL_AVAILABLE:
+            return data, native_format
+        image = Image.open(io.BytesIO(data))
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=options.quality or 80, method=4)
+        return output.getvalue(), "webp"
+    return data, native_format
+
+
+class BackgroundWriter:
+    """Writes files on a daemon thread so disk I/O stays off the test's hot path"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._listeners = []
+    
+    def add_listener(self, callback):
+        """Call callback(path, size) after each file has been written"""
+        self._listeners.append(callback)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="screenshot-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, path, data: bytes):
+        """Queue bytes to be written to path"""
+        self._ensure_started()
+        self._queue.put((Path(path), data))
+
+    def flush(self, timeout: float = None):
+        """Block until all queued writes are done"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            path, data = self._queue.get()
+            try:
+                if path is None:
+                    data.set()
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_name(path.name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                for callback in self._listeners:
+                    callback(path, len(data))
+            except Exception as e:
+                print(f"Screenshot writer failed for {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+writer = BackgroundWriter()
@@ -0,0 +1,70 @@
+"""
+Singleflight: concurrent calls with the same key share one execution.
+The first caller runs the function; callers that arrive while it is running
+wait for it and receive the same result (or exception). The key is released
+as soon as the run finishes, so later requests start a fresh run.
+"""
+
+import threading
+
+import metrics
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls by key"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn) -> tuple:
+        """(result of fn(), whether it was shared from another caller's run); re-raises fn's exception"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            metrics.COALESCED_REQUESTS.inc()
+            metrics.COALESCING_WAITING.inc()
+            try:
+                flight.done.wait()
+            finally:
+                metrics.COALESCING_WAITING.dec()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # Release the key before waking waiters: new requests after this point run again
+            with self._lock:
+                self._flights.pop(key, None)
+                waiters = flight.waiters
+            metrics.COALESCED_WAITERS.observe(waiters)
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+# Global coalescer for /api/run-test
+run_flights = SingleFlight()
@@ -0,0 +1,164 @@
+"""
+Site profile registry.
+Per-site knowledge (selectors, wait strategy, request blocking rules) lives in
+JSON files under profiles/ instead of string literals in the code generator.
+Each profile lists the registrable domains it applies to (amazon.in,
+amazon.com, ...) and is merged over profiles/_default.json once at load time,
+so a lookup is a dict access on the page's host and registrable domain.
+The directory is re-scanned when a file changes (checked at most every
+SITE_PROFILES_RELOAD_S seconds), so profiles can be edited without a restart.
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+import metrics
+
+DEFAULT_PROFILE_FILE = "_default.json"
+
+# Public suffixes with two labels that the common sites use (no tldextract dependency)
+MULTI_LABEL_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "co.in", "org.in", "gov.in", "com.au", "net.au", "org.au",
+    "co.jp", "ne.jp", "com.br", "com.mx", "co.nz", "com.sg", "com.tr", "co.za", "com.cn", "com.hk",
+    "co.kr", "com.ar", "com.tw",
+}
+
+EMPTY_PROFILE = {
+    "name": "default",
+    "selectors": {"search_input": [], "search_submit": [], "search_results": []},
+    "wait": {"load_state": "domcontentloaded", "networkidle_ms": 30000, "search_navigates": True, "settle_ms": 2000},
+    "block": {"resource_types": [], "url_patterns": []},
+}
+
+
+def registrable_domain(host: str) -> str:
+    """example.co.uk for www.shop.example.co.uk; IPs and single-label hosts are returned as is"""
+    host = (host or "").lower().rstrip(".")
+    labels = host.split(".")
+    if len(labels) < 3 or host.replace(".", "").isdigit():
+        return host
+    if ".".join(labels[-2:]) in MULTI_LABEL_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def _host_of(url: str) -> str:
+    return (urlparse(url if "://" in url else f"https://{url}").hostname or "").lower()
+
+
+def merge_profile(base: dict, profile: dict) -> dict:
+    """Profile over base: site selectors first (then the generic ones), wait/block keys override or extend"""
+    merged = {"name": profile.get("name", base.get("name")), "domains": list(profile.get("domains") or [])}
+    merged["selectors"] = {}
+    for kind in set(base.get("selectors", {})) | set(profile.get("selectors", {})):
+        own = list(profile.get("selectors", {}).get(kind) or [])
+        merged["selectors"][kind] = own + [s for s in base.get("selectors", {}).get(kind) or [] if s not in own]
+    merged["wait"] = {**base.get("wait", {}), **(profile.get("wait") or {})}
+    merged["block"] = {
+        key: list(base.get("block", {}).get(key) or []) + list((profile.get("block") or {}).get(key) or [])
+        for key in ("resource_types", "url_patterns")
+    }
+    return merged
+
+
+class SiteProfileRegistry:
+    """Profiles indexed by host / registrable domain, reloaded when the profile files change"""
+
+    def __init__(self, directory, reload_interval_s: float = 2.0):
+        self.directory = Path(directory)
+        self.reload_interval_s = reload_interval_s
+        self.default = EMPTY_PROFILE
+        self._index = {}
+        self._profiles = []
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _scan(self) -> tuple:
+        """Signature of the profile files (name, mtime, size); changes when any file is edited"""
+        try:
+            return tuple(sorted((p.name, p.stat().st_mtime_ns, p.stat().st_size)
+                                for p in self.directory.glob("*.json")))
+        except OSError:
+            return ()
+
+    def reload(self) -> int:
+        """Re-read every profile file and swap in the new index; returns the number of site profiles"""
+        with self._lock:
+            signature = self._scan()
+            default = EMPTY_PROFILE
+            default_path = self.directory / DEFAULT_PROFILE_FILE
+            if default_path.exists():
+                try:
+                    default = merge_profile(EMPTY_PROFILE, json.loads(default_path.read_text(encoding="utf-8")))
+                except Exception as e:
+                    print(f"⚠️ Could not load default site profile: {e}")
+            index, profiles = {}, []
+            for path in sorted(self.directory.glob("*.json")):
+                if path.name == DEFAULT_PROFILE_FILE:
+                    continue
+                try:
+                    profile = json.loads(path.read_text(encoding="utf-8"))
+                    profile.setdefault("name", path.stem)
+                    merged = merge_profile(default, profile)
+                except Exception as e:
+                    # A broken file keeps the rest of the registry usable
+                    print(f"⚠️ Could not load site profile {path.name}: {e}")
+                    continue
+                profiles.append(merged)
+                for domain in merged["domains"]:
+                    index[domain.lower()] = merged
+            # Readers use whichever index they picked up; no lock on the lookup path
+            self.default, self._index, self._profiles = default, index, profiles
+            self._signature = signature
+            self._checked_at = time.monotonic()
+            return len(profiles)
+
+    def _maybe_reload(self):
+        if not self.reload_interval_s or time.monotonic() - self._checked_at < self.reload_interval_s:
+            return
+        self._checked_at = time.monotonic()
+        if self._scan() != self._signature:
+            count = self.reload()
+            print(f"🔄 Reloaded {count} site profile(s)")
+
+    def profile_for(self, url: str) -> dict:
+        """Merged profile for the URL's host (exact host first, then its registrable domain), else the default"""
+        self._maybe_reload()
+        host = _host_of(url)
+        index = self._index
+        return index.get(host) or index.get(registrable_domain(host)) or self.default
+
+    def list(self) -> list:
+        self._maybe_reload()
+        return [{"name": p["name"], "domains": p["domains"]} for p in self._profiles]
+
+
+def blocking_handler(profile: dict):
+    """context.route handler aborting requests the profile blocks, or None if it blocks nothing"""
+    resource_types = set(profile["block"].get("resource_types") or [])
+    url_patterns = tuple(profile["block"].get("url_patterns") or [])
+    if not resource_types and not url_patterns:
+        return None
+
+    def handle(route):
+        request = route.request
+        if request.resource_type in resource_types or any(pattern in request.url for pattern in url_patterns):
+            metrics.SITE_REQUESTS_BLOCKED.inc(profile=profile["name"])
+            route.abort()
+        else:
+            route.continue_()
+
+    return handle
+
+
+# Global registry (profiles/ next to this module unless SITE_PROFILES_DIR is set)
+site_profiles = SiteProfileRegistry(
+    os.getenv("SITE_PROFILES_DIR") or Path(__file__).resolve().parent / "profiles",
+    reload_interval_s=float(os.getenv("SITE_PROFILES_RELOAD_S", "2")),
+)
@@ -118,7 +118,7 @@ function displayResults(data) {
         const uniqueScreenshots = [];
         const seenNames = new Set();
         data.screenshots.forEach((screenshot) => {
-            if (screenshot && screenshot.base64 && screenshot.name) {
+            if (screenshot && (screenshot.url || screenshot.base64) && screenshot.name) {
                 if (!seenNames.has(screenshot.name)) {
                     seenNames.add(screenshot.name);
                     uniqueScreenshots.push(screenshot);
@@ -134,14 +134,20 @@ function displayResults(data) {
             `;
             uniqueScreenshots.forEach((screenshot, index) => {
                 const displayName = screenshot.name || `Screenshot ${index + 1}`;
+                // Served by reference; inline base64 only when the request opted in
+                const imageSrc = screenshot.url || `data:${screenshot.mime_type || 'image/png'};base64,${screenshot.base64}`;
+                // Grid shows a lazily loaded thumbnail; the full-size image is only fetched on click
+                const thumbSrc = screenshot.url ? `${screenshot.url}/thumbnail?w=320&h=240&fit=crop` : imageSrc;
+                const thumbSrcset = screenshot.url ? `srcset="${thumbSrc} 1x, ${screenshot.url}/thumbnail?w=640&h=480&fit=crop 2x"` : '';
                 html += `
                     <div style="border: 1px solid #ddd; border-radius: 8px; overflow: hidden; background: white; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                        <img src="data:image/png;base64,${screenshot.base64}" 
+                        <img src="${thumbSrc}" ${thumbSrcset}
+                             loading="lazy" decoding="async"
                              alt="${displayName}" 
                              style="width: 100%; height: auto; display: block; cursor: pointer; transition: transform 0.2s;"
                              onmouseover="this.style.transform='scale(1.02)'"
                              onmouseout="this.style.transform='scale(1)'"
-                             onclick="window.open('data:image/png;base64,${screenshot.base64}', '_blank')"
+                             onclick="window.open('${imageSrc}', '_blank')"
                              title="Click to view full size">
                         <div style="padding: 0.5rem; background: #f8f9fa; font-size: 0.85em; color: #666; text-align: center;">
                             ${displayName}
@@ -153,6 +159,24 @@ function displayResults(data) {
         }
     }
 
+    // Display Visual Regression result (diff image highlights changed pixels in red)
+    if (data.visual && data.visual.status !== 'unavailable') {
+        const visualFailed = data.visual.status === 'fail';
+        const visualColor = visualFailed ? '#dc3545' : '#28a745';
+        const visualText = data.visual.status === 'baseline_created'
+            ? 'Baseline created from this run'
+            : `${((data.visual.score || 0) * 100).toFixed(2)}% of pixels differ from baseline (threshold ${((data.visual.threshold || 0) * 100).toFixed(2)}%)`;
+        html += `
+            <div style="margin-top: 1.5rem;">
+                <h4><i class="fas fa-images"></i> Visual Regression:</h4>
+                <div style="margin-top: 0.5rem; padding: 0.5rem; border-left: 3px solid ${visualColor}; background: ${visualFailed ? '#fff3cd' : '#f0f9ff'};">
+                    <strong>${visualFailed ? '❌' : '✅'} ${data.visual.status}:</strong> ${visualText}
+                    ${data.visual.diff_url ? `<div style="margin-top: 0.5rem;"><img src="${data.visual.diff_url}" loading="lazy" alt="Visual diff" style="max-width: 320px; cursor: pointer;" onclick="window.open('${data.visual.diff_url}', '_blank')"></div>` : ''}
+                </div>
+            </div>
+        `;
+    }
+
     // Display Performance Metrics
     if (data.performance) {
         html += `
@@ -160,12 +184,40 @@ function displayResults(data) {
                 <h4><i class="fas fa-tachometer-alt"></i> Performance Metrics:</h4>
                 <ul style="margin-left: 1.5rem; margin-top: 0.5rem;">
                     <li>Load Time: ${data.performance.loadTime || 0}ms</li>
-                    <li>Page Size: ${data.performance.pageSize || 'N/A'}KB</li>
+                    ${data.performance.lcp != null ? `<li>Largest Contentful Paint: ${data.performance.lcp}ms</li>` : ''}
+                    ${data.performance.cls != null ? `<li>Cumulative Layout Shift: ${data.performance.cls}</li>` : ''}
+                    <li>Page Size: ${data.performance.pageSize ? (data.performance.pageSize / 1024).toFixed(2) : 'N/A'}KB</li>
                 </ul>
             </div>
         `;
     }
 
+    // Display metrics that regressed against the rolling baseline for this URL and instruction
+    if (data.regressions && data.regressions.flagged && data.regressions.flagged.length > 0) {
+        const items = data.regressions.flagged.map(r =>
+            `<li>${r.metric}: ${r.value} vs baseline ${r.baseline_mean} (+${r.change_pct}%, z=${r.z_score}, ${r.samples} runs)</li>`
+        ).join('');
+        html += `
+            <div style="margin-top: 1.5rem;">
+                <h4><i class="fas fa-chart-line"></i> Performance Regressions:</h4>
+                <ul style="margin-left: 1.5rem; margin-top: 0.5rem; color: #dc3545;">${items}</ul>
+            </div>
+        `;
+    }
+
+    // Playwright trace kept for failing runs (open with `playwright show-trace` or trace.playwright.dev)
+    if (data.playwright_trace && data.playwright_trace.url) {
+        html += `
+            <div style="margin-top: 1.5rem;">
+                <h4><i class="fas fa-film"></i> Playwright Trace:</h4>
+                <a href="${data.playwright_trace.url}" style="margin-left: 1.5rem;">
+                    <i class="fas fa-download"></i> ${data.playwright_trace.filename}
+                </a>
+                <span style="font-size: 0.85rem; color: #666;">(${Math.round((data.playwright_trace.size_bytes || 0) / 1024)}KB, trace start/stop ${data.playwright_trace.start_stop_ms}ms${data.playwright_trace.execute_delta_ms !== undefined ? `, ${data.playwright_trace.execute_delta_ms}ms vs untraced runs` : ''})</span>
+            </div>
+        `;
+    }
+
     // Track latest report URL for header button
     if (data.reportUrl) {
     }
@@ -27,8 +27,14 @@ for attempt in range(3):
 # Import AI agent
 try:
     from ai_agent import AIWebsiteTester
+    from artifact_store import screenshot_store
+    from llm_backends import BACKEND_OPENAI, resolve_backend_name
+    import thumbnails
 except ImportError as e:
     AIWebsiteTester = None
+    screenshot_store = None
+    BACKEND_OPENAI, resolve_backend_name = "openai", None
+    thumbnails = None
     # Don't show error here - will be handled later
     pass
 
@@ -678,8 +684,10 @@ def get_ai_agent():
             api_key = api_key.strip().strip('"').strip("'")
             os.environ['OPENAI_API_KEY'] = api_key
         
-        # If no API key, return None but don't fail - agent can work in fallback mode
-        if not api_key or len(api_key) < 10:
+        # No key: only start if the backend resolves to a keyless one (local endpoint or rules-only);
+        # LLM_BACKEND=auto without a key or LLM_BASE_URL resolves to rules
+        keyless = resolve_backend_name is not None and resolve_backend_name() != BACKEND_OPENAI
+        if (not api_key or len(api_key) < 10) and not keyless:
             return None, "OPENAI_API_KEY_NOT_FOUND"
         
         # Try to initialize the agent
@@ -1150,17 +1158,32 @@ with col_results:
                     seen = set()
                     unique_screenshots = []
                     for ss in screenshots:
-                        if ss.get("name") and ss.get("name") not in seen and ss.get("base64"):
+                        if ss.get("name") and ss.get("name") not in seen and ss.get("id"):
                             seen.add(ss.get("name"))
                             unique_screenshots.append(ss)
                     
                     if unique_screenshots:
                         cols = st.columns(min(len(unique_screenshots), 3))
                         for idx, screenshot in enumerate(unique_screenshots):
+                            # Same process as the agent: read the bytes from the store by id
+                            stored = screenshot_store.get(screenshot["id"])
+                            if not stored:
+                                continue
+                            caption = screenshot.get("name", f"Screenshot {idx + 1}")
+                            # Grid shows a cached thumbnail; the full-size image is only sent on click
+                            preview = stored[0]
+                            if thumbnails.PIL_AVAILABLE:
+                                preview = thumbnails.thumbnail_cache.get(
+                                    screenshot_store, screenshot["id"], 480, 360, crop=True
+                                ) or stored[0]
                             with cols[idx % len(cols)]:
-                                st.image(
-                                    f"data:image/png;base64,{screenshot.get('base64')}",
-                                    caption=screenshot.get("name", f"Screenshot {idx + 1}"),
+                                st.image(preview, caption=caption, use_container_width=True)
+                                st.download_button(
+                                    "🔍 Full size",
+                                    data=stored[0],
+                                    file_name=caption,
+                                    mime=stored[1],
+                                    key=f"full_{screenshot['id']}_{idx}",
                                     use_container_width=True
                                 )
                 
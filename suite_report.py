@@ -0,0 +1,335 @@
+"""
+Consolidated suite reports for batches of test runs.
+The PDF has a summary table followed by one page per test with its
+validations, metrics and a thumbnail of the final screenshot. Per-test
+pages, thumbnails included, are rendered in chunks on a process pool and
+merged with pypdf, so large suites scale with the number of cores. An equivalent static HTML
+report loads its thumbnails lazily.
+"""
+
+import io
+import os
+import sys
+import json
+import html
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fpdf import FPDF
+
+import metrics
+from reports import remove_emojis
+from artifact_store import screenshot_store
+import thumbnails
+from retention import retention_manager
+
+# pypdf is optional: without it the whole suite is rendered in one process
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PdfReader = None
+    PdfWriter = None
+    PYPDF_AVAILABLE = False
+
+# Below this many tests the process pool costs more than it saves
+PARALLEL_MIN_TESTS = 20
+THUMBNAIL_SIZE = (480, 300)
+
+_pool = None
+_pool_workers = 1
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared process pool, started on first use (SUITE_REPORT_WORKERS, default: all cores)"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = int(os.getenv("SUITE_REPORT_WORKERS", "0")) or os.cpu_count() or 1
+            # Spawn, not fork: the server has writer, retention and scheduler threads whose
+            # locks a forked child could inherit in the held state
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _final_screenshot(result: dict):
+    """The screenshot that best represents the end state of a run"""
+    screenshots = [s for s in result.get("screenshots") or [] if s and s.get("id")]
+    for screenshot in screenshots:
+        if screenshot.get("name", "").startswith("final"):
+            return screenshot
+    return screenshots[-1] if screenshots else None
+
+
+def _duration_ms(result: dict):
+    return (result.get("token_usage") or {}).get("total_ms")
+
+
+def _summarize(results: list) -> dict:
+    statuses = [r.get("status", "unknown") for r in results]
+    return {
+        "total": len(results),
+        "passed": statuses.count("success"),
+        "failed": len(results) - statuses.count("success"),
+    }
+
+
+def _section_heading(pdf: FPDF, text: str):
+    pdf.set_font("Arial", "B", 12)
+    pdf.set_x(10)
+    pdf.cell(0, 7, text, ln=1)
+    pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+    pdf.ln(2)
+
+
+def _write_summary(pdf: FPDF, results: list, title: str):
+    """Title page with totals and one table row per test"""
+    summary = _summarize(results)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 20)
+    pdf.set_x(0)
+    pdf.cell(0, 12, remove_emojis(title), ln=1, align='C')
+    pdf.set_font("Arial", "", 11)
+    pdf.set_x(0)
+    pdf.cell(0, 7, f"{summary['total']} tests - {summary['passed']} passed - {summary['failed']} failed", ln=1, align='C')
+    pdf.ln(5)
+
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_fill_color(230, 230, 230)
+    for label, width in (("#", 10), ("Status", 20), ("Website", 60), ("Instruction", 80), ("Time (s)", 20)):
+        pdf.cell(width, 7, label, border=1, fill=True)
+    pdf.ln()
+    pdf.set_font("Arial", "", 8)
+    for index, result in enumerate(results, 1):
+        status = result.get("status", "unknown")
+        duration = _duration_ms(result)
+        pdf.cell(10, 6, str(index), border=1)
+        pdf.set_text_color(0, 128, 0) if status == "success" else pdf.set_text_color(255, 0, 0)
+        pdf.cell(20, 6, status.upper()[:10], border=1)
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(60, 6, remove_emojis(result.get("websiteUrl", ""))[:42], border=1)
+        pdf.cell(80, 6, remove_emojis(result.get("testInstruction", ""))[:58], border=1)
+        pdf.cell(20, 6, f"{duration / 1000:.1f}" if duration else "-", border=1)
+        pdf.ln()
+
+
+def _thumbnail_input(result: dict) -> tuple:
+    """
+    (cached thumbnail, None) or (None, (artifact id, screenshot bytes)) for the final
+    screenshot of a result. Runs in the parent: the store may hold the screenshot only in
+    memory, and hits go through the shared cache's LRU index.
+    """
+    screenshot = _final_screenshot(result)
+    if not screenshot or not thumbnails.PIL_AVAILABLE:
+        return None, None
+    try:
+        # Variants rendered for the UI or earlier reports are reused
+        cached = thumbnails.thumbnail_cache.lookup(screenshot["id"], *THUMBNAIL_SIZE, crop=True)
+        if cached is not None:
+            return cached, None
+        stored = screenshot_store.get(screenshot["id"])
+        return None, ((screenshot["id"], stored[0]) if stored else None)
+    except Exception as e:
+        print(f"⚠️ Thumbnail for suite report failed: {e}")
+        return None, None
+
+
+def _render_thumbnail(data: bytes):
+    """Decode and resize a final screenshot (in the worker; None if it fails)"""
+    try:
+        return thumbnails.render_thumbnail(data, *thumbnails.normalize_size(*THUMBNAIL_SIZE), crop=True)
+    except Exception as e:
+        print(f"⚠️ Thumbnail for suite report failed: {e}")
+        return None
+
+
+def _write_test_section(pdf: FPDF, index: int, result: dict, thumbnail: bytes = None):
+    """One page per test: header, validations, performance and final screenshot thumbnail"""
+    pdf.add_page()
+    status = result.get("status", "unknown")
+    pdf.set_font("Arial", "B", 14)
+    pdf.set_x(10)
+    pdf.cell(0, 8, f"Test {index}: {status.upper()}", ln=1)
+    pdf.set_font("Arial", "", 10)
+    pdf.set_x(10)
+    pdf.multi_cell(190, 5, remove_emojis(f"Website: {result.get('websiteUrl', 'N/A')}"))
+    pdf.set_x(10)
+    pdf.multi_cell(190, 5, remove_emojis(f"Instruction: {result.get('testInstruction', '')}"))
+    if result.get("error"):
+        pdf.set_text_color(255, 0, 0)
+        pdf.set_x(10)
+        pdf.multi_cell(190, 5, remove_emojis(f"Error: {result['error']}")[:500])
+        pdf.set_text_color(0, 0, 0)
+    pdf.ln(2)
+
+    validations = result.get("validations") or []
+    if validations:
+        _section_heading(pdf, f"Validations ({len(validations)})")
+        pdf.set_font("Arial", "", 9)
+        for val in validations:
+            pdf.set_x(10)
+            pdf.multi_cell(190, 5, remove_emojis(f"[{val.get('status', '').upper()}] {val.get('message', '')}")[:300])
+        pdf.ln(2)
+
+    performance = result.get("performance")
+    visual = result.get("visual")
+    if performance or visual:
+        _section_heading(pdf, "Metrics")
+        pdf.set_font("Arial", "", 9)
+        if performance:
+            pdf.set_x(10)
+            pdf.multi_cell(190, 5, f"Page Load Time: {performance.get('loadTime', 'N/A')} ms")
+        if visual and "score" in visual:
+            pdf.set_x(10)
+            pdf.multi_cell(190, 5, f"Visual diff: {visual['score'] * 100:.2f}% ({visual.get('status')})")
+        pdf.ln(2)
+
+    if thumbnail:
+        try:
+            _section_heading(pdf, "Final Screenshot")
+            pdf.image(io.BytesIO(thumbnail), x=10, w=120)
+        except Exception as e:
+            pdf.set_x(10)
+            pdf.multi_cell(190, 5, f"(screenshot unavailable: {e})")
+
+
+def _write_sections(pdf: FPDF, chunk: list) -> list:
+    """
+    Write the pages of (index, result, cached thumbnail, source) tuples, rendering missing
+    thumbnails from their source; returns the (artifact id, thumbnail) pairs rendered
+    """
+    rendered = []
+    for index, result, thumbnail, source in chunk:
+        if thumbnail is None and source:
+            thumbnail = _render_thumbnail(source[1])
+            if thumbnail:
+                rendered.append((source[0], thumbnail))
+        _write_test_section(pdf, index, result, thumbnail)
+    return rendered
+
+
+def _render_sections(chunk: list) -> tuple:
+    """Worker: render a slice of tests into a standalone PDF; returns (pdf bytes, rendered thumbnails)"""
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, 15)
+    rendered = _write_sections(pdf, chunk)
+    return bytes(pdf.output()), rendered
+
+
+def _cache_thumbnails(rendered: list):
+    """Add thumbnails rendered by the workers to the shared cache (parent only, so its index stays right)"""
+    for artifact_id, thumbnail in rendered:
+        try:
+            thumbnails.thumbnail_cache.add(artifact_id, *THUMBNAIL_SIZE, True, thumbnail)
+        except Exception as e:
+            print(f"⚠️ Could not cache suite report thumbnail: {e}")
+
+
+def render_suite_pdf(results: list, path, title: str = "AI Website Test Suite Report") -> dict:
+    """Write the consolidated PDF; returns render stats"""
+    start = time.perf_counter()
+    # Cache lookups happen here; decoding and resizing the misses happens in the workers
+    indexed = [(index, result, *_thumbnail_input(result)) for index, result in enumerate(results, 1)]
+    parallel = PYPDF_AVAILABLE and len(results) >= PARALLEL_MIN_TESTS
+
+    summary_pdf = FPDF()
+    summary_pdf.set_auto_page_break(True, 15)
+    _write_summary(summary_pdf, results, title)
+
+    if not parallel:
+        _cache_thumbnails(_write_sections(summary_pdf, indexed))
+        summary_pdf.output(str(path))
+        chunks = 1
+    else:
+        pool = _get_pool()
+        # A few chunks per worker keeps the cores busy when some tests have larger pages
+        chunk_size = max(1, -(-len(indexed) // (_pool_workers * 4)))
+        chunks = [indexed[i:i + chunk_size] for i in range(0, len(indexed), chunk_size)]
+        sections = pool.map(_render_sections, chunks)
+
+        merged = PdfWriter()
+        merged.append(PdfReader(io.BytesIO(bytes(summary_pdf.output()))))
+        for section, rendered in sections:
+            merged.append(PdfReader(io.BytesIO(section)))
+            _cache_thumbnails(rendered)
+        tmp_path = str(path) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            merged.write(f)
+        os.replace(tmp_path, path)
+        chunks = len(chunks)
+
+    retention_manager.register(path)
+    elapsed = time.perf_counter() - start
+    metrics.SUITE_REPORT_DURATION.observe(elapsed, format="pdf")
+    return {"tests": len(results), "chunks": chunks, "parallel": parallel, "duration_ms": round(elapsed * 1000, 1)}
+
+
+def render_suite_html(results: list, path, title: str = "AI Website Test Suite Report") -> dict:
+    """Write a static HTML version of the suite report; thumbnails load lazily from the server"""
+    start = time.perf_counter()
+    summary = _summarize(results)
+    esc = html.escape
+    rows = []
+    sections = []
+    for index, result in enumerate(results, 1):
+        status = result.get("status", "unknown")
+        duration = _duration_ms(result)
+        rows.append(
+            f'<tr class="{esc(status)}"><td><a href="#test-{index}">{index}</a></td><td>{esc(status.upper())}</td>'
+            f'<td>{esc(result.get("websiteUrl", ""))}</td><td>{esc(result.get("testInstruction", ""))}</td>'
+            f'<td>{f"{duration / 1000:.1f}" if duration else "-"}</td></tr>'
+        )
+        validations = "".join(
+            f'<li class="{esc(v.get("status", ""))}">[{esc(v.get("status", "").upper())}] {esc(v.get("message", ""))}</li>'
+            for v in result.get("validations") or []
+        )
+        screenshot = _final_screenshot(result)
+        image = ""
+        if screenshot and screenshot.get("url"):
+            url = esc(screenshot["url"])
+            image = (f'<a href="{url}" target="_blank"><img src="{url}/thumbnail?w=320&amp;h=200&amp;fit=crop" '
+                     f'width="320" height="200" loading="lazy" decoding="async" alt="Final screenshot"></a>')
+        error = f'<p class="error">{esc(str(result["error"]))}</p>' if result.get("error") else ""
+        sections.append(
+            f'<section id="test-{index}"><h2>Test {index}: <span class="{esc(status)}">{esc(status.upper())}</span></h2>'
+            f'<p>{esc(result.get("websiteUrl", ""))}<br>{esc(result.get("testInstruction", ""))}</p>'
+            f'{error}<ul>{validations}</ul>{image}</section>'
+        )
+
+    document = f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{esc(title)}</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 2rem; color: #333; }}
+table {{ border-collapse: collapse; width: 100%; font-size: 0.85rem; }}
+td, th {{ border: 1px solid #ddd; padding: 4px 6px; text-align: left; }}
+.success {{ color: #28a745; }} .error, .fail {{ color: #dc3545; }} .warning {{ color: #b8860b; }}
+section {{ border-top: 1px solid #ddd; margin-top: 1.5rem; content-visibility: auto; contain-intrinsic-size: 400px; }}
+img {{ border: 1px solid #ddd; }}
+</style></head><body>
+<h1>{esc(title)}</h1>
+<p>{summary['total']} tests - {summary['passed']} passed - {summary['failed']} failed</p>
+<table><tr><th>#</th><th>Status</th><th>Website</th><th>Instruction</th><th>Time (s)</th></tr>
+{''.join(rows)}
+</table>
+{''.join(sections)}
+</body></html>
+"""
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(document)
+    os.replace(tmp_path, path)
+    retention_manager.register(path)
+    elapsed = time.perf_counter() - start
+    metrics.SUITE_REPORT_DURATION.observe(elapsed, format="html")
+    return {"tests": len(results), "duration_ms": round(elapsed * 1000, 1)}
+
+
+if __name__ == "__main__":
+    # python suite_report.py results.json [out_basename] - results.json holds a list of run_test results
+    with open(sys.argv[1], encoding="utf-8") as f:
+        suite_results = json.load(f)
+    basename = sys.argv[2] if len(sys.argv) > 2 else "suite_report"
+    print(render_suite_pdf(suite_results, f"{basename}.pdf"))
+    print(render_suite_html(suite_results, f"{basename}.html"))
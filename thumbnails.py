@@ -0,0 +1,151 @@
+"""
+On-demand thumbnails for stored screenshots.
+Variants (width, optional height/crop) are rendered with Pillow the first
+time they are requested and cached on disk; the cache is bounded by total
+size and entry count with least-recently-used eviction.
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+# Pillow is optional: without it thumbnail requests fall back to the full image
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+MIN_WIDTH = 16
+MAX_WIDTH = 1920
+THUMBNAIL_QUALITY = 80
+
+
+def normalize_size(width, height=None) -> tuple:
+    """Clamp requested dimensions; widths are rounded up to a multiple of 16 to bound variants"""
+    width = max(MIN_WIDTH, min(MAX_WIDTH, int(width)))
+    width = min(MAX_WIDTH, (width + 15) // 16 * 16)
+    if height:
+        height = max(MIN_WIDTH, min(MAX_WIDTH * 4, int(height)))
+    return width, height or None
+
+
+def render_thumbnail(data: bytes, width: int, height: int = None, crop: bool = False) -> bytes:
+    """Resize (and optionally top-crop to width x height) an image, encoded as JPEG"""
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (width, height or width))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    scale = width / image.width
+    if height and crop:
+        # Full-page screenshots are tall: keep the top of the page at the requested aspect ratio
+        source_height = min(image.height, max(1, round(height / scale)))
+        image = image.crop((0, 0, image.width, source_height))
+        size = (width, max(1, round(source_height * scale)))
+    elif height:
+        scale = min(scale, height / image.height)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    else:
+        size = (width, max(1, round(image.height * scale)))
+
+    if scale < 1:
+        # reducing_gap does a cheap integer downscale first, then a high-quality pass
+        image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    """Disk cache of thumbnail variants with LRU eviction"""
+
+    def __init__(self, root="screenshots/thumbs", max_bytes=256 * 1024 * 1024, max_entries=5000):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._index = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        """Build the LRU index once from the cache directory (oldest access first)"""
+        index = OrderedDict()
+        if self.root.exists():
+            entries = []
+            for path in self.root.iterdir():
+                if path.suffix == ".jpg":
+                    stat = path.stat()
+                    entries.append((stat.st_atime, path.name, stat.st_size))
+            for _, name, size in sorted(entries):
+                index[name] = size
+        self._index = index
+        self._total_bytes = sum(index.values())
+
+    @staticmethod
+    def key(artifact_id: str, width: int, height: int = None, crop: bool = False) -> str:
+        return f"{artifact_id}_w{width}" + (f"_h{height}" if height else "") + ("_crop" if crop else "") + ".jpg"
+
+    def lookup(self, artifact_id: str, width: int, height: int = None, crop: bool = False):
+        """Cached thumbnail bytes, or None on a miss"""
+        width, height = normalize_size(width, height)
+        name = self.key(artifact_id, width, height, crop)
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            if name in self._index:
+                self._index.move_to_end(name)
+                try:
+                    return (self.root / name).read_bytes()
+                except OSError:
+                    self._total_bytes -= self._index.pop(name)
+        return None
+
+    def add(self, artifact_id: str, width: int, height: int, crop: bool, thumbnail: bytes):
+        """Write a variant rendered elsewhere (e.g. a report worker) into the cache"""
+        width, height = normalize_size(width, height)
+        name = self.key(artifact_id, width, height, crop)
+        path = self.root / name
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(thumbnail)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            self._total_bytes += len(thumbnail) - self._index.get(name, 0)
+            self._index[name] = len(thumbnail)
+            self._index.move_to_end(name)
+            self._evict()
+
+    def get(self, store, artifact_id: str, width: int, height: int = None, crop: bool = False):
+        """Return thumbnail bytes for the stored artifact, rendering them on a cache miss"""
+        width, height = normalize_size(width, height)
+        cached = self.lookup(artifact_id, width, height, crop)
+        if cached is not None:
+            return cached
+        source = store.get(artifact_id)
+        if source is None:
+            return None
+        thumbnail = render_thumbnail(source[0], width, height, crop)
+        self.add(artifact_id, width, height, crop, thumbnail)
+        return thumbnail
+
+    def _evict(self):
+        """Drop least recently used variants until within quota (caller holds the lock)"""
+        while self._index and (self._total_bytes > self.max_bytes or len(self._index) > self.max_entries):
+            name, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                (self.root / name).unlink()
+            except OSError:
+                pass
+
+
+thumbnail_cache = ThumbnailCache(
+    root=os.getenv("THUMBNAIL_CACHE_DIR", "screenshots/thumbs"),
+    max_bytes=int(os.getenv("THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024,
+)
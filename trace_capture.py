@@ -0,0 +1,127 @@
+"""
+Playwright trace capture (screenshots, DOM snapshots, sources, network) for
+the browser context of a run. With the default retain-on-failure policy the
+trace of a passing run is dropped without being written; only failing runs
+pay for writing the zip, which can be opened with `playwright show-trace`.
+Start/stop time is only part of the cost (recording slows every action), so
+the execute duration of a traced run is also compared with a rolling mean of
+untraced runs of the same test.
+"""
+
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from retention import retention_manager
+from regression import update_baseline
+
+POLICY_OFF = "off"
+POLICY_ON = "on"
+POLICY_RETAIN_ON_FAILURE = "retain-on-failure"
+POLICIES = (POLICY_OFF, POLICY_ON, POLICY_RETAIN_ON_FAILURE)
+# Untraced runs needed before a traced run is compared with them
+MIN_UNTRACED_SAMPLES = 3
+
+
+def resolve_policy(value) -> str:
+    """Map a request/env value (bool or policy name) to a policy"""
+    if value is None:
+        value = os.getenv("PLAYWRIGHT_TRACE", POLICY_OFF)
+    if value is True:
+        return POLICY_RETAIN_ON_FAILURE
+    if value is False:
+        return POLICY_OFF
+    value = str(value).strip().lower()
+    if value in ("1", "true", "yes"):
+        return POLICY_RETAIN_ON_FAILURE
+    return value if value in POLICIES else POLICY_OFF
+
+
+class TraceRecorder:
+    """Starts tracing on a browser context and keeps or discards the trace at the end of the run"""
+
+    def __init__(self, context, policy: str = POLICY_RETAIN_ON_FAILURE, root=None, url_prefix="/api/playwright-traces"):
+        self.context = context
+        self.policy = policy
+        self.root = Path(root or os.getenv("PLAYWRIGHT_TRACE_DIR", "traces/playwright"))
+        self.url_prefix = url_prefix.rstrip("/")
+        self.active = False
+        self.start_ms = 0.0
+
+    def start(self):
+        """Begin recording (no-op for the off policy or if tracing is unsupported)"""
+        if self.policy == POLICY_OFF:
+            return
+        start = time.perf_counter()
+        try:
+            self.context.tracing.start(screenshots=True, snapshots=True, sources=True)
+            self.active = True
+        except Exception as e:
+            print(f"Could not start Playwright tracing: {e}")
+        self.start_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def finish(self, failed: bool, execute_ms: float = None, baseline_key: str = None) -> dict:
+        """
+        Stop recording; the trace is written only if the policy keeps it. Returns the
+        report entry, with the run's execute time next to that of untraced runs of baseline_key.
+        """
+        if not self.active:
+            return None
+        self.active = False
+        retain = self.policy == POLICY_ON or failed
+        entry = {"policy": self.policy, "retained": retain, "start_ms": self.start_ms}
+        if execute_ms is not None:
+            entry["execute_ms"] = execute_ms
+            count, mean = untraced_durations.get(baseline_key)
+            if count >= MIN_UNTRACED_SAMPLES:
+                entry.update({"untraced_execute_ms": round(mean, 1), "untraced_samples": count,
+                              "execute_delta_ms": round(execute_ms - mean, 1)})
+        start = time.perf_counter()
+        try:
+            if retain:
+                self.root.mkdir(parents=True, exist_ok=True)
+                filename = f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.zip"
+                path = self.root / filename
+                self.context.tracing.stop(path=str(path))
+                retention_manager.register(path)
+                entry.update({
+                    "filename": filename,
+                    "url": f"{self.url_prefix}/{filename}",
+                    "size_bytes": path.stat().st_size,
+                })
+            else:
+                # Discard: nothing is serialized or written
+                self.context.tracing.stop()
+        except Exception as e:
+            entry.update({"retained": False, "error": str(e)})
+        entry["stop_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        entry["start_stop_ms"] = round(entry["start_ms"] + entry["stop_ms"], 1)
+        return entry
+
+
+class ExecuteDurations:
+    """Exponentially weighted mean of untraced execute durations per test (url + instruction key)"""
+
+    def __init__(self, window: int = 30, max_keys: int = 10000):
+        self.alpha = 2 / (window + 1)
+        self.max_keys = max_keys
+        self._baselines = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, execute_ms: float):
+        with self._lock:
+            if key not in self._baselines and len(self._baselines) >= self.max_keys:
+                self._baselines.pop(next(iter(self._baselines)))
+            self._baselines[key] = update_baseline(self._baselines.get(key, (0, 0.0, 0.0)), execute_ms, self.alpha)
+
+    def get(self, key: str) -> tuple:
+        """(samples, mean execute ms) of the untraced runs of key"""
+        with self._lock:
+            count, mean, _ = self._baselines.get(key, (0, 0.0, 0.0))
+        return count, mean
+
+
+untraced_durations = ExecuteDurations()
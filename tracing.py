@@ -0,0 +1,307 @@
+"""
+Lightweight tracing for test runs.
+Nested spans cover run_test, each LangGraph node, LLM calls, test steps and
+individual Playwright actions. Finished traces are handed to a pluggable
+exporter (OTLP-JSON lines file by default); spans that are still open can be
+listed at any time to see where a hanging run is stuck. No collector needed.
+"""
+
+import os
+import json
+import time
+import secrets
+import threading
+import contextvars
+import functools
+from pathlib import Path
+
+# Span currently active in this context (thread / LangGraph task)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+STATUS_UNSET = "UNSET"
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+# OTLP status codes
+_OTLP_STATUS = {STATUS_UNSET: 0, STATUS_OK: 1, STATUS_ERROR: 2}
+
+
+class Span:
+    """A timed operation with attributes, events and a status"""
+
+    def __init__(self, tracer, name: str, parent=None, attributes: dict = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = STATUS_UNSET
+        self.status_message = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: dict = None):
+        self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": dict(attributes or {})})
+
+    def set_status(self, status: str, message: str = None):
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException):
+        self.add_event("exception", {
+            "exception.type": type(exc).__name__,
+            "exception.message": str(exc)[:1000],
+        })
+        self.set_status(STATUS_ERROR, str(exc)[:1000])
+
+    def end(self):
+        """Finish the span and restore its parent as the current span"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from a different context than it was started in
+                _current_span.set(None)
+            self._token = None
+        self.tracer._on_end(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return round((end - self.start_ns) / 1e6, 3)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        elif self.status == STATUS_UNSET:
+            self.set_status(STATUS_OK)
+        self.end()
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "status": self.status,
+            "statusMessage": self.status_message,
+            "durationMs": self.duration_ms,
+            "ended": self.end_ns is not None,
+        }
+
+
+class Tracer:
+    """Creates spans, tracks the open ones and exports finished traces"""
+
+    def __init__(self, service_name: str = "ai-website-tester", exporter=None):
+        self.service_name = service_name
+        self.exporter = exporter
+        self._lock = threading.Lock()
+        self._active = {}
+        self._finished = {}
+
+    def set_exporter(self, exporter):
+        """Plug in any object with an export(spans, service_name) method (or None)"""
+        self.exporter = exporter
+
+    def start_span(self, name: str, attributes: dict = None) -> Span:
+        """Start a span as a child of the current one and make it current"""
+        span = Span(self, name, _current_span.get(), attributes)
+        span._token = _current_span.set(span)
+        with self._lock:
+            self._active[span.span_id] = span
+        return span
+
+    def current_span(self):
+        return _current_span.get()
+
+    def _on_end(self, span: Span):
+        with self._lock:
+            self._active.pop(span.span_id, None)
+            if self.exporter is None:
+                return
+            batch = self._finished.setdefault(span.trace_id, [])
+            batch.append(span)
+            if span.parent_id is not None:
+                return
+            # Root span finished: export the whole trace at once
+            spans = self._finished.pop(span.trace_id)
+        try:
+            self.exporter.export(spans, self.service_name)
+        except Exception:
+            pass
+
+    def active_spans(self) -> list:
+        """Spans that have started but not finished, oldest first"""
+        with self._lock:
+            spans = list(self._active.values())
+        spans.sort(key=lambda s: s.start_ns)
+        return [span.to_dict() for span in spans]
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp_json(spans: list, service_name: str) -> dict:
+    """Encode spans as an OTLP/JSON ExportTraceServiceRequest"""
+    otlp_spans = []
+    for span in spans:
+        item = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "events": [
+                {"timeUnixNano": str(event["time_ns"]), "name": event["name"],
+                 "attributes": _otlp_attributes(event["attributes"])}
+                for event in span.events
+            ],
+            "status": {"code": _OTLP_STATUS[span.status]},
+        }
+        if span.parent_id:
+            item["parentSpanId"] = span.parent_id
+        if span.status_message:
+            item["status"]["message"] = span.status_message
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{"scope": {"name": "ai_agent.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+class OTLPJsonFileExporter:
+    """Appends one OTLP/JSON export request per trace as a line in a local file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans: list, service_name: str):
+        line = json.dumps(to_otlp_json(spans, service_name), separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished traces in memory (tests, debugging)"""
+
+    def __init__(self, max_traces: int = 100):
+        self.max_traces = max_traces
+        self.traces = []
+
+    def export(self, spans: list, service_name: str):
+        self.traces.append(spans)
+        del self.traces[:-self.max_traces]
+
+
+def _default_exporter():
+    """OTLP-JSON file exporter when TRACE_EXPORT_FILE is set, otherwise no export"""
+    path = os.getenv("TRACE_EXPORT_FILE")
+    return OTLPJsonFileExporter(path) if path else None
+
+
+tracer = Tracer(exporter=_default_exporter())
+
+
+def start_span(name: str, attributes: dict = None) -> Span:
+    """Start a span on the global tracer"""
+    return tracer.start_span(name, attributes)
+
+
+# Playwright actions traced when a span is active: class name -> methods
+PLAYWRIGHT_TRACED_METHODS = {
+    "Page": ("goto", "reload", "go_back", "click", "fill", "type", "press", "wait_for_load_state",
+             "wait_for_selector", "wait_for_timeout", "wait_for_url", "screenshot", "evaluate", "content"),
+    "Locator": ("click", "fill", "type", "press", "check", "select_option", "wait_for", "screenshot",
+                "evaluate", "count", "is_visible", "inner_text"),
+    "Keyboard": ("press", "type"),
+}
+# First positional arguments safe to record (selectors and URLs); text typed or filled,
+# keys pressed, option values and scripts may hold passwords or form data and are never recorded
+PLAYWRIGHT_RECORDED_ARGS = {
+    ("Page", "goto"): "playwright.url",
+    ("Page", "wait_for_url"): "playwright.url",
+    ("Page", "click"): "playwright.selector",
+    ("Page", "fill"): "playwright.selector",
+    ("Page", "type"): "playwright.selector",
+    ("Page", "press"): "playwright.selector",
+    ("Page", "wait_for_selector"): "playwright.selector",
+}
+
+_playwright_instrumented = False
+
+
+def _traced_playwright_method(class_name: str, method_name: str, method):
+    recorded_arg = PLAYWRIGHT_RECORDED_ARGS.get((class_name, method_name))
+
+    @functools.wraps(method)
+    def traced(self, *args, **kwargs):
+        if _current_span.get() is None:
+            # Not inside a traced run - no overhead beyond this check
+            return method(self, *args, **kwargs)
+        attributes = {"playwright.action": f"{class_name}.{method_name}"}
+        selector = getattr(getattr(self, "_impl_obj", None), "_selector", None)
+        if selector:
+            attributes["playwright.selector"] = str(selector)[:200]
+        if recorded_arg and args and isinstance(args[0], str):
+            attributes[recorded_arg] = args[0][:200]
+        if "timeout" in kwargs:
+            attributes["playwright.timeout_ms"] = kwargs["timeout"]
+        with tracer.start_span(f"playwright.{method_name}", attributes):
+            return method(self, *args, **kwargs)
+    return traced
+
+
+def instrument_playwright():
+    """Patch Playwright sync API classes so browser actions open child spans (idempotent)"""
+    global _playwright_instrumented
+    if _playwright_instrumented:
+        return
+    try:
+        from playwright import sync_api
+    except ImportError:
+        return
+    for class_name, method_names in PLAYWRIGHT_TRACED_METHODS.items():
+        cls = getattr(sync_api, class_name, None)
+        if cls is None:
+            continue
+        for method_name in method_names:
+            method = getattr(cls, method_name, None)
+            if callable(method):
+                setattr(cls, method_name, _traced_playwright_method(class_name, method_name, method))
+    _playwright_instrumented = True
@@ -0,0 +1,223 @@
+"""
+Validation engine: compiles the checks requested by an instruction into a
+single injected script, so all of them run inside the page with one
+page.evaluate round trip. Only counts and booleans come back to Python -
+the DOM is never serialized and transferred. The same round trip returns
+navigation timing, transferred bytes and Web Vitals (LCP and CLS are
+recorded from page start by VITALS_INIT_SCRIPT). Search box and result
+selectors come from the page's site profile.
+"""
+
+from site_profiles import site_profiles
+
+# Used when no site profile provides search input selectors
+SEARCH_INPUT_SELECTOR = (
+    "input[type='search'], input[name*='search'], input[id*='search'], "
+    "textarea[name='q'], input[name='q']"
+)
+
+# Installed with context.add_init_script: LCP / CLS observers running from the first paint
+VITALS_INIT_SCRIPT = """
+(() => {
+    if (window.top !== window || window.__agentVitals) return;
+    const vitals = window.__agentVitals = {lcp: null, cls: 0};
+    try {
+        new PerformanceObserver((list) => {
+            const entries = list.getEntries();
+            if (entries.length) vitals.lcp = entries[entries.length - 1].startTime;
+        }).observe({type: 'largest-contentful-paint', buffered: true});
+        new PerformanceObserver((list) => {
+            for (const entry of list.getEntries()) {
+                if (!entry.hadRecentInput) vitals.cls += entry.value;
+            }
+        }).observe({type: 'layout-shift', buffered: true});
+    } catch (e) {}
+})();
+"""
+
+# Runs every check in the page and returns a compact result object
+VALIDATION_SCRIPT = """
+(checks) => {
+    const out = {title: document.title, results: {}};
+    let lowerText = null;
+    let lowerHtml = null;
+    for (const check of checks) {
+        try {
+            if (check.kind === 'count') {
+                out.results[check.id] = {count: document.querySelectorAll(check.selector).length};
+            } else if (check.kind === 'text') {
+                const query = check.query.toLowerCase();
+                if (lowerText === null) {
+                    lowerText = (document.documentElement.textContent || '').toLowerCase();
+                }
+                let where = lowerText.includes(query) ? 'content' : null;
+                if (!where) {
+                    // Attribute values (e.g. the search box) only show up in the markup
+                    if (lowerHtml === null) {
+                        lowerHtml = document.documentElement.outerHTML.toLowerCase();
+                    }
+                    if (lowerHtml.includes(query)) {
+                        where = 'content';
+                    } else if (document.title.toLowerCase().includes(query)) {
+                        where = 'title';
+                    }
+                }
+                out.results[check.id] = {found: where};
+            }
+        } catch (e) {
+            out.results[check.id] = {error: String(e)};
+        }
+    }
+    try {
+        // Navigation entry times are relative to navigation start
+        const nav = performance.getEntriesByType('navigation')[0];
+        const paint = performance.getEntriesByName('first-contentful-paint')[0];
+        const resources = performance.getEntriesByType('resource');
+        let transferBytes = nav ? nav.transferSize || 0 : 0;
+        for (const resource of resources) transferBytes += resource.transferSize || 0;
+        const vitals = window.__agentVitals || {};
+        const ms = (value) => value ? Math.round(value) : null;
+        out.performance = {
+            loadTime: nav ? ms(nav.loadEventEnd) : null,
+            domContentLoaded: nav ? ms(nav.domContentLoadedEventEnd) : null,
+            ttfb: nav ? ms(nav.responseStart) : null,
+            fcp: paint ? ms(paint.startTime) : null,
+            lcp: ms(vitals.lcp),
+            cls: window.__agentVitals ? Math.round(vitals.cls * 1000) / 1000 : null,
+            transferBytes: transferBytes,
+            resourceCount: resources.length,
+            pageSize: nav ? nav.decodedBodySize || 0 : 0
+        };
+    } catch (e) {
+        out.performance = null;
+    }
+    return out;
+}
+"""
+
+
+def extract_search_query(instruction: str) -> str:
+    """First few words after the search verb ('' when the instruction is not a search)"""
+    instruction_lower = instruction.lower()
+    if "search" not in instruction_lower:
+        return ""
+    for word in ["search for", "find", "look for", "search"]:
+        if word in instruction_lower:
+            query = instruction_lower.split(word)[-1].strip().split()[0:3]  # Get first few words
+            return " ".join(query).strip()
+    return ""
+
+
+def compile_checks(instruction: str, profile: dict = None) -> list:
+    """Turn an instruction into the list of checks to run in the page"""
+    instruction_lower = instruction.lower()
+    selectors = (profile or {}).get("selectors") or {}
+    checks = []
+    if "search" in instruction_lower or "find" in instruction_lower:
+        search_selector = ", ".join(selectors.get("search_input") or []) or SEARCH_INPUT_SELECTOR
+        checks.append({"id": "search_box", "kind": "count", "selector": search_selector})
+        if selectors.get("search_results"):
+            checks.append({"id": "search_results", "kind": "count", "selector": ", ".join(selectors["search_results"])})
+    if "image" in instruction_lower or "picture" in instruction_lower:
+        checks.append({"id": "images", "kind": "count", "selector": "img"})
+    if "link" in instruction_lower:
+        checks.append({"id": "links", "kind": "count", "selector": "a[href]"})
+    if "form" in instruction_lower:
+        checks.append({"id": "forms", "kind": "count", "selector": "form"})
+    query = extract_search_query(instruction)
+    if query:
+        checks.append({"id": "content_validation", "kind": "text", "query": query})
+    return checks
+
+
+def _count_validation(check_id: str, label: str, result: dict) -> dict:
+    count = result.get("count", 0)
+    return {
+        "type": check_id,
+        "status": "pass",
+        "message": f"Found {count} {label}(s) on page",
+        "details": {"count": count}
+    }
+
+
+def build_validations(page_url: str, raw: dict, checks: list) -> list:
+    """Map the in-page result object to the report's validation entries"""
+    title = raw.get("title", "")
+    results = raw.get("results", {})
+    validations = [
+        {
+            "type": "url_validation",
+            "status": "pass",
+            "message": f"Successfully navigated to: {page_url}",
+            "details": {"url": page_url}
+        },
+        {
+            "type": "page_load",
+            "status": "pass",
+            "message": f"Page loaded successfully: {title}",
+            "details": {"title": title}
+        },
+    ]
+
+    for check in checks:
+        result = results.get(check["id"]) or {}
+        if "error" in result:
+            validations.append({
+                "type": check["id"],
+                "status": "error",
+                "message": f"Check failed in page: {result['error']}",
+                "details": {}
+            })
+            continue
+
+        if check["id"] == "search_box":
+            count = result.get("count", 0)
+            if count > 0:
+                validations.append({
+                    "type": "search_box",
+                    "status": "pass",
+                    "message": f"Found {count} search input field(s)",
+                    "details": {"count": count}
+                })
+            else:
+                validations.append({
+                    "type": "search_box",
+                    "status": "warning",
+                    "message": "Search box not found",
+                    "details": {}
+                })
+        elif check["id"] == "search_results":
+            count = result.get("count", 0)
+            validations.append({
+                "type": "search_results",
+                "status": "pass" if count > 0 else "warning",
+                "message": f"Found {count} search result(s)" if count > 0 else "No search results found",
+                "details": {"count": count}
+            })
+        elif check["id"] == "images":
+            validations.append(_count_validation("images", "image", result))
+        elif check["id"] == "links":
+            validations.append(_count_validation("links", "link", result))
+        elif check["id"] == "forms":
+            validations.append(_count_validation("forms", "form", result))
+        elif check["id"] == "content_validation" and result.get("found"):
+            where = "page content" if result["found"] == "content" else "page title"
+            validations.append({
+                "type": "content_validation",
+                "status": "pass",
+                "message": f"Found search query '{check['query']}' in {where}",
+                "details": {"query": check["query"]}
+            })
+    return validations
+
+
+def evaluate_page(page, instruction: str) -> tuple:
+    """Run all checks for the instruction with a single page.evaluate call; returns (validations, performance)"""
+    checks = compile_checks(instruction, site_profiles.profile_for(page.url))
+    raw = page.evaluate(VALIDATION_SCRIPT, checks) or {}
+    return build_validations(page.url, raw, checks), raw.get("performance")
+
+
+def validate_page(page, instruction: str) -> list:
+    """Validation entries only (see evaluate_page)"""
+    return evaluate_page(page, instruction)[0]
@@ -0,0 +1,256 @@
+"""
+Visual regression against stored baselines.
+The final screenshot of a run is compared with the baseline for the same
+URL, instruction and viewport. Both images are downscaled to a small
+grayscale grid and diffed with NumPy, so a comparison costs milliseconds
+regardless of screenshot size. Masked regions (ads, clocks, carousels) are
+ignored. Baseline images are always written to the artifact store (whatever
+SCREENSHOT_PERSIST says); the index is a small JSON file and decoded
+baselines are cached in memory across runs.
+"""
+
+import io
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from artifact_store import screenshot_store
+
+# NumPy and Pillow are optional: without them visual checks report "unavailable"
+try:
+    import numpy as np
+    from PIL import Image
+    VISUAL_DIFF_AVAILABLE = True
+except ImportError:
+    np = None
+    Image = None
+    VISUAL_DIFF_AVAILABLE = False
+
+# Width of the comparison grid; heights keep the screenshot's aspect ratio
+DIFF_WIDTH = 320
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def baseline_key(url: str, instruction: str, viewport: str) -> str:
+    """Baseline identity: normalized URL + instruction + viewport"""
+    raw = "\n".join([url.strip().rstrip("/").lower(), " ".join(instruction.lower().split()), viewport])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def parse_masks(value) -> list:
+    """Masks as a list of {x, y, width, height} rectangles in screenshot pixels (JSON string or list)"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    masks = []
+    for item in value if isinstance(value, list) else []:
+        try:
+            masks.append({key: max(0, int(item[key])) for key in ("x", "y", "width", "height")})
+        except (KeyError, TypeError, ValueError):
+            continue
+    return masks
+
+
+def downscale(data: bytes, width: int = DIFF_WIDTH):
+    """Decode an image into a small grayscale array; returns (array, scale)"""
+    image = Image.open(io.BytesIO(data))
+    scale = width / image.width
+    height = max(1, round(image.height * scale))
+    image.draft("L", (width, height))
+    image = image.convert("L").resize((width, height), Image.BILINEAR)
+    return np.asarray(image, dtype=np.int16), scale
+
+
+def _mask_array(shape: tuple, masks: list, scale: float):
+    """Boolean array that is True where pixels should be compared"""
+    keep = np.ones(shape, dtype=bool)
+    for mask in masks:
+        x0 = int(mask["x"] * scale)
+        y0 = int(mask["y"] * scale)
+        x1 = int(np.ceil((mask["x"] + mask["width"]) * scale))
+        y1 = int(np.ceil((mask["y"] + mask["height"]) * scale))
+        keep[y0:y1, x0:x1] = False
+    return keep
+
+
+def _dhash(pixels) -> int:
+    """64-bit difference hash of an already downscaled grayscale array"""
+    small = np.asarray(Image.fromarray(pixels.astype(np.uint8)).resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, :-1] > small[:, 1:]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def diff_images(baseline, current, masks: list, scale: float, pixel_threshold: int) -> dict:
+    """
+    Compare two downscaled arrays. Rows present in only one of them (the page
+    got taller or shorter) count as changed. Returns the score and a boolean
+    change map over the larger of the two heights.
+    """
+    width = baseline.shape[1]
+    height = max(baseline.shape[0], current.shape[0])
+    overlap = min(baseline.shape[0], current.shape[0])
+
+    changed = np.ones((height, width), dtype=bool)
+    delta = np.abs(baseline[:overlap] - current[:overlap])
+    changed[:overlap] = delta > pixel_threshold
+
+    keep = _mask_array((height, width), masks, scale)
+    compared = int(keep.sum())
+    changed &= keep
+    changed_pixels = int(changed.sum())
+    return {
+        "score": round(changed_pixels / compared, 5) if compared else 0.0,
+        "changed_pixels": changed_pixels,
+        "compared_pixels": compared,
+        "mean_delta": round(float(delta[keep[:overlap]].mean()), 3) if keep[:overlap].any() else 0.0,
+        "size_changed": baseline.shape[0] != current.shape[0],
+        "perceptual_distance": bin(_dhash(baseline) ^ _dhash(current)).count("1"),
+        "changed": changed,
+    }
+
+
+def render_diff_image(current, changed) -> bytes:
+    """Dimmed grayscale of the current image with changed pixels in red, as PNG"""
+    height, width = changed.shape
+    base = np.full((height, width), 255, dtype=np.int16)
+    base[:current.shape[0]] = current[:height]
+    gray = (base * 0.4 + 153).astype(np.uint8)
+    rgb = np.stack([gray, gray, gray], axis=-1)
+    rgb[changed] = (230, 30, 30)
+    output = io.BytesIO()
+    Image.fromarray(rgb, "RGB").save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+class VisualBaselineStore:
+    """Baseline index (JSON on disk) plus an in-memory cache of decoded baselines"""
+
+    def __init__(self, store, root="screenshots/baselines", threshold: float = None, pixel_threshold: int = None):
+        self.store = store
+        self.root = Path(root)
+        self.index_path = self.root / "index.json"
+        # Fraction of compared pixels that may change before the run is flagged
+        self.threshold = threshold if threshold is not None else _env_float("VISUAL_DIFF_THRESHOLD", 0.01)
+        # Per-pixel gray level difference (0-255) that counts as a change
+        self.pixel_threshold = pixel_threshold if pixel_threshold is not None else int(_env_float("VISUAL_PIXEL_THRESHOLD", 24))
+        self._index = None
+        self._decoded = {}
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        """Read the baseline index once (caller holds the lock)"""
+        if self._index is None:
+            try:
+                self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._index = {}
+
+    def _save_index(self):
+        """Atomically rewrite the index (caller holds the lock)"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._index, indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
+
+    def get(self, key: str):
+        """Baseline entry for a key, or None"""
+        with self._lock:
+            self._load_index()
+            entry = self._index.get(key)
+            return dict(entry) if entry else None
+
+    def artifact_ids(self) -> set:
+        """Ids of every baseline image (kept out of artifact retention)"""
+        with self._lock:
+            self._load_index()
+            return {entry["artifact_id"] for entry in self._index.values()}
+
+    def set(self, key: str, artifact_id: str, data: bytes, meta: dict, mime_type: str = "image/png") -> dict:
+        """Make the given screenshot the baseline for key (its image is persisted to disk)"""
+        # The screenshot itself may be memory-only; a baseline has to survive restarts
+        artifact_id = self.store.put(data, mime_type, persist=True)
+        entry = dict(meta, artifact_id=artifact_id, created_at=datetime.now().isoformat())
+        decoded = downscale(data)
+        with self._lock:
+            self._load_index()
+            self._index[key] = entry
+            self._save_index()
+            self._decoded[key] = (artifact_id, decoded)
+        return entry
+
+    def _decoded_baseline(self, key: str, artifact_id: str):
+        """Decoded (pixels, scale) baseline for key, from the cache or the artifact store"""
+        with self._lock:
+            cached = self._decoded.get(key)
+        if cached and cached[0] == artifact_id:
+            return cached[1]
+        stored = self.store.get(artifact_id)
+        if stored is None:
+            return None
+        decoded = downscale(stored[0])
+        with self._lock:
+            self._decoded[key] = (artifact_id, decoded)
+        return decoded
+
+    def check(self, url: str, instruction: str, viewport: str, artifact_id: str, data: bytes,
+              masks: list = None, update: bool = False, mime_type: str = "image/png", persist: bool = False) -> dict:
+        """
+        Compare a screenshot with the baseline for (url, instruction, viewport).
+        The first screenshot for a key (or any screenshot with update=True)
+        becomes the baseline. A baseline whose image is missing is an error,
+        not a reason to silently take the current screenshot as the new one.
+        persist applies to the diff image (baselines are always written to disk).
+        """
+        if not VISUAL_DIFF_AVAILABLE:
+            return {"status": "unavailable", "message": "Visual diff needs numpy and Pillow"}
+        key = baseline_key(url, instruction, viewport)
+        entry = self.get(key)
+        baseline = self._decoded_baseline(key, entry["artifact_id"]) if entry and not update else None
+        if baseline is None and entry and not update:
+            return {"status": "error", "baseline_key": key, "baseline_id": entry["artifact_id"],
+                    "message": "Baseline image is missing; re-create it with visual=update"}
+        if baseline is None:
+            entry = self.set(key, artifact_id, data, {"url": url, "instruction": instruction, "viewport": viewport},
+                             mime_type)
+            return {"status": "baseline_created", "baseline_key": key, "baseline_id": artifact_id,
+                    "baseline_created_at": entry["created_at"]}
+        if entry["artifact_id"] == artifact_id:
+            # Byte-identical screenshot: nothing to decode or diff
+            return {"status": "pass", "baseline_key": key, "baseline_id": artifact_id, "score": 0.0,
+                    "threshold": self.threshold, "changed_pixels": 0, "perceptual_distance": 0}
+
+        current, scale = downscale(data)
+        baseline_pixels, _ = baseline
+        result = diff_images(baseline_pixels, current, masks or [], scale, self.pixel_threshold)
+        changed = result.pop("changed")
+        result.update({
+            "status": "fail" if result["score"] > self.threshold else "pass",
+            "baseline_key": key,
+            "baseline_id": entry["artifact_id"],
+            "baseline_created_at": entry.get("created_at"),
+            "threshold": self.threshold,
+        })
+        if result["changed_pixels"]:
+            diff_id = self.store.put(render_diff_image(current, changed), "image/png", persist=persist)
+            result["diff_id"] = diff_id
+            result["diff_url"] = self.store.url_for(diff_id)
+        return result
+
+
+visual_baselines = VisualBaselineStore(
+    screenshot_store,
+    root=os.getenv("VISUAL_BASELINE_DIR", "screenshots/baselines"),
+)